@@ -1,12 +1,22 @@
 import streamlit as st
-import os
-import fitz  # PyMuPDF
-import ollama
-import tempfile
-from pathlib import Path
-import json
+from contextlib import nullcontext
 from datetime import datetime
-import pandas as pd
+from uuid import uuid4
+import pipeline
+from conversation import ConversationMemory
+from preview import document_info, render_citation_links, render_page_viewer
+from revisions import render_revision_report
+from boilerplate import format_savings
+from batch import parse_checklist, render_batch_answers
+from compare import MAX_DOCUMENTS, ComparisonSet, document_labels, merge_kpis, pages_caption, render_kpi_comparison
+from prefetch import SUGGESTED_QUESTIONS, Prefetcher, render_prefetch_status
+from warmup import DEFAULT_KEEP_ALIVE, KEEP_ALIVE_OPTIONS, MANAGER, render_model_status
+from instrumentation import PipelineMetrics, render_metrics_panel
+from storage import CompressedText, render_session_memory
+from archive import ARCHIVE, render_archive_search
+from spool import pdf_digest, read_upload
+from extraction import DEFAULT_MODE, MODES
+from profiling import DEFAULT_PROFILER, PROFILERS, ProfileRun, render_profile_panel
 
 # Configuration de la page Streamlit
 st.set_page_config(
@@ -16,6 +26,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Instrumentation du pipeline (une instance par session)
+if 'metrics' not in st.session_state:
+    st.session_state.metrics = PipelineMetrics(backend="ollama")
+metrics = st.session_state.metrics
+
 # CSS personnalisé pour une interface moderne
 st.markdown("""
 <style>
@@ -78,9 +93,12 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Configuration d'Ollama
+# Configuration d'Ollama (résultat partagé par les sessions et rafraîchi toutes les 10 secondes)
+@st.cache_resource(ttl=10, show_spinner=False)
 def check_ollama_connection():
     """Vérifie la connexion à Ollama"""
+    import ollama  # chargé après le premier affichage
+    
     try:
         # Vérifier si Ollama est accessible
         models = ollama.list()
@@ -126,6 +144,21 @@ with st.sidebar:
         else:
             st.warning("⚠️ Impossible de récupérer la liste des modèles")
             model = None
+        
+        # Maintien en mémoire : le modèle choisi est préchargé en arrière-plan
+        if model:
+            keep_alive_choices = list(KEEP_ALIVE_OPTIONS)
+            keep_alive = st.selectbox(
+                "Garder le modèle en mémoire",
+                keep_alive_choices,
+                index=keep_alive_choices.index(DEFAULT_KEEP_ALIVE) if DEFAULT_KEEP_ALIVE in keep_alive_choices else 1,
+                format_func=lambda value: KEEP_ALIVE_OPTIONS[value],
+                help="Le modèle est chargé dès sa sélection et reste en mémoire entre deux requêtes : "
+                     "le premier résumé n'attend pas son chargement."
+            )
+            # Chaque session garde sa demande : le modèle reste épinglé pour la plus longue
+            MANAGER.select(model, keep_alive, session=st.session_state.setdefault('warmup_session', uuid4().hex))
+            render_model_status(model)
     
     # Section paramètres
     with st.expander("📊 Paramètres d'analyse", expanded=True):
@@ -137,6 +170,14 @@ with st.sidebar:
             step=10000
         )
         
+        extraction_mode = st.selectbox(
+            "🧾 Mode d'extraction du texte",
+            list(MODES),
+            index=list(MODES).index(DEFAULT_MODE),
+            format_func=MODES.get,
+            help="Texte brut : le plus rapide. Blocs triés : haut de page vers le bas. Mise en page : colonnes lues l'une après l'autre et lignes de tableau réassemblées (plus lent). Chiffres uniquement : lignes contenant des nombres, pour les pages de chiffres clés (beaucoup moins de tokens)."
+        )
+        
         summary_length = st.slider(
             "Longueur du résumé (mots)",
             min_value=150,
@@ -153,123 +194,240 @@ with st.sidebar:
             step=0.1,
             help="Plus la température est élevée, plus les réponses sont créatives"
         )
-
-# Fonction pour extraire le texte du PDF
-def extract_pdf_text(pdf_file, max_length=120000):
-    """Extrait le texte d'un fichier PDF avec repères de pages"""
-    try:
-        # Sauvegarder le fichier temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_path = tmp_file.name
         
-        # Ouvrir le PDF
-        pdf = fitz.open(tmp_path)
-        text = ""
+        memory_turns = st.slider(
+            "Mémoire de conversation (échanges)",
+            min_value=1,
+            max_value=10,
+            value=4,
+            step=1,
+            help="Nombre d'échanges récents envoyés au modèle ; les plus anciens sont résumés"
+        )
         
-        for i, page in enumerate(pdf, start=1):
-            page_text = page.get_text()
-            text += f"\n\n=== [PAGE {i}] ===\n{page_text.strip()}"
+        prefetch_enabled = st.checkbox(
+            "⚡ Précharger les questions rapides",
+            value=False,
+            help="Après le résumé, répond en arrière-plan aux questions rapides lorsque Ollama est inactif "
+                 "(budget de questions et de tokens borné) : leurs boutons répondent ensuite instantanément."
+        )
         
-        pdf.close()
+        comparison_mode = st.checkbox(
+            "🔀 Mode comparaison",
+            value=False,
+            help=f"Compare 2 à {MAX_DOCUMENTS} rapports (exercices successifs, concurrents) : chiffres clés "
+                 "alignés avec leurs écarts et questions portant sur tous les documents."
+        )
         
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
+        archive_enabled = st.checkbox(
+            "🗄️ Archiver les analyses",
+            value=False,
+            help="Conserve les pages, le résumé, les chiffres clés et les réponses dans une archive locale "
+                 "(SQLite) : recherche plein texte et réouverture sans nouvel appel au modèle. "
+                 "L'archive est partagée par tous les utilisateurs de cette instance."
+        )
         
-        # Nettoyer le texte
-        text = "\n".join(line.strip() for line in text.splitlines())
+        profile_enabled = st.checkbox(
+            "🔬 Profiler l'analyse",
+            value=DEFAULT_PROFILER is not None,
+            help="Profile la prochaine analyse (extraction, construction du prompt, appel à Ollama) : "
+                 "statistiques pstats et piles repliées pour flamegraph, téléchargeables dans la sidebar."
+        )
+        if profile_enabled:
+            profile_mode = st.radio(
+                "Profileur",
+                list(PROFILERS),
+                index=list(PROFILERS).index(DEFAULT_PROFILER or "cprofile"),
+                format_func=PROFILERS.get,
+                horizontal=True
+            )
+
+# Fonction pour extraire le texte du PDF
+def extract_pdf_text(pdf_source, max_length=120000, previous=None, mode=DEFAULT_MODE):
+    """Extrait le texte d'un fichier PDF avec repères de pages.
+    
+    Retourne le couple (analyse, texte) ; les pages inchangées depuis
+    l'analyse précédente ne sont pas ré-extraites.
+    """
+    try:
+        analysis = pipeline.load_document(pdf_source, previous, metrics=metrics, mode=mode)
+        text, truncated = analysis.text(max_length)
         
-        # Tronquer si nécessaire
-        if len(text) > max_length:
-            text = text[:max_length]
+        if truncated:
             st.warning(f"⚠️ Le texte a été tronqué à {max_length:,} caractères pour des raisons de performance.")
         
-        return text
+        return analysis, text
         
     except Exception as e:
         st.error(f"❌ Erreur lors de la lecture du PDF: {str(e)}")
-        return None
+        return None, None
 
 # Fonction pour générer le résumé avec Ollama
-def generate_summary_ollama(text, model, summary_length=300, temperature=0.3):
-    """Génère un résumé financier avec Ollama"""
-    
-    system_prompt = f"""Tu es analyste financier expert. On te fournit le texte d'un document financier
-(rapport annuel, trimestriel, comptes, bilan, annexes).
-
-Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :
-
-- **Société / Période / Devise** : (si repérable)
-- **Résumé exécutif** : activité, faits marquants, contexte ({summary_length//4}-{summary_length//3} lignes)
-- **Chiffres clés** (tableau) :
- | Indicateur | Valeur | Évolution/Contexte | Période | Page |
- |---|---:|---|---|---:|
- (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,
- Dette nette, Trésorerie, etc.)
-- **Analyse** :
- - Performance (croissance, marges, cash)
- - Structure financière (dette, liquidité)
- - Risques & incertitudes (marché, réglementation, change)
- - Outlook / Guidance (si communiqué)
-- **Références internes** : pages/sections à relire
-
-Exigences :
-- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.
-- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).
-- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).
-- Reste concis : {summary_length-50}-{summary_length+50} mots hors tableau."""
-
+def generate_summary_ollama(analysis, text, model, summary_length=300, temperature=0.3):
+    """Génère un résumé financier avec Ollama (seules les sections modifiées sont résumées à nouveau)"""
     try:
-        # Appel à Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ],
-            options={
-                "temperature": temperature,
-                "num_predict": 2000
-            }
+        return pipeline.generate_document_summary(
+            analysis, text, model, summary_length, temperature, metrics=metrics
         )
         
-        return response['message']['content']
-        
     except Exception as e:
         st.error(f"❌ Erreur lors de la génération du résumé: {str(e)}")
         return None
 
 # Fonction pour répondre aux questions avec Ollama
-def answer_question_ollama(question, text, model, temperature=0.1):
-    """Répond à une question spécifique sur le document avec Ollama"""
+def answer_question_ollama(question, text, model, temperature=0.1, memory=None):
+    """Répond à une question sur le document en tenant compte de la conversation.
     
-    system_prompt = """Tu es analyste financier. On te donne un extrait de rapport financier. 
-Réponds uniquement à la question posée, sans inventer de données. 
-Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. 
-Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===').
-Sois concis et précis."""
-
+    Retourne le couple (réponse, succès).
+    """
     try:
-        # Appel à Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
-            ],
-            options={
-                "temperature": temperature,
-                "num_predict": 500
-            }
+        answer = pipeline.answer_question(
+            question, text, model, temperature, metrics=metrics,
+            history=memory.history() if memory else None,
+            conversation_summary=memory.summary if memory else ""
         )
+        return answer, True
         
-        return response['message']['content']
+    except Exception as e:
+        return f"❌ Erreur lors de la génération de la réponse: {str(e)}", False
+
+# Fonction pour répondre à une checklist de questions en un seul appel
+def answer_questions_ollama(questions, text, model, temperature=0.1):
+    """Répond à plusieurs questions avec une seule copie du document"""
+    try:
+        return pipeline.answer_questions(questions, text, model, temperature, metrics=metrics)
+        
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la réponse aux questions: {str(e)}")
+        return None
+
+# Contexte dans lequel une réponse préchargée reste valable
+def prefetch_key(text, model, temperature):
+    return (hash(text), model, temperature)
+
+# Fonction pour précharger les réponses aux questions rapides
+def start_prefetch(stored_text, model, temperature):
+    """Lance le préchargement en arrière-plan (le précédent est annulé).
+    
+    Le texte reste compressé pendant le préchargement ; il n'est décompressé qu'au moment de chaque appel.
+    """
+    previous = st.session_state.get('prefetch')
+    if previous is not None:
+        previous.cancel()
+    
+    st.session_state['prefetch'] = Prefetcher(
+        prefetch_key(stored_text.get(), model, temperature),
+        lambda question: pipeline.answer_question(
+            question, stored_text.get(), model, temperature, metrics=metrics, call="prefetch"
+        ),
+        stored_text
+    ).start()
+
+# Fonction pour répondre à une question rapide (réponse préchargée si disponible)
+def answer_quick_question(question, text, model, temperature):
+    """Question posée hors conversation, pour pouvoir être préchargée.
+    
+    Retourne le couple (réponse, succès).
+    """
+    prefetcher = st.session_state.get('prefetch')
+    if prefetcher is not None and prefetcher.key != prefetch_key(text, model, temperature):
+        prefetcher = None
+    
+    if prefetcher is not None and prefetcher.get(question):
+        return prefetcher.get(question), True
+    
+    answer, ok = answer_question_ollama(question, text, model, temperature)
+    if ok and prefetcher is not None:
+        prefetcher.store(question, answer)
+    return answer, ok
+
+# Fonction pour extraire un document du mode comparaison
+def load_compared_document(pdf_source):
+    return pipeline.load_document(pdf_source, metrics=metrics)
+
+# Fonction pour comparer les chiffres clés de plusieurs documents
+def compare_kpis_ollama(documents, model):
+    """Tableau comparatif des chiffres clés (extraits une fois par document et par modèle)"""
+    try:
+        tables = [pipeline.extract_kpis(document, model, metrics=metrics) for document in documents]
+        return merge_kpis(documents, tables)
         
     except Exception as e:
-        return f"❌ Erreur lors de la génération de la réponse: {str(e)}"
+        st.error(f"❌ Erreur lors de l'extraction des chiffres clés: {str(e)}")
+        return None
+
+# Fonction pour répondre à une question portant sur plusieurs documents
+def answer_comparison_ollama(question, documents, model, temperature=0.1, max_chars=120000):
+    """Retourne le couple (réponse, pages retenues par document), ou None en cas d'erreur"""
+    try:
+        return pipeline.answer_comparison(question, documents, model, temperature, max_chars, metrics=metrics)
+        
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la comparaison: {str(e)}")
+        return None
+
+# Fonction pour condenser les échanges sortis de la fenêtre de conversation
+def compact_memory(memory, model):
+    """Résume les anciens échanges ; en cas d'échec ils restent dans la fenêtre"""
+    try:
+        memory.compact(lambda previous, turns: pipeline.summarize_conversation(
+            previous, turns, model, metrics=metrics
+        ))
+    except Exception as e:
+        st.warning(f"⚠️ Impossible de résumer les anciens échanges: {str(e)}")
+
+# Fonction pour archiver un document analysé (pages, résumé, chiffres clés)
+def archive_analysis(doc_hash, filename, analysis, pdf_source, summary, model):
+    """Archive locale consultable par recherche ; un échec n'interrompt pas l'analyse"""
+    try:
+        with metrics.stage("archive", call="save"):
+            ARCHIVE.save_document(doc_hash, filename, analysis, pdf_source)
+            ARCHIVE.save_summary(doc_hash, model, summary, analysis)
+    except Exception as e:
+        st.warning(f"⚠️ Archivage impossible: {str(e)}")
+
+# Fonction pour archiver un échange question-réponse
+def archive_answer(question, answer, model):
+    try:
+        ARCHIVE.save_answer(st.session_state['pdf_hash'], question, answer, model)
+    except Exception as e:
+        st.warning(f"⚠️ Archivage de la réponse impossible: {str(e)}")
+
+# Fonction pour rouvrir un document archivé
+def open_archived_document(doc_hash, max_length, memory_turns):
+    """Restaure pages, résumé et échanges depuis l'archive, sans extraction ni appel au modèle"""
+    try:
+        with metrics.stage("archive", call="open"):
+            archived = ARCHIVE.load(doc_hash)
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la lecture de l'archive: {str(e)}")
+        return False
+    if archived is None or archived.summary is None:
+        st.error("❌ Document introuvable dans l'archive")
+        return False
+    
+    text, _ = archived.analysis.text(max_length)
+    st.session_state['pdf_text'] = CompressedText(text)
+    st.session_state['summary'] = archived.summary
+    st.session_state['analysis'] = archived.analysis
+    st.session_state['revision'] = None
+    st.session_state['pdf_hash'] = doc_hash
+    st.session_state['page_count'] = len(archived.analysis.pages)
+    # Sans PDF archivé, la visionneuse de pages est indisponible
+    if archived.pdf_source:
+        st.session_state['pdf_bytes'] = archived.pdf_source
+    else:
+        st.session_state.pop('pdf_bytes', None)
+    
+    conversation = ConversationMemory(window_turns=memory_turns)
+    conversation.restore([(entry["question"], entry["answer"]) for entry in archived.answers])
+    st.session_state.conversation = conversation
+    st.session_state.pop('batch_answers', None)
+    if 'prefetch' in st.session_state:
+        st.session_state.pop('prefetch').cancel()
+    return True
 
 # Interface principale
-ollama_status, models_info = check_ollama_connection()
+ollama_status = is_connected
 if not ollama_status:
     st.error("⚠️ Impossible de se connecter à Ollama. Veuillez vérifier que le service est démarré.")
     st.info("""
@@ -291,6 +449,74 @@ if not models_info or not hasattr(models_info, 'models') or not models_info.mode
     """)
     st.stop()
 
+# Mode comparaison : chaque document est extrait et indexé une seule fois par session
+if comparison_mode:
+    st.markdown("## 🔀 Comparaison de Documents")
+    uploaded_files = st.file_uploader(
+        f"Choisissez de 2 à {MAX_DOCUMENTS} rapports financiers",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Par exemple les rapports annuels de plusieurs exercices, ou ceux de sociétés comparables"
+    ) or []
+    if len(uploaded_files) > MAX_DOCUMENTS:
+        st.warning(f"⚠️ Seuls les {MAX_DOCUMENTS} premiers documents sont comparés.")
+    
+    comparison = st.session_state.setdefault('comparison', ComparisonSet())
+    selected = []
+    for uploaded in uploaded_files[:MAX_DOCUMENTS]:
+        try:
+            with st.spinner(f"📖 Extraction de {uploaded.name}..."):
+                selected.append(comparison.add_upload(uploaded, load_compared_document).doc_hash)
+        except Exception as e:
+            st.error(f"❌ Erreur lors de la lecture de {uploaded.name}: {str(e)}")
+    comparison.retain(selected)
+    documents = comparison.documents()
+    
+    if len(documents) < 2:
+        st.info("📂 Importez au moins deux rapports pour les comparer.")
+    else:
+        st.caption(" · ".join(
+            f"**{label}** : {document.name} ({len(document.analysis.pages)} pages)"
+            for label, document in zip(document_labels(documents), documents)
+        ))
+        selection_key = (tuple(document.doc_hash for document in documents), model)
+        
+        st.markdown("### 📈 Chiffres Clés Comparés")
+        if st.button("📊 Comparer les chiffres clés", type="primary"):
+            with st.spinner("🤖 Extraction des chiffres clés de chaque document..."):
+                rows = compare_kpis_ollama(documents, model)
+            if rows is not None:
+                st.session_state['comparison_kpis'] = (selection_key, rows)
+        if st.session_state.get('comparison_kpis', (None,))[0] == selection_key:
+            render_kpi_comparison(st.session_state['comparison_kpis'][1], key="comparison_kpis")
+        
+        st.markdown("### ❓ Question sur l'Ensemble des Documents")
+        comparison_question = st.text_input(
+            "Votre question",
+            placeholder="Ex: Comment la marge opérationnelle a-t-elle évolué d'un exercice à l'autre ?",
+            key="comparison_question"
+        )
+        if st.button("🔍 Comparer", key="comparison_ask") and comparison_question:
+            with st.spinner("🤔 Recherche des pages pertinentes et analyse..."):
+                result = answer_comparison_ollama(comparison_question, documents, model, temperature, max_length)
+            if result is not None:
+                answer, pages = result
+                st.session_state['comparison_answer'] = (selection_key, answer, pages_caption(documents, pages))
+        if st.session_state.get('comparison_answer', (None,))[0] == selection_key:
+            _, answer, caption = st.session_state['comparison_answer']
+            st.markdown(answer)
+            st.caption(f"📄 Pages consultées : {caption}")
+    
+    render_metrics_panel(metrics)
+    render_session_memory(st.session_state)
+    st.stop()
+
+# Archive des analyses : recherche plein texte, réouverture sans appel au modèle
+with st.expander("🗄️ Analyses archivées"):
+    archived_hash = render_archive_search(ARCHIVE, metrics, key="archive")
+if archived_hash and open_archived_document(archived_hash, max_length, memory_turns):
+    st.rerun()
+
 # Section d'upload du PDF
 st.markdown("## 📁 Import du Document")
 uploaded_file = st.file_uploader(
@@ -314,59 +540,126 @@ if uploaded_file is not None:
     
     # Bouton pour analyser le PDF
     if st.button("🔍 Analyser le Document", type="primary"):
-        with st.spinner("📖 Extraction du texte en cours..."):
-            text = extract_pdf_text(uploaded_file, max_length)
+        # Octets en mémoire, ou fichier temporaire sur disque pour un gros document
+        pdf_source = read_upload(uploaded_file)
+        # Profil de l'analyse complète (extraction et résumé), téléchargeable dans la sidebar
+        profile = nullcontext()
+        if profile_enabled:
+            profile = st.session_state['profile'] = ProfileRun(profile_mode, "ollama", pdf_digest(pdf_source))
+        with profile, st.spinner("📖 Extraction du texte en cours..."):
+            analysis, text = extract_pdf_text(
+                pdf_source, max_length, previous=st.session_state.get('analysis'), mode=extraction_mode
+            )
         
         if text:
             st.success("✅ Texte extrait avec succès!")
+            if analysis.boilerplate_bytes:
+                st.caption(format_savings(analysis.boilerplate_bytes, analysis.text_bytes))
             
             # Aperçu du texte
             with st.expander("👀 Aperçu du texte extrait", expanded=False):
                 st.text_area("Texte extrait", text[:2000] + "..." if len(text) > 2000 else text, height=200)
             
             # Génération du résumé
-            with st.spinner("🤖 Génération du résumé en cours..."):
-                summary = generate_summary_ollama(text, model, summary_length, temperature)
+            with profile, st.spinner("🤖 Génération du résumé en cours..."):
+                summary = generate_summary_ollama(analysis, text, model, summary_length, temperature)
             
             if summary:
-                st.markdown("## 📊 Résumé Financier")
-                st.markdown(summary)
-                
-                # Sauvegarder le contexte pour les questions
-                st.session_state['pdf_text'] = text
+                # Sauvegarder le contexte pour les questions et la vérification des pages (texte compressé)
+                st.session_state['pdf_text'] = CompressedText(text)
                 st.session_state['summary'] = summary
-                
-                # Bouton de téléchargement du résumé
-                st.download_button(
-                    label="💾 Télécharger le Résumé",
-                    data=summary,
-                    file_name=f"resume_financier_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
-                    mime="text/markdown"
+                st.session_state['analysis'] = analysis
+                st.session_state['revision'] = analysis.revision_report()
+                st.session_state['pdf_bytes'] = pdf_source
+                st.session_state['pdf_hash'], st.session_state['page_count'] = document_info(
+                    st.session_state['pdf_bytes']
                 )
+                if archive_enabled:
+                    archive_analysis(
+                        st.session_state['pdf_hash'], uploaded_file.name, analysis,
+                        st.session_state['pdf_bytes'], summary, model
+                    )
+                # Nouvelle conversation pour le nouveau document
+                st.session_state.pop('conversation', None)
+                st.session_state.pop('batch_answers', None)
+                
+                # Réponses spéculatives aux questions rapides, quand Ollama est inactif
+                if prefetch_enabled:
+                    start_prefetch(st.session_state['pdf_text'], model, temperature)
+                elif 'prefetch' in st.session_state:
+                    st.session_state.pop('prefetch').cancel()
+
+# Affichage du résumé (conservé entre les reruns pour naviguer vers les pages citées)
+if 'summary' in st.session_state:
+    st.markdown("## 📊 Résumé Financier")
+    if st.session_state.get('revision'):
+        render_revision_report(st.session_state['revision'])
+    with metrics.stage("rendu", call="summary"):
+        st.markdown(st.session_state['summary'])
+    render_citation_links(st.session_state['summary'], st.session_state['page_count'], key="summary")
+    
+    # Bouton de téléchargement du résumé
+    st.download_button(
+        label="💾 Télécharger le Résumé",
+        data=st.session_state['summary'],
+        file_name=f"resume_financier_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+        mime="text/markdown"
+    )
 
 # Section des questions interactives
 if 'pdf_text' in st.session_state:
+    # Texte décompressé une fois par exécution (le plus souvent lu dans le cache partagé)
+    pdf_text = st.session_state['pdf_text'].get()
     st.markdown("## 💬 Questions Interactives")
     st.markdown("Posez des questions spécifiques sur votre document financier")
     
-    # Interface de chat
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+    # Interface de chat (mémoire bornée : fenêtre récente + résumé glissant)
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = ConversationMemory(window_turns=memory_turns)
+    conversation = st.session_state.conversation
+    conversation.window_turns = memory_turns
     
-    # Affichage de l'historique des conversations
-    for message in st.session_state.chat_history:
-        if message['role'] == 'user':
-            st.markdown(f"""
-            <div class="chat-message user-message">
-                <strong>Vous :</strong> {message['content']}
-            </div>
-            """, unsafe_allow_html=True)
+    # Affichage de l'historique : un seul élément, HTML pré-calculé par message
+    with metrics.stage("rendu", call="chat_history"):
+        if conversation.archived:
+            with st.expander(f"🧠 {len(conversation.archived)} échange(s) plus ancien(s) résumé(s)"):
+                st.markdown(conversation.summary or "_Résumé indisponible_")
+                if st.checkbox("Afficher les échanges complets", key="show_archived"):
+                    st.markdown(conversation.archived_html(), unsafe_allow_html=True)
+        if conversation.turns:
+            st.markdown(conversation.recent_html(), unsafe_allow_html=True)
+            render_citation_links(
+                conversation.turns[-1]["answer"], st.session_state['page_count'], key="answer"
+            )
+    
+    # Questions rapides (⚡ : réponse déjà préchargée)
+    prefetcher = st.session_state.get('prefetch')
+    if prefetcher is not None:
+        if prefetcher.key != prefetch_key(pdf_text, model, temperature):
+            # Modèle ou température changés : les réponses préchargées ne correspondent plus
+            prefetcher.cancel()
+            st.session_state.pop('prefetch')
+            prefetcher = None
         else:
-            st.markdown(f"""
-            <div class="chat-message assistant-message">
-                <strong>Assistant :</strong> {message['content']}
-            </div>
-            """, unsafe_allow_html=True)
+            render_prefetch_status(prefetcher, key="prefetch")
+    
+    quick_question = None
+    for i, (column, suggested_q) in enumerate(zip(st.columns(len(SUGGESTED_QUESTIONS)), SUGGESTED_QUESTIONS)):
+        ready = prefetcher is not None and prefetcher.get(suggested_q)
+        with column:
+            if st.button(f"{'⚡' if ready else '❓'} {suggested_q}", key=f"quick_{i}"):
+                quick_question = suggested_q
+    
+    if quick_question:
+        with st.spinner("🤔 Recherche en cours..."):
+            answer, ok = answer_quick_question(quick_question, pdf_text, model, temperature)
+        conversation.add_turn(quick_question, answer, error=not ok)
+        if ok and archive_enabled:
+            archive_answer(quick_question, answer, model)
+        if conversation.needs_compaction():
+            with st.spinner("🧠 Mise à jour de la mémoire de conversation..."):
+                compact_memory(conversation, model)
+        st.rerun()
     
     # Interface de saisie de question
     col1, col2 = st.columns([4, 1])
@@ -380,35 +673,71 @@ if 'pdf_text' in st.session_state:
     with col2:
         if st.button("❓ Poser", type="primary"):
             if question.strip():
-                # Ajouter la question à l'historique
-                st.session_state.chat_history.append({
-                    'role': 'user',
-                    'content': question
-                })
-                
-                # Générer la réponse
+                # Générer la réponse avec la fenêtre de conversation
                 with st.spinner("🤔 Recherche en cours..."):
-                    answer = answer_question_ollama(
+                    answer, ok = answer_question_ollama(
                         question, 
-                        st.session_state['pdf_text'], 
+                        pdf_text, 
                         model, 
-                        temperature
+                        temperature,
+                        memory=conversation
                     )
                 
-                # Ajouter la réponse à l'historique
-                st.session_state.chat_history.append({
-                    'role': 'assistant',
-                    'content': answer
-                })
+                # Ajouter l'échange à l'historique, puis condenser si la fenêtre déborde
+                conversation.add_turn(question, answer, error=not ok)
+                if ok and archive_enabled:
+                    archive_answer(question, answer, model)
+                if conversation.needs_compaction():
+                    with st.spinner("🧠 Mise à jour de la mémoire de conversation..."):
+                        compact_memory(conversation, model)
                 
                 # Recharger la page pour afficher la nouvelle conversation
                 st.rerun()
     
     # Bouton pour effacer l'historique
-    if st.session_state.chat_history:
+    if len(conversation):
         if st.button("🗑️ Effacer l'historique"):
-            st.session_state.chat_history = []
+            conversation.clear()
             st.rerun()
+    
+    # Checklist de revue : toutes les questions en un seul appel (hors conversation)
+    with st.expander("📋 Checklist de revue", expanded='batch_answers' in st.session_state):
+        checklist = st.text_area(
+            "Une question par ligne",
+            placeholder="Quel est le chiffre d'affaires ?\nQuelle est la dette nette ?\nQuels sont les principaux risques ?",
+            key="checklist"
+        )
+        if st.button("⚡ Répondre à la checklist (1 appel)", key="checklist_run"):
+            questions = parse_checklist(checklist)
+            if questions:
+                with st.spinner(f"🤔 Réponse à {len(questions)} questions en cours..."):
+                    results = answer_questions_ollama(questions, pdf_text, model, temperature)
+                if results:
+                    st.session_state['batch_answers'] = results
+                    if archive_enabled:
+                        for result in results:
+                            archive_answer(result["question"], result["answer"], model)
+            else:
+                st.warning("⚠️ La checklist ne contient aucune question")
+        
+        if 'batch_answers' in st.session_state:
+            render_batch_answers(st.session_state['batch_answers'], st.session_state['page_count'], key="batch")
+
+# Visionneuse des pages (sidebar : visible à côté du résumé et des réponses)
+if 'pdf_bytes' in st.session_state:
+    with st.sidebar.expander("📄 Vérification des pages", expanded=True):
+        with metrics.stage("rendu", call="page_viewer"):
+            render_page_viewer(
+                st.session_state['pdf_bytes'],
+                st.session_state['pdf_hash'],
+                st.session_state['page_count']
+            )
+
+# Panneau d'instrumentation (rendu en fin de script pour refléter l'exécution courante)
+render_metrics_panel(metrics)
+if 'profile' in st.session_state:
+    render_profile_panel(st.session_state['profile'], key="profile")
+render_session_memory(st.session_state)
 
 # Footer
 st.markdown("---")
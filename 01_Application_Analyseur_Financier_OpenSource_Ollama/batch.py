@@ -0,0 +1,120 @@
+"""Réponses groupées : plusieurs questions, un seul appel LLM.
+
+Le document n'est envoyé qu'une fois, suivi de la liste numérotée des
+questions ; le modèle renvoie un objet JSON qui rattache chaque réponse à
+l'identifiant de sa question. Une revue de dix questions coûte ainsi un seul
+traitement du contexte au lieu de dix. Les réponses absentes ou illisibles
+sont signalées (`None`) pour être reposées individuellement.
+"""
+import json
+import re
+
+# Au-delà, la réponse JSON devient trop longue pour rester fiable
+MAX_QUESTIONS = 20
+
+# Tokens de réponse prévus par question (plus une marge pour l'enveloppe JSON)
+TOKENS_PER_ANSWER = 250
+
+# Puces, numéros et cases à cocher en début de ligne d'une checklist
+_ITEM_PREFIX_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)]|\[[ xX]?\])\s*")
+
+_QUESTION_ID_RE = re.compile(r"\d+")
+
+
+def parse_checklist(text):
+    """Une question par ligne ; puces, numéros, lignes vides et doublons ignorés"""
+    questions = []
+    for line in text.splitlines():
+        question = _ITEM_PREFIX_RE.sub("", line).strip()
+        if question and question not in questions:
+            questions.append(question)
+    return questions[:MAX_QUESTIONS]
+
+
+def batch_max_tokens(count):
+    return 200 + TOKENS_PER_ANSWER * count
+
+
+# Construction des messages pour une série de questions
+def build_batch_messages(questions, text):
+    """Assemble les consignes, le texte du document puis les questions numérotées"""
+    instructions = (
+        "Tu es analyste financier. On te donne un extrait de rapport financier suivi "
+        "d'une liste de questions numérotées [Q1], [Q2]...\n"
+        "Réponds à chaque question séparément, uniquement à partir du texte, sans inventer de données. "
+        "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
+        "Quand c'est possible, indique la page d'origine (repère '=== [PAGE X] ===') sous la forme 'Page X'.\n\n"
+        "Réponds uniquement avec un objet JSON de la forme :\n"
+        '{"answers": [{"id": "Q1", "answer": "..."}, {"id": "Q2", "answer": "..."}]}\n'
+        "Une entrée par question, dans l'ordre ; chaque réponse tient en 80 mots au plus (Markdown autorisé)."
+    )
+    numbered = "\n".join(f"[Q{i}] {question}" for i, question in enumerate(questions, 1))
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Texte PDF :\n{text}\n\nQuestions :\n{numbered}"}
+    ]
+
+
+def _json_payload(raw):
+    # Tolère les blocs ```json ... ``` et le texte autour de l'objet
+    start = min((i for i in (raw.find("{"), raw.find("[")) if i >= 0), default=-1)
+    end = max(raw.rfind("}"), raw.rfind("]"))
+    return raw[start:end + 1] if 0 <= start < end else raw
+
+
+def parse_batch_answers(raw, count):
+    """Répartit la réponse JSON du modèle entre les `count` questions.
+
+    Retourne une liste de `count` réponses, `None` pour chaque question
+    sans réponse exploitable.
+    """
+    answers = [None] * count
+    try:
+        data = json.loads(_json_payload(raw or ""))
+    except ValueError:
+        return answers
+
+    items = data.get("answers") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return answers
+
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            identifier, answer = item.get("id", position + 1), item.get("answer")
+        else:
+            identifier, answer = position + 1, item
+        match = _QUESTION_ID_RE.search(str(identifier))
+        index = int(match.group()) - 1 if match else position
+        if 0 <= index < count and answers[index] is None and isinstance(answer, str) and answer.strip():
+            answers[index] = answer.strip()
+    return answers
+
+
+def batch_report_markdown(results):
+    """Questions et réponses d'une série, au format Markdown (téléchargement)"""
+    return "\n\n".join(f"### {r['question']}\n\n{r['answer']}" for r in results) + "\n"
+
+
+def render_batch_answers(results, page_count, key):
+    """Affiche les réponses d'une série, chacune avec les liens vers ses pages citées"""
+    import streamlit as st
+
+    from preview import render_citation_links
+
+    individual = sum(not r["batched"] for r in results)
+    st.caption(
+        f"{len(results)} question(s), 1 appel groupé"
+        + (f" + {individual} question(s) reposée(s) individuellement" if individual else "")
+    )
+    for i, result in enumerate(results):
+        st.markdown(f"**{i + 1}. {result['question']}**")
+        st.markdown(result["answer"])
+        render_citation_links(result["answer"], page_count, key=f"{key}_{i}")
+    st.download_button(
+        label="💾 Télécharger les réponses (Markdown)",
+        data=batch_report_markdown(results),
+        file_name="reponses.md",
+        mime="text/markdown",
+        key=f"{key}_download",
+    )
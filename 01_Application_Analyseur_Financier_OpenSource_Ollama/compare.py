@@ -0,0 +1,391 @@
+"""Comparaison de plusieurs documents : index par document et questions croisées.
+
+Chaque document importé en mode comparaison est extrait une seule fois et
+conserve deux index :
+
+- un index de recherche (BM25) sur ses pages, construit au premier besoin,
+  pour ne transmettre au modèle que les pages utiles à une question ;
+- un index des chiffres clés, tiré des pages les plus pertinentes pour les
+  indicateurs financiers, produit une fois par modèle.
+
+Une question transversale partage un seul budget de caractères entre les
+documents : chacun y place à tour de rôle sa page suivante la mieux classée,
+si bien qu'un document peu concerné laisse sa part aux autres. Le tableau
+comparatif aligne les indicateurs d'un document à l'autre et calcule les
+écarts d'une période à la suivante.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from spool import pdf_digest, read_upload
+
+# Documents comparés simultanément
+MAX_DOCUMENTS = 4
+
+# Budget de texte commun à tous les documents pour une question transversale (caractères)
+COMPARISON_CHARS = 60000
+
+# Noms d'indicateurs imposés au modèle, pour aligner les tableaux d'un document à l'autre
+KPI_NAMES = [
+    "Chiffre d'affaires",
+    "EBITDA",
+    "Résultat opérationnel (EBIT)",
+    "Résultat net",
+    "Marge nette",
+    "Flux de trésorerie opérationnel",
+    "Free cash flow",
+    "CAPEX",
+    "Dette nette",
+    "Trésorerie",
+    "Capitaux propres",
+]
+
+# Recherche des pages de chiffres clés, et budget de texte par document pour leur extraction
+KPI_QUERY = " ".join(KPI_NAMES) + " compte de résultat bilan tableau des flux chiffres clés"
+KPI_CONTEXT_CHARS = 24000
+
+# Paramètres usuels de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_STOPWORDS = frozenset(
+    "au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me meme mes moi "
+    "mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos "
+    "votre vous est sont ete etre avoir a ont quel quelle quels quelles comment combien entre the of and"
+    .split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_YEAR_RE = re.compile(r"\b(?:19[89]\d|20\d\d)\b")
+_AMOUNT_RE = re.compile(r"(\(?)\s*([-−+]?)\s*(\d[\d\s  .,]*)\)?\s*(.*)")
+
+# Échelles reconnues dans l'unité d'un montant
+_SCALES = [
+    (("milliards", "milliard", "mds", "md", "mrd", "bn", "b"), 1e9),
+    (("millions", "million", "mio", "mn", "m"), 1e6),
+    (("milliers", "k"), 1e3),
+]
+
+# Devises écrites en toutes lettres
+_CURRENCIES = {"euros": "€", "euro": "€", "eur": "€", "dollars": "$", "dollar": "$", "usd": "$"}
+
+
+def tokenize(text):
+    """Mots en minuscules sans accents, mots vides retirés"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [token for token in _TOKEN_RE.findall(text) if len(token) > 1 and token not in _STOPWORDS]
+
+
+class PageIndex:
+    """Index BM25 des pages d'un document."""
+
+    def __init__(self, pages):
+        # pages : [(numéro, texte)]
+        self.terms = {number: Counter(tokenize(text)) for number, text in pages}
+        self.lengths = {number: sum(terms.values()) for number, terms in self.terms.items()}
+        self.average_length = sum(self.lengths.values()) / max(len(self.lengths), 1)
+        self.document_frequency = Counter(term for terms in self.terms.values() for term in terms)
+
+    def search(self, query):
+        """Numéros des pages qui contiennent des mots de la requête, de la plus à la moins pertinente"""
+        count = len(self.terms)
+        scores = {}
+        for term in set(tokenize(query)):
+            frequency = self.document_frequency.get(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for number, terms in self.terms.items():
+                tf = terms.get(term)
+                if tf:
+                    norm = 1 - BM25_B + BM25_B * self.lengths[number] / (self.average_length or 1)
+                    scores[number] = scores.get(number, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return sorted(scores, key=lambda number: (-scores[number], number))
+
+
+def detect_year(name, analysis):
+    """Exercice d'un rapport : année du nom de fichier, sinon la plus récente des années
+    citées au moins deux fois dans ses premières pages"""
+    in_name = _YEAR_RE.findall(re.sub(r"[_.-]", " ", name))
+    if in_name:
+        return int(in_name[-1])
+    years = Counter(int(year) for page in analysis.pages[:3] for year in _YEAR_RE.findall(analysis.page_text(page["number"], dedupe=False)))
+    frequent = [year for year, count in years.items() if count >= 2]
+    return max(frequent or years or [None])
+
+
+class ComparedDocument:
+    """Document du mode comparaison : extraction, index de recherche et chiffres clés."""
+
+    def __init__(self, name, doc_hash, analysis):
+        self.name = name
+        self.doc_hash = doc_hash
+        self.analysis = analysis
+        self.year = detect_year(name, analysis)
+        self.kpis = {}          # variante (backend|modèle) -> {indicateur: {value, period, page}}
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = PageIndex([(page["number"], self.page_text(page["number"])) for page in self.analysis.pages])
+        return self._index
+
+    def page_text(self, number):
+        return self.analysis.page_text(number)
+
+
+class ComparisonSet:
+    """Documents comparés d'une session, classés par exercice."""
+
+    def __init__(self, max_documents=MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self._documents = {}
+        self._uploads = {}      # identifiant d'import Streamlit -> empreinte du document
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, name, pdf_source, load):
+        """Document correspondant à `pdf_source` (octets ou `SpooledPDF`) ; `load(pdf_source)` n'est appelée que pour un nouveau document"""
+        doc_hash = pdf_digest(pdf_source)
+        document = self._documents.get(doc_hash)
+        if document is None:
+            if len(self._documents) >= self.max_documents:
+                raise ValueError(f"{self.max_documents} documents au plus peuvent être comparés")
+            document = self._documents[doc_hash] = ComparedDocument(name, doc_hash, load(pdf_source))
+        return document
+
+    def add_upload(self, uploaded_file, load):
+        """Comme `add`, pour un fichier importé dans Streamlit : un import déjà vu n'est ni relu ni haché à nouveau"""
+        document = self._documents.get(self._uploads.get(uploaded_file.file_id))
+        if document is None:
+            document = self.add(uploaded_file.name, read_upload(uploaded_file), load)
+            self._uploads[uploaded_file.file_id] = document.doc_hash
+        return document
+
+    def retain(self, doc_hashes):
+        """Oublie les documents qui ne font plus partie de la sélection"""
+        for doc_hash in set(self._documents) - set(doc_hashes):
+            del self._documents[doc_hash]
+        self._uploads = {upload: doc_hash for upload, doc_hash in self._uploads.items() if doc_hash in self._documents}
+
+    def documents(self):
+        """Documents du plus ancien au plus récent (ordre d'import pour les exercices inconnus)"""
+        order = list(self._documents.values())
+        return sorted(order, key=lambda d: (d.year is None, d.year or 0, order.index(d)))
+
+
+def document_labels(documents):
+    """Nom court de chaque document : son exercice s'il le distingue des autres, le nom du fichier sinon"""
+    years = [document.year for document in documents]
+    return [
+        str(document.year) if document.year is not None and years.count(document.year) == 1
+        else re.sub(r"\.pdf$", "", document.name, flags=re.IGNORECASE)[:40]
+        for document in documents
+    ]
+
+
+def _page_block(position, number, text):
+    return f"\n\n=== [DOC {position} | PAGE {number}] ===\n{text}"
+
+
+def select_pages(documents, query, max_chars):
+    """Pages retenues pour chaque document dans un budget commun de `max_chars` caractères.
+
+    Chaque document ajoute à tour de rôle sa page suivante la mieux classée ;
+    une page qui ne tient plus dans le budget est sautée. Retourne une liste
+    de numéros de pages (triés) par document, dans l'ordre de `documents`.
+    """
+    rankings = []
+    for document in documents:
+        ranked = document.index.search(query)
+        # Aucun mot en commun : les premières pages (faits marquants, chiffres clés)
+        rankings.append(ranked or [page["number"] for page in document.analysis.pages[:3]])
+
+    selected = [[] for _ in documents]
+    cursors = [0] * len(documents)
+    remaining = max_chars
+    progress = True
+    while progress:
+        progress = False
+        for position, (document, ranked) in enumerate(zip(documents, rankings)):
+            while cursors[position] < len(ranked):
+                number = ranked[cursors[position]]
+                cursors[position] += 1
+                size = len(_page_block(position + 1, number, document.page_text(number)))
+                if size <= remaining:
+                    selected[position].append(number)
+                    remaining -= size
+                    progress = True
+                    break
+    return [sorted(numbers) for numbers in selected]
+
+
+def build_comparison_context(documents, selection):
+    labels = document_labels(documents)
+    parts = []
+    for position, (document, label, numbers) in enumerate(zip(documents, labels, selection), start=1):
+        parts.append(f"\n\n##### DOCUMENT {position} : {label} ({document.name}) #####")
+        parts.extend(_page_block(position, number, document.page_text(number)) for number in numbers)
+    return "".join(parts)
+
+
+# Construction des messages pour une question portant sur plusieurs documents
+def build_comparison_messages(question, documents, selection):
+    """Assemble les consignes, les extraits de chaque document puis la question"""
+    names = ", ".join(f"Doc {i} = {label}" for i, label in enumerate(document_labels(documents), start=1))
+    instructions = (
+        "Tu es analyste financier. On te fournit des extraits de plusieurs rapports financiers "
+        f"({names}), balisés '=== [DOC N | PAGE X] ==='.\n"
+        "Réponds à la question en comparant les documents, uniquement à partir des extraits, sans inventer de données. "
+        "Ne mélange pas les chiffres d'un document avec ceux d'un autre. "
+        "Quand la question porte sur des chiffres, présente-les dans un tableau Markdown avec une colonne par document, "
+        "puis commente les écarts. Cite tes sources sous la forme (Doc N, page X). "
+        "Si une information manque pour un document, écris 'non précisé' pour ce document."
+    )
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Extraits :{build_comparison_context(documents, selection)}\n\nQuestion : {question}"}
+    ]
+
+
+def kpi_context(document, max_chars=KPI_CONTEXT_CHARS):
+    """Pages du document les plus pertinentes pour les chiffres clés, balisées `=== [PAGE X] ===`"""
+    numbers = select_pages([document], KPI_QUERY, max_chars)[0]
+    return "".join(f"\n\n=== [PAGE {number}] ===\n{document.page_text(number)}" for number in numbers)
+
+
+# Construction des messages pour l'index des chiffres clés d'un document
+def build_kpi_messages(text):
+    """Demande uniquement le tableau des chiffres clés, avec des noms d'indicateurs imposés"""
+    instructions = (
+        "Tu es analyste financier. On te fournit des pages d'un rapport financier, balisées '=== [PAGE X] ==='.\n"
+        "Extrais les chiffres clés de l'exercice principal du rapport. Réponds uniquement avec un tableau Markdown :\n"
+        "| Indicateur | Valeur | Période | Page |\n"
+        "|---|---:|---|---:|\n"
+        f"Utilise exactement ces noms d'indicateurs lorsqu'ils s'appliquent : {', '.join(KPI_NAMES)}. "
+        "Indique la valeur avec son unité (ex. '1 136 M€', '12,5 %'). "
+        "N'inclus que les indicateurs présents dans le texte, sans rien inventer."
+    )
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Texte PDF :{text}"}
+    ]
+
+
+def _indicator_key(name):
+    return " ".join(tokenize(name.replace("’", "'")))
+
+
+def parse_amount(value):
+    """« 1 136,5 M€ » -> (1136500000.0, "€") ; « 12,5 % » -> (12.5, "%") ; None si ce n'est pas un montant
+
+    Un point suivi de groupes de trois chiffres sépare les milliers
+    (« 1.234 M€ », à la française) ; une virgule seule est décimale, sauf
+    répétée (« 1,234,567 »).
+    """
+    match = _AMOUNT_RE.fullmatch((value or "").strip().strip("*"))
+    if not match:
+        return None
+    parenthesis, sign, digits, unit = match.groups()
+    digits = re.sub(r"[\s  ]", "", digits).rstrip(".,")
+    if "," in digits and "." in digits:
+        # Le dernier séparateur est la virgule décimale
+        decimal = "," if digits.rfind(",") > digits.rfind(".") else "."
+        digits = digits.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    elif re.fullmatch(r"\d{1,3}(\.\d{3})+", digits) or re.fullmatch(r"\d{1,3}(,\d{3}){2,}", digits):
+        digits = re.sub(r"[.,]", "", digits)
+    else:
+        digits = digits.replace(",", ".")
+    try:
+        number = float(digits)
+    except ValueError:
+        return None
+    if parenthesis or sign in ("-", "−"):
+        number = -number
+
+    # Unité seule, sans commentaire entre parenthèses
+    unit = re.sub(r"\(.*", "", unit).strip().lower()
+    if unit.startswith("%"):
+        return number, "%"
+    scale = 1.0
+    for prefixes, factor in _SCALES:
+        prefix = next((p for p in prefixes if re.match(rf"{p}(?![a-z])", unit)), None)
+        if prefix:
+            scale, unit = factor, unit[len(prefix):].strip()
+            break
+    unit = re.sub(r"^(d'|d’|de )", "", unit).strip()
+    return number * scale, _CURRENCIES.get(unit, unit)
+
+
+def format_delta(before, after):
+    """Écart entre deux valeurs : « +12,3 % » pour des montants, « +1,2 pt » pour des pourcentages"""
+    old, new = parse_amount(before), parse_amount(after)
+    if old is None or new is None or old[1] != new[1]:
+        return ""
+    if new[1] == "%":
+        return f"{new[0] - old[0]:+.1f} pt".replace(".", ",")
+    if old[0] == 0:
+        return ""
+    return f"{(new[0] - old[0]) / abs(old[0]) * 100:+.1f} %".replace(".", ",")
+
+
+def merge_kpis(documents, kpi_tables):
+    """Tableau comparatif : une ligne par indicateur, une colonne par document, puis les écarts successifs"""
+    labels = document_labels(documents)
+    names = {}
+    values = {}
+    for label, table in zip(labels, kpi_tables):
+        for name, entry in table.items():
+            key = _indicator_key(name)
+            names.setdefault(key, name)
+            values.setdefault(key, {})[label] = entry["value"]
+
+    order = {_indicator_key(name): i for i, name in enumerate(KPI_NAMES)}
+    rows = []
+    for key in sorted(names, key=lambda k: (order.get(k, len(order)), names[k].lower())):
+        row = {"Indicateur": names[key]}
+        for label in labels:
+            row[label] = values[key].get(label, "")
+        for before, after in zip(labels, labels[1:]):
+            row[f"Δ {before} → {after}"] = format_delta(values[key].get(before), values[key].get(after))
+        rows.append(row)
+    return rows
+
+
+def pages_caption(documents, selection):
+    """Pages transmises au modèle, par document"""
+    labels = document_labels(documents)
+    return " ; ".join(
+        f"{label} : p. {', '.join(str(n) for n in numbers)}" if numbers else f"{label} : aucune page"
+        for label, numbers in zip(labels, selection)
+    )
+
+
+def render_kpi_comparison(rows, key):
+    """Tableau comparatif des chiffres clés, avec téléchargement CSV"""
+    import csv
+    import io
+
+    import streamlit as st
+
+    if not rows:
+        st.caption("Aucun chiffre clé trouvé dans les documents.")
+        return
+    st.dataframe(rows, hide_index=True)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    st.download_button(
+        label="💾 Télécharger le tableau (CSV)",
+        data=buffer.getvalue(),
+        file_name="comparaison_chiffres_cles.csv",
+        mime="text/csv",
+        key=f"{key}_download",
+    )
@@ -0,0 +1,93 @@
+"""Mémoire de conversation bornée pour les questions interactives.
+
+Seuls les derniers échanges sont envoyés tels quels au modèle ; les plus
+anciens sont condensés dans un résumé glissant. Le coût d'un tour de
+conversation (tokens envoyés, temps de rendu) reste ainsi constant au lieu
+de croître avec la longueur de la session.
+"""
+import html
+
+from storage import CompressedText
+
+
+def _to_html(role, content):
+    # Rendu calculé une seule fois par message, puis réutilisé à chaque rerun
+    label = "Vous" if role == "user" else "Assistant"
+    css = "user-message" if role == "user" else "assistant-message"
+    body = html.escape(content).replace("\n", "<br>")
+    return f'<div class="chat-message {css}"><strong>{label} :</strong> {body}</div>'
+
+
+class ConversationMemory:
+    """Fenêtre des derniers échanges + résumé glissant des échanges plus anciens."""
+
+    def __init__(self, window_turns=4, compact_batch=2):
+        self.window_turns = window_turns
+        # Nombre d'échanges condensés d'un coup : amortit le coût des appels de résumé
+        self.compact_batch = compact_batch
+        self.turns = []           # échanges récents, envoyés au modèle
+        self.archived = []        # HTML compressé des échanges condensés, conservé pour l'affichage
+        self.summary = ""         # résumé glissant des échanges archivés
+
+    def __len__(self):
+        return len(self.archived) + len(self.turns)
+
+    def add_turn(self, question, answer, error=False):
+        """Ajoute un échange ; les réponses en erreur ne sont jamais envoyées au modèle."""
+        self.turns.append({
+            "question": question,
+            "answer": answer,
+            "error": error,
+            "html": _to_html("user", question) + _to_html("assistant", answer),
+        })
+
+    def restore(self, exchanges):
+        """Reprend des échanges archivés : les plus anciens ne sont conservés que pour l'affichage."""
+        for question, answer in exchanges:
+            self.add_turn(question, answer)
+        count = max(0, len(self.turns) - self.window_turns)
+        self.archived.extend(CompressedText(turn["html"]) for turn in self.turns[:count])
+        del self.turns[:count]
+
+    def history(self):
+        """Messages des échanges récents, au format attendu par `ollama.chat`."""
+        messages = []
+        for turn in self.turns:
+            if turn["error"]:
+                continue
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def needs_compaction(self):
+        return len(self.turns) >= self.window_turns + self.compact_batch
+
+    def compact(self, summarize):
+        """Condense les échanges les plus anciens hors de la fenêtre.
+
+        `summarize(résumé_précédent, échanges)` retourne le nouveau résumé.
+        En cas d'échec, les échanges restent dans la fenêtre et seront
+        condensés au tour suivant.
+        """
+        if not self.needs_compaction():
+            return False
+        count = len(self.turns) - self.window_turns
+        oldest = self.turns[:count]
+        usable = [t for t in oldest if not t["error"]]
+        if usable:
+            self.summary = summarize(self.summary, usable)
+        # Les échanges archivés ne sont plus envoyés au modèle : seul leur rendu est conservé, compressé
+        self.archived.extend(CompressedText(turn["html"]) for turn in oldest)
+        del self.turns[:count]
+        return True
+
+    def recent_html(self):
+        return "".join(turn["html"] for turn in self.turns)
+
+    def archived_html(self):
+        return "".join(turn.get() for turn in self.archived)
+
+    def clear(self):
+        self.turns.clear()
+        self.archived.clear()
+        self.summary = ""
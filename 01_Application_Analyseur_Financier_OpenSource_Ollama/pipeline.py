@@ -0,0 +1,379 @@
+"""Pipeline d'analyse indépendant de l'interface Streamlit.
+
+Extraction du texte PDF, construction des prompts et appels à Ollama.
+Les fonctions lèvent des exceptions au lieu d'afficher des messages : c'est
+`app.py` qui les présente à l'utilisateur. Ce module est aussi utilisé tel
+quel par les scripts de `benchmarks/`.
+
+Le client Ollama et PyMuPDF ne sont importés qu'au premier appel : le
+premier affichage de l'application n'attend pas leur chargement. Chaque
+appel transmet le `keep_alive` du gestionnaire de `warmup.py`, qui garde le
+modèle en mémoire entre deux requêtes.
+"""
+from instrumentation import PipelineMetrics, ollama_usage
+from batch import batch_max_tokens, build_batch_messages, parse_batch_answers
+from extraction import DEFAULT_MODE
+from compare import COMPARISON_CHARS, build_comparison_messages, build_kpi_messages, kpi_context, select_pages
+from revisions import DocumentAnalysis, parse_kpi_table
+from singleflight import INFLIGHT, request_key
+from spool import read_pdf
+from warmup import MANAGER
+
+BACKEND = "ollama"
+
+
+def _metrics_or_discard(metrics):
+    # Sans collecteur fourni, les mesures sont simplement ignorées
+    return metrics if metrics is not None else PipelineMetrics(BACKEND, max_events=0)
+
+
+# Fonction pour extraire les pages du PDF (réutilise les pages inchangées de `previous`)
+def load_document(pdf_source, previous=None, metrics=None, mode=DEFAULT_MODE):
+    """Extrait les pages d'un PDF (octets, ou `SpooledPDF` pour un fichier volumineux) avec leurs empreintes.
+
+    Retourne une `DocumentAnalysis` ; les pages déjà présentes dans la
+    version précédente `previous` ne sont pas ré-extraites. `mode` : mode
+    d'extraction du texte (voir `extraction.MODES`).
+    """
+    return DocumentAnalysis.from_pdf(pdf_source, previous, metrics=_metrics_or_discard(metrics), mode=mode)
+
+
+# Fonction pour extraire le texte du PDF
+def extract_pdf_text(pdf_file, max_length=120000, metrics=None):
+    """Extrait le texte d'un fichier PDF avec repères de pages.
+
+    Retourne le couple (texte, tronqué).
+    """
+    # Au-delà du seuil, le fichier est recopié par blocs sur disque plutôt que lu en mémoire
+    return load_document(read_pdf(pdf_file), metrics=metrics).text(max_length)
+
+
+# Construction des messages pour le résumé
+def build_summary_messages(text, summary_length=300):
+    """Assemble le prompt système et le texte du document pour le résumé"""
+
+    system_prompt = f"""Tu es analyste financier expert. On te fournit le texte d'un document financier
+(rapport annuel, trimestriel, comptes, bilan, annexes).
+
+Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :
+
+- **Société / Période / Devise** : (si repérable)
+- **Résumé exécutif** : activité, faits marquants, contexte ({summary_length//4}-{summary_length//3} lignes)
+- **Chiffres clés** (tableau) :
+ | Indicateur | Valeur | Évolution/Contexte | Période | Page |
+ |---|---:|---|---|---:|
+ (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,
+ Dette nette, Trésorerie, etc.)
+- **Analyse** :
+ - Performance (croissance, marges, cash)
+ - Structure financière (dette, liquidité)
+ - Risques & incertitudes (marché, réglementation, change)
+ - Outlook / Guidance (si communiqué)
+- **Références internes** : pages/sections à relire
+
+Exigences :
+- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.
+- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).
+- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).
+- Reste concis : {summary_length-50}-{summary_length+50} mots hors tableau."""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour les notes d'une section
+def build_section_messages(text):
+    """Demande des notes de lecture chiffrées sur une section du document"""
+
+    system_prompt = """Tu es analyste financier. On te fournit une section (quelques pages) d'un document financier.
+Relève en Markdown, sous forme de liste concise :
+- les indicateurs chiffrés (indicateur, valeur, période, page) ;
+- les faits marquants, risques et perspectives mentionnés.
+
+Exigences :
+- **N'invente aucun chiffre** et n'ajoute rien qui ne figure pas dans la section.
+- Cite la **Page** d'origine (repère `=== [PAGE X] ===`).
+- 200 mots maximum hors chiffres."""
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour une question
+def build_question_messages(question, text, history=None, conversation_summary=""):
+    """Assemble le prompt système, le document, la conversation et la question.
+
+    Le document est placé en tête, avant l'historique : ce préfixe reste
+    identique d'un tour à l'autre et Ollama peut réutiliser son cache.
+    """
+
+    system_prompt = """Tu es analyste financier. On te donne un extrait de rapport financier. 
+Réponds uniquement à la question posée, sans inventer de données. 
+Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. 
+Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===').
+Sois concis et précis."""
+
+    messages = [{"role": "system", "content": f"{system_prompt}\n\nTexte PDF :\n{text}"}]
+    if conversation_summary:
+        messages.append({
+            "role": "system",
+            "content": f"Résumé des échanges précédents avec l'utilisateur :\n{conversation_summary}"
+        })
+    messages.extend(history or [])
+    messages.append({"role": "user", "content": f"Question : {question}"})
+    return messages
+
+
+# Construction des messages pour condenser la conversation
+def build_memory_messages(previous_summary, turns):
+    """Demande un résumé glissant mis à jour avec les échanges sortis de la fenêtre"""
+
+    exchanges = "\n\n".join(
+        f"Question : {turn['question']}\nRéponse : {turn['answer']}" for turn in turns
+    )
+    return [
+        {"role": "system", "content": (
+            "Tu maintiens la mémoire d'une conversation entre un analyste et un assistant "
+            "au sujet d'un document financier. Mets à jour le résumé existant avec les "
+            "nouveaux échanges. Conserve les chiffres, les pages citées et les sujets "
+            "abordés ; supprime les formulations redondantes. 150 mots maximum."
+        )},
+        {"role": "user", "content": (
+            f"Résumé existant :\n{previous_summary or '(aucun)'}\n\nNouveaux échanges :\n{exchanges}"
+        )}
+    ]
+
+
+# Appel instrumenté à Ollama
+def chat(model, messages, options, call, metrics=None, json_output=False):
+    """Envoie les messages à Ollama et retourne le contenu de la réponse.
+
+    Les appels identiques simultanés (même modèle, même prompt, même
+    document) partagent une seule requête. `json_output` contraint le
+    modèle à produire un objet JSON.
+    """
+    import ollama
+
+    metrics = _metrics_or_discard(metrics)
+    response_format = "json" if json_output else ""
+    with metrics.stage("llm", call=call, model=model) as event:
+        def request():
+            response = ollama.chat(model=model, messages=messages, options=options, format=response_format,
+                                   keep_alive=MANAGER.keep_alive(model))
+            event.update(ollama_usage(response))
+            return response['message']['content']
+
+        key = request_key(BACKEND, model, messages, options=options, format=response_format)
+        content, event["coalesced"] = INFLIGHT.do(key, request)
+    return content
+
+
+# Appel instrumenté à Ollama, réponse produite au fil de la génération
+def chat_stream(model, messages, options, call, metrics=None):
+    """Comme `chat`, mais produit les fragments de texte dès leur génération"""
+    import ollama
+
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("llm", call=call, model=model, stream=True) as event:
+        for chunk in ollama.chat(model=model, messages=messages, options=options, stream=True,
+                                 keep_alive=MANAGER.keep_alive(model)):
+            content = chunk['message']['content']
+            if content:
+                yield content
+            if chunk.get('done'):
+                event.update(ollama_usage(chunk))
+
+
+# Fonction pour générer le résumé avec Ollama
+def generate_summary(text, model, summary_length=300, temperature=0.3, metrics=None):
+    """Génère un résumé financier avec Ollama"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="summary"):
+        messages = build_summary_messages(text, summary_length)
+
+    return chat(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": 2000
+        },
+        call="summary",
+        metrics=metrics,
+    )
+
+
+# Fonction pour produire les notes de lecture d'une section
+def summarize_section(text, model, temperature=0.3, metrics=None):
+    """Retourne les notes de lecture d'une section du document"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="section"):
+        messages = build_section_messages(text)
+
+    return chat(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": 800
+        },
+        call="section",
+        metrics=metrics,
+    )
+
+
+# Fonction pour résumer un document par sections (réanalyse incrémentale)
+def generate_document_summary(analysis, text, model, summary_length=300, temperature=0.3, metrics=None):
+    """Résume `text` par sections ; sur une nouvelle version, seules les sections modifiées repassent par le modèle"""
+    return analysis.summarize(
+        text,
+        summarize_section=lambda section: summarize_section(section, model, temperature, metrics=metrics),
+        summarize_document=lambda content: generate_summary(content, model, summary_length, temperature, metrics=metrics),
+        variant=f"{BACKEND}|{model}|{summary_length}|{temperature}",
+    )
+
+
+# Fonction pour répondre aux questions avec Ollama
+def answer_question(question, text, model, temperature=0.1, metrics=None,
+                    history=None, conversation_summary="", call="question"):
+    """Répond à une question spécifique sur le document avec Ollama.
+
+    `call` étiquette l'appel dans l'instrumentation (« prefetch » pour le préchargement).
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call=call):
+        messages = build_question_messages(question, text, history, conversation_summary)
+
+    return chat(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": 500
+        },
+        call=call,
+        metrics=metrics,
+    )
+
+
+# Fonction pour répondre aux questions avec Ollama, au fil de la génération
+def stream_answer(question, text, model, temperature=0.1, metrics=None):
+    """Comme `answer_question`, sans mémoire de conversation, en produisant la réponse par fragments"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="question"):
+        messages = build_question_messages(question, text)
+
+    yield from chat_stream(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": 500
+        },
+        call="question",
+        metrics=metrics,
+    )
+
+
+# Fonction pour répondre à plusieurs questions en un seul appel à Ollama
+def answer_questions(questions, text, model, temperature=0.1, metrics=None):
+    """Répond à une liste de questions avec une seule copie du document.
+
+    Retourne une liste de dictionnaires {question, answer, batched} ; les
+    questions restées sans réponse exploitable sont reposées une à une.
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="batch"):
+        messages = build_batch_messages(questions, text)
+
+    raw = chat(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": batch_max_tokens(len(questions))
+        },
+        call="batch",
+        metrics=metrics,
+        json_output=True,
+    )
+
+    results = []
+    for question, answer in zip(questions, parse_batch_answers(raw, len(questions))):
+        batched = answer is not None
+        if not batched:
+            answer = answer_question(question, text, model, temperature, metrics=metrics)
+        results.append({"question": question, "answer": answer, "batched": batched})
+    return results
+
+
+# Fonction pour condenser les anciens échanges de la conversation
+def summarize_conversation(previous_summary, turns, model, metrics=None):
+    """Retourne le résumé glissant mis à jour avec `turns`"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="memory"):
+        messages = build_memory_messages(previous_summary, turns)
+
+    return chat(
+        model,
+        messages,
+        options={
+            "temperature": 0.0,
+            "num_predict": 300
+        },
+        call="memory",
+        metrics=metrics,
+    )
+
+
+# Fonction pour extraire les chiffres clés d'un document du mode comparaison
+def extract_kpis(document, model, metrics=None):
+    """Chiffres clés d'un `ComparedDocument` ({indicateur: {value, period, page}}), extraits une fois par modèle"""
+    variant = f"{BACKEND}|{model}"
+    if variant not in document.kpis:
+        metrics = _metrics_or_discard(metrics)
+        with metrics.stage("prompt", call="kpis"):
+            messages = build_kpi_messages(kpi_context(document))
+
+        raw = chat(
+            model,
+            messages,
+            options={
+                "temperature": 0.0,
+                "num_predict": 800
+            },
+            call="kpis",
+            metrics=metrics,
+        )
+        document.kpis[variant] = parse_kpi_table(raw)
+    return document.kpis[variant]
+
+
+# Fonction pour répondre à une question portant sur plusieurs documents
+def answer_comparison(question, documents, model, temperature=0.1, max_chars=COMPARISON_CHARS, metrics=None):
+    """Répond à partir des pages de chaque document les plus pertinentes pour la question.
+
+    Les documents se partagent un budget commun de `max_chars` caractères.
+    Retourne le couple (réponse, numéros des pages retenues par document).
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="comparison") as event:
+        selection = select_pages(documents, question, max_chars)
+        messages = build_comparison_messages(question, documents, selection)
+        event["pages"] = sum(len(numbers) for numbers in selection)
+
+    answer = chat(
+        model,
+        messages,
+        options={
+            "temperature": temperature,
+            "num_predict": 1000
+        },
+        call="comparison",
+        metrics=metrics,
+    )
+    return answer, selection
@@ -0,0 +1,67 @@
+"""Mutualisation des appels LLM identiques en cours (« single-flight »).
+
+Lorsque plusieurs sessions posent au même moment la même question au même
+modèle sur le même document, un seul appel part vers le LLM : les autres
+attendent son résultat (ou son erreur) et le reçoivent tel quel. Rien n'est
+conservé après la fin de l'appel ; ce n'est pas un cache.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+
+def request_key(backend, model, messages, **params):
+    """Clé d'un appel : backend, modèle, prompt complet (document compris) et paramètres."""
+    payload = json.dumps(
+        {"backend": backend, "model": model, "messages": messages, "params": params},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Un seul appel en vol par clé ; les appels concurrents partagent son résultat."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.calls = 0       # appels réellement exécutés
+        self.shared = 0      # appels servis par un appel déjà en vol
+
+    def do(self, key, fn):
+        """Exécute `fn()` ou attend l'appel identique en cours.
+
+        Retourne le couple (résultat, mutualisé).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "inflight": len(self._inflight)}
+
+
+# Instance unique pour le processus (partagée entre sessions Streamlit)
+INFLIGHT = SingleFlight()
@@ -0,0 +1,151 @@
+"""Import des PDF volumineux : fichier sur disque, extraction par fenêtres de pages.
+
+Chargé en mémoire, un rapport de 200 Mo y est présent plusieurs fois : copie
+renvoyée par `getvalue()`, tampon ouvert par PyMuPDF, octets gardés en session
+pour la visionneuse. Au-delà de `SPOOL_THRESHOLD`, le fichier importé est donc
+recopié par blocs dans un fichier temporaire (l'empreinte est calculée au
+passage) et PyMuPDF l'ouvre par son chemin : MuPDF ne lit du disque que les
+parties du fichier dont il a besoin.
+
+L'extraction avance par fenêtres de pages dont la taille découle du plafond
+`MEMORY_CEILING` ; entre deux fenêtres, le document est rouvert et le cache
+d'objets de MuPDF vidé. Le texte de chaque page est compressé dès son
+extraction : la mémoire reste bornée quelle que soit la taille du document.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+# Taille au-delà de laquelle un PDF importé est recopié sur disque plutôt que gardé en mémoire
+SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD_MB", "32")) * 1024 * 1024
+
+# Mémoire de travail visée pendant l'extraction d'une fenêtre de pages
+MEMORY_CEILING = int(os.getenv("PDF_MEMORY_CEILING_MB", "256")) * 1024 * 1024
+
+# Répertoire des fichiers temporaires (défaut : celui du système)
+SPOOL_DIR = os.getenv("PDF_SPOOL_DIR") or None
+
+CHUNK_BYTES = 1024 * 1024
+
+# Mémoire estimée d'une page en cours d'extraction, en multiple de sa part moyenne du fichier
+# (flux décompressés, polices et images chargées par MuPDF)
+PAGE_MEMORY_FACTOR = 4
+MIN_WINDOW_PAGES = 16
+
+# Imports déjà recopiés sur disque, pour ne pas les recopier à chaque rerun de Streamlit
+MAX_SPOOLED_UPLOADS = 8
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpooledPDF:
+    """PDF conservé dans un fichier temporaire, supprimé lorsque l'objet n'est plus référencé."""
+
+    def __init__(self, path, size, doc_hash, name=""):
+        self.path = path
+        self.size = size
+        self.doc_hash = doc_hash   # SHA-256 du contenu, comme pour un PDF en mémoire
+        self.name = name
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    @classmethod
+    def from_chunks(cls, chunks, name="", directory=SPOOL_DIR):
+        """Écrit les blocs d'octets `chunks` sur disque en calculant l'empreinte au passage."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = tempfile.mkstemp(prefix="analyseur_", suffix=".pdf", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            _remove(path)
+            raise
+        return cls(path, size, digest.hexdigest(), name)
+
+    @classmethod
+    def from_stream(cls, stream, name="", chunk_bytes=CHUNK_BYTES):
+        stream.seek(0)
+        return cls.from_chunks(iter(lambda: stream.read(chunk_bytes), b""), name)
+
+    def chunks(self, chunk_bytes=CHUNK_BYTES):
+        with open(self.path, "rb") as source:
+            yield from iter(lambda: source.read(chunk_bytes), b"")
+
+    def __len__(self):
+        return self.size
+
+
+def open_pdf(source):
+    """Ouvre un PDF avec PyMuPDF, qu'il soit en mémoire (octets) ou sur disque (`SpooledPDF`)."""
+    import fitz  # PyMuPDF, chargé au premier document pour accélérer le démarrage
+
+    if isinstance(source, SpooledPDF):
+        return fitz.open(source.path)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def pdf_digest(source):
+    """Empreinte SHA-256 du contenu d'un PDF (calculée à l'import pour un `SpooledPDF`)."""
+    if isinstance(source, SpooledPDF):
+        return source.doc_hash
+    return hashlib.sha256(source).hexdigest()
+
+
+def window_pages(source_size, page_count, ceiling=MEMORY_CEILING):
+    """Nombre de pages extraites par fenêtre pour rester sous le plafond mémoire."""
+    per_page = PAGE_MEMORY_FACTOR * source_size / max(page_count, 1)
+    return max(MIN_WINDOW_PAGES, int(ceiling // max(per_page, 1)))
+
+
+def release_pdf_memory():
+    """Vide le cache d'objets de MuPDF (polices, images, flux décodés)."""
+    import fitz
+
+    fitz.TOOLS.store_shrink(100)
+
+
+def read_pdf(stream, threshold=SPOOL_THRESHOLD, name=""):
+    """Contenu d'un fichier ouvert : octets, ou `SpooledPDF` recopié par blocs au-delà de `threshold`."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size <= threshold:
+        return stream.read()
+    return SpooledPDF.from_stream(stream, name or getattr(stream, "name", ""))
+
+
+_uploads = OrderedDict()
+_uploads_lock = threading.Lock()
+
+
+def read_upload(uploaded_file, threshold=SPOOL_THRESHOLD):
+    """Contenu d'un fichier importé dans Streamlit (octets, ou `SpooledPDF` au-delà de `threshold`).
+
+    Un même import n'est recopié sur disque qu'une fois, quel que soit le
+    nombre de reruns.
+    """
+    if uploaded_file.size <= threshold:
+        return uploaded_file.getvalue()
+    key = uploaded_file.file_id
+    with _uploads_lock:
+        spooled = _uploads.get(key)
+        if spooled is not None:
+            _uploads.move_to_end(key)
+            return spooled
+    spooled = read_pdf(uploaded_file, threshold, uploaded_file.name)
+    with _uploads_lock:
+        _uploads[key] = spooled
+        while len(_uploads) > MAX_SPOOLED_UPLOADS:
+            _uploads.popitem(last=False)
+    return spooled
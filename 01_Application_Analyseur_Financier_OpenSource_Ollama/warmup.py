@@ -0,0 +1,284 @@
+"""Préchargement et maintien en mémoire des modèles Ollama.
+
+Après une période d'inactivité, Ollama décharge le modèle : le premier appel
+suivant attend son chargement (5 à 20 s pour llama3.1:8b) avant de
+produire le moindre token. Le gestionnaire de ce module :
+
+- précharge en arrière-plan le modèle dès qu'il est choisi dans la sidebar
+  (requête de génération vide), avant que l'utilisateur ne lance un résumé ;
+- transmet à chaque appel un `keep_alive` configurable, pour que le modèle
+  reste en mémoire entre deux questions. Chaque session garde sa propre
+  demande ; le modèle est épinglé pour la plus longue des demandes en cours,
+  si bien que deux analystes aux choix différents ne se l'arrachent pas ;
+- décharge (`keep_alive=0`) les modèles qu'il a épinglés lorsque plus
+  personne ne les a sélectionnés ni utilisés depuis `IDLE_UNLOAD_S`, sauf
+  ceux épinglés « Toujours » (-1). Les modèles chargés par d'autres
+  programmes ne sont jamais déchargés.
+
+L'état de chargement et la mémoire occupée viennent de `/api/ps`.
+"""
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+def parse_keep_alive(value):
+    """Durée Ollama (« 30m », « 2h ») ou nombre de secondes ; -1 garde le modèle indéfiniment"""
+    value = str(value).strip()
+    # Ollama refuse une durée sans unité : les nombres sont transmis comme tels
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def keep_alive_seconds(value):
+    """Durée d'un `keep_alive` en secondes ; l'infini pour une valeur négative (jamais déchargé)"""
+    if isinstance(value, (int, float)):
+        return math.inf if value < 0 else float(value)
+    value = str(value).strip()
+    if value.startswith("-"):
+        return math.inf
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_RE.findall(value))
+
+
+# Durées proposées dans la sidebar
+KEEP_ALIVE_OPTIONS = {"5m": "5 min", "30m": "30 min", "2h": "2 h", -1: "Toujours"}
+DEFAULT_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+
+# Un modèle épinglé est déchargé après ce délai sans sélection ni appel (s)
+IDLE_UNLOAD_S = int(os.getenv("OLLAMA_IDLE_UNLOAD_S", "1800"))
+
+# Intervalle de vérification des modèles inactifs (s)
+JANITOR_INTERVAL_S = 60
+
+# Fraîcheur de l'état lu dans /api/ps, consulté plusieurs fois par affichage (s)
+PS_CACHE_S = 2.0
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+
+
+def _format_bytes(size):
+    return f"{size / 1024 ** 3:.1f} Go" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.0f} Mo"
+
+
+class ModelState:
+    """Ce que le gestionnaire sait d'un modèle qu'il a épinglé."""
+
+    def __init__(self):
+        self.requests = {}        # session -> (keep_alive demandé, dernière sélection)
+        self.pinned = None        # keep_alive appliqué par le dernier préchargement
+        self.last_used = time.monotonic()
+        self.loading = False
+        self.load_s = None        # durée du dernier préchargement
+        self.error = None
+
+    @property
+    def keep_alive(self):
+        """La plus longue des durées demandées (DEFAULT_KEEP_ALIVE sans demande en cours)"""
+        if not self.requests:
+            return DEFAULT_KEEP_ALIVE
+        return max((keep_alive for keep_alive, _ in self.requests.values()), key=keep_alive_seconds)
+
+    @property
+    def always(self):
+        return keep_alive_seconds(self.keep_alive) == math.inf
+
+    def prune(self, now, idle_s):
+        """Oublie les demandes des sessions inactives depuis `idle_s` (« Toujours » est conservé)"""
+        self.requests = {session: (keep_alive, seen) for session, (keep_alive, seen) in self.requests.items()
+                         if now - seen <= idle_s or keep_alive_seconds(keep_alive) == math.inf}
+
+
+class ModelManager:
+    """Cycle de vie des modèles Ollama, partagé par toutes les sessions du processus."""
+
+    def __init__(self, idle_unload_s=IDLE_UNLOAD_S):
+        self.idle_unload_s = idle_unload_s
+        self._models = {}
+        self._lock = threading.Lock()
+        self._janitor = None
+        self._resident = (0.0, {})
+
+    def _state(self, model, keep_alive=None, session=None):
+        now = time.monotonic()
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = ModelState()
+        if keep_alive is not None:
+            # Remplace la demande précédente de cette session seulement
+            state.requests[session] = (keep_alive, now)
+        state.prune(now, self.idle_unload_s)
+        state.last_used = now
+        return state
+
+    def select(self, model, keep_alive=None, session=None):
+        """Modèle choisi dans la sidebar par `session` : le précharge s'il n'est pas en mémoire.
+
+        Le modèle est (ré)épinglé quand la plus longue des durées demandées
+        par les sessions actives change, pas à chaque demande.
+        """
+        self._start_janitor()
+        with self._lock:
+            state = self._state(model, keep_alive, session)
+            if state.loading:
+                return
+            repin = state.pinned != state.keep_alive
+        if not repin and model in self.resident():
+            return
+        with self._lock:
+            if state.loading:
+                return
+            state.loading = True
+        _executor.submit(self._preload, model, state)
+
+    def keep_alive(self, model):
+        """`keep_alive` à transmettre à un appel ; compte comme une utilisation du modèle"""
+        self._start_janitor()
+        with self._lock:
+            return self._state(model).keep_alive
+
+    def _preload(self, model, state):
+        import ollama
+
+        keep_alive = state.keep_alive
+        start = time.perf_counter()
+        try:
+            # Une génération sans prompt charge le modèle sans rien produire
+            ollama.generate(model=model, prompt="", keep_alive=keep_alive)
+            state.load_s, state.error, state.pinned = time.perf_counter() - start, None, keep_alive
+        except Exception as e:
+            state.error = str(e)
+        finally:
+            self._resident = (0.0, {})
+            state.loading = False
+
+    def resident(self):
+        """Modèles en mémoire selon Ollama : nom -> entrée de `/api/ps` (vide si Ollama est injoignable)"""
+        import ollama
+
+        checked, models = self._resident
+        if time.monotonic() - checked < PS_CACHE_S:
+            return models
+        try:
+            models = {m.model: m for m in ollama.ps().models}
+        except Exception:
+            models = {}
+        self._resident = (time.monotonic(), models)
+        return models
+
+    def unload(self, model):
+        import ollama
+
+        ollama.generate(model=model, prompt="", keep_alive=0)
+        self._resident = (0.0, {})
+        with self._lock:
+            self._models.pop(model, None)
+
+    def unload_idle(self):
+        """Décharge les modèles épinglés ici et inutilisés depuis `idle_unload_s` ; retourne leurs noms.
+
+        Les modèles épinglés « Toujours » (-1) restent en mémoire.
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = []
+            for model, state in self._models.items():
+                state.prune(now, self.idle_unload_s)
+                if not state.loading and not state.always and now - state.last_used > self.idle_unload_s:
+                    idle.append(model)
+        resident = self.resident()
+        unloaded = []
+        for model in idle:
+            if model not in resident:
+                # Déjà expiré côté Ollama : il suffit de l'oublier
+                with self._lock:
+                    self._models.pop(model, None)
+                continue
+            try:
+                self.unload(model)
+                unloaded.append(model)
+            except Exception:
+                pass
+        return unloaded
+
+    def _start_janitor(self):
+        with self._lock:
+            if self._janitor is None:
+                self._janitor = threading.Thread(target=self._janitor_loop, name="warmup-janitor", daemon=True)
+                self._janitor.start()
+
+    def _janitor_loop(self):
+        while True:
+            time.sleep(JANITOR_INTERVAL_S)
+            self.unload_idle()
+
+    def status(self, model):
+        """État d'un modèle pour l'affichage : chargement, en mémoire, expiration, mémoire occupée"""
+        with self._lock:
+            state = self._models.get(model)
+            loading = bool(state and state.loading)
+            info = {"loading": loading, "keep_alive": state.keep_alive if state else None,
+                    "load_s": state.load_s if state else None, "error": state.error if state else None}
+        entry = None if loading else self.resident().get(model)
+        info["loaded"] = entry is not None
+        if entry is not None:
+            info["size"] = entry.size or 0
+            info["size_vram"] = entry.size_vram or 0
+            info["expires_at"] = entry.expires_at
+        return info
+
+    def snapshot(self):
+        """Modèles en mémoire (tableau de la sidebar)"""
+        rows = []
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            pinned = {model: state.keep_alive for model, state in self._models.items()}
+        for name, entry in self.resident().items():
+            expires = entry.expires_at
+            remaining = (expires - now).total_seconds() if expires else None
+            rows.append({
+                "Modèle": name,
+                "Mémoire": _format_bytes(entry.size or 0),
+                "VRAM": _format_bytes(entry.size_vram or 0),
+                "Expire dans": ("jamais" if remaining is not None and remaining > 365 * 86400
+                                else f"{remaining / 60:.0f} min" if remaining is not None else "?"),
+                "Épinglé": KEEP_ALIVE_OPTIONS.get(pinned[name], pinned[name]) if name in pinned else "",
+            })
+        return rows
+
+
+# Gestionnaire unique pour le processus (mêmes modèles pour toutes les sessions)
+MANAGER = ModelManager()
+
+
+def render_model_status(model, manager=MANAGER):
+    """État de chargement du modèle choisi et modèles en mémoire"""
+    import streamlit as st
+
+    status = manager.status(model)
+    if status["loading"]:
+        st.info(f"⏳ Chargement de {model} en mémoire...")
+    elif status["loaded"]:
+        gpu = f", dont {_format_bytes(status['size_vram'])} en VRAM" if status["size_vram"] else " (CPU)"
+        message = f"🟢 {model} en mémoire : {_format_bytes(status['size'])}{gpu}"
+        if status["load_s"] is not None:
+            message += f" ; préchargé en {status['load_s']:.1f} s"
+        st.caption(message)
+    elif status["error"]:
+        st.warning(f"⚠️ Préchargement impossible : {status['error']}")
+    else:
+        st.caption(f"⚪ {model} pas encore en mémoire (chargé au premier appel)")
+
+    rows = manager.snapshot()
+    if rows:
+        with st.expander(f"🧠 Modèles en mémoire ({len(rows)})"):
+            st.dataframe(rows, hide_index=True)
+            st.caption(f"Les modèles épinglés par l'application sont déchargés après "
+                       f"{manager.idle_unload_s // 60} min sans sélection ni appel, sauf ceux gardés « Toujours ». "
+                       "Un modèle partagé reste en mémoire pour la plus longue durée choisie par les sessions actives.")
@@ -1,10 +1,21 @@
 import streamlit as st
 import os
-import fitz  # PyMuPDF
-from dotenv import load_dotenv
-import requests
-import tempfile
-import uuid
+from contextlib import nullcontext
+import pipeline
+from preview import document_info, render_citation_links, render_page_viewer
+from revisions import render_revision_report
+from boilerplate import format_savings
+from batch import parse_checklist, render_batch_answers
+from compare import MAX_DOCUMENTS, ComparisonSet, document_labels, merge_kpis, pages_caption, render_kpi_comparison
+from prefetch import SUGGESTED_QUESTIONS, Prefetcher, render_prefetch_status
+from routing import AUTO_MODEL, MODELS, last_routed_model, render_router_status
+from ratelimit import render_scheduler_status
+from instrumentation import PipelineMetrics, render_metrics_panel
+from storage import CompressedText, render_session_memory
+from archive import ARCHIVE, render_archive_search
+from spool import pdf_digest, read_upload
+from extraction import DEFAULT_MODE, MODES
+from profiling import DEFAULT_PROFILER, PROFILERS, ProfileRun, render_profile_panel
 
 # Configuration de la page
 st.set_page_config(
@@ -14,6 +25,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Instrumentation du pipeline (une instance par session)
+if 'metrics' not in st.session_state:
+    st.session_state.metrics = PipelineMetrics(backend="openrouter")
+metrics = st.session_state.metrics
+
 # Style personnalisé
 st.markdown("""
 <style>
@@ -71,12 +87,20 @@ st.markdown("""
 st.markdown('<h1 class="main-header">📊 Analyseur de Documents Financiers</h1>', unsafe_allow_html=True)
 st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Analysez vos rapports financiers avec l\'intelligence artificielle via OpenRouter</p>', unsafe_allow_html=True)
 
+# Chargement des variables d'environnement (une seule fois par processus, pas à chaque rerun)
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    return True
+
 # Sidebar pour la configuration
 with st.sidebar:
     st.markdown("## ⚙️ Configuration")
     
     # Chargement des variables d'environnement
-    load_dotenv()
+    load_environment()
     api_key_env = os.getenv("OPENROUTER_API_KEY")
     
     # Section pour la clé API
@@ -113,16 +137,65 @@ with st.sidebar:
         st.error("❌ La clé API semble incorrecte (trop courte)")
         api_key = None
     
-    # Sélection du modèle
+    # Sélection du modèle (automatique : le plus rapide qui accepte la taille du document)
     model = st.selectbox(
         "Modèle OpenRouter:",
-        ["mistralai/mistral-7b-instruct", "meta-llama/llama-3.1-8b-instruct", "anthropic/claude-3-haiku"],
-        index=0
+        [AUTO_MODEL] + list(MODELS),
+        index=0,
+        format_func=lambda name: "🔀 Automatique (routage adaptatif)" if name == AUTO_MODEL else name,
+        help="En automatique, chaque requête va au modèle le plus rapide dont la fenêtre de contexte "
+             "contient le document, avec bascule sur un autre modèle en cas d'erreur."
     )
+    if model == AUTO_MODEL:
+        with st.expander("🔀 Routage des modèles"):
+            render_router_status()
+    with st.expander("🚦 Quotas et budget"):
+        render_scheduler_status()
     
     # Paramètres
     st.markdown("### 📋 Paramètres")
     max_length = st.slider("Longueur maximale du texte (caractères):", 50000, 200000, 120000, step=10000)
+    extraction_mode = st.selectbox(
+        "🧾 Mode d'extraction du texte",
+        list(MODES),
+        index=list(MODES).index(DEFAULT_MODE),
+        format_func=MODES.get,
+        help="Texte brut : le plus rapide. Blocs triés : haut de page vers le bas. Mise en page : colonnes lues l'une après l'autre et lignes de tableau réassemblées (plus lent). Chiffres uniquement : lignes contenant des nombres, pour les pages de chiffres clés (beaucoup moins de tokens)."
+    )
+    prefetch_enabled = st.checkbox(
+        "⚡ Précharger les questions rapides",
+        value=False,
+        help="Après le résumé, répond en arrière-plan aux questions rapides "
+             "(budget de questions et de tokens borné) : leurs boutons répondent ensuite instantanément."
+    )
+    comparison_mode = st.checkbox(
+        "🔀 Mode comparaison",
+        value=False,
+        help=f"Compare 2 à {MAX_DOCUMENTS} rapports (exercices successifs, concurrents) : chiffres clés "
+             "alignés avec leurs écarts et questions portant sur tous les documents."
+    )
+    archive_enabled = st.checkbox(
+        "🗄️ Archiver les analyses",
+        value=False,
+        help="Conserve les pages, le résumé, les chiffres clés et les réponses dans une archive locale "
+             "(SQLite) : recherche plein texte et réouverture sans nouvel appel au modèle. "
+             "L'archive est partagée par tous les utilisateurs de cette instance."
+    )
+    profile_enabled = st.checkbox(
+        "🔬 Profiler l'analyse",
+        value=DEFAULT_PROFILER is not None,
+        help="Profile l'extraction du prochain document puis la génération de son résumé (construction du "
+             "prompt, appel à OpenRouter) : statistiques pstats et piles repliées pour flamegraph, "
+             "téléchargeables dans la sidebar."
+    )
+    if profile_enabled:
+        profile_mode = st.radio(
+            "Profileur",
+            list(PROFILERS),
+            index=list(PROFILERS).index(DEFAULT_PROFILER or "cprofile"),
+            format_func=PROFILERS.get,
+            horizontal=True
+        )
     
     st.markdown("---")
     st.markdown("### 📚 À propos")
@@ -133,7 +206,7 @@ with st.sidebar:
     - Une analyse détaillée
     - Réponses à vos questions spécifiques
     
-    **🔐 Sécurité :** Vos données restent privées et ne sont pas stockées.
+    **🔐 Sécurité :** Vos données ne sont stockées que si vous activez l'archive locale, partagée par tous les utilisateurs de cette instance.
     **🌐 API :** Utilise OpenRouter pour accéder à différents modèles d'IA.
     """)
     
@@ -147,92 +220,27 @@ with st.sidebar:
         📝 Puis configurez-la en utilisant une des options ci-dessus.
         """)
 
-# Fonction pour extraire le texte du PDF
-def extract_pdf_text(pdf_file, max_length):
+# Fonction pour extraire les pages du PDF (les pages inchangées de la version précédente sont réutilisées)
+def load_document(pdf_source, previous=None, mode=DEFAULT_MODE):
     try:
-        # Sauvegarder le fichier temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_path = tmp_file.name
-        
-        # Ouvrir le PDF avec PyMuPDF
-        pdf = fitz.open(tmp_path)
-        texte = ""
-        
-        for i, page in enumerate(pdf, start=1):
-            texte_page = pdf[i-1].get_text()
-            texte += f"\n\n=== [PAGE {i}] ===\n" + texte_page.strip()
-        
-        pdf.close()
-        
-        # Nettoyer le texte
-        texte = "\n".join(l.strip() for l in texte.splitlines())
-        
-        # Tronquer si nécessaire
-        if len(texte) > max_length:
-            texte = texte[:max_length]
-            st.warning(f"⚠️ Le texte a été tronqué à {max_length} caractères pour des raisons de performance.")
-        
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
-        
-        return texte
+        return pipeline.load_document(pdf_source, previous, metrics=metrics, mode=mode)
     except Exception as e:
         st.error(f"Erreur lors de la lecture du PDF: {str(e)}")
         return None
 
-# Fonction pour générer le résumé via OpenRouter
-def generate_summary(text, api_key, model):
+# Fonction pour obtenir le texte du PDF avec repères de pages
+def extract_pdf_text(analysis, max_length):
+    texte, tronque = analysis.text(max_length)
+    
+    if tronque:
+        st.warning(f"⚠️ Le texte a été tronqué à {max_length} caractères pour des raisons de performance.")
+    
+    return texte
+
+# Fonction pour générer le résumé via OpenRouter (seules les sections modifiées sont résumées à nouveau)
+def generate_summary(analysis, text, api_key, model):
     try:
-        # Configuration pour OpenRouter
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "http://localhost:8888/",
-            "Content-Type": "application/json"
-        }
-        
-        # URL de l'API OpenRouter
-        api_url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        consignes = (
-            "Tu es analyste financier. On te fournit le texte d'un document financier\n"
-            "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
-            "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
-            "- **Société / Période / Devise** : (si repérable)\n"
-            "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
-            "- **Chiffres clés** (tableau) :\n"
-            " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
-            " |---|---:|---|---|---:|\n"
-            " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,\n"
-            " Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
-            "- **Analyse** :\n"
-            " - Performance (croissance, marges, cash)\n"
-            " - Structure financière (dette, liquidité)\n"
-            " - Risques & incertitudes (marché, réglementation, change)\n"
-            " - Outlook / Guidance (si communiqué)\n"
-            "- **Références internes** : pages/sections à relire\n\n"
-            "Exigences :\n"
-            "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
-            "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
-            "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
-            "- Reste concis : 200–350 mots hors tableau."
-        )
-        
-        # Préparation de la requête
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": consignes},
-                {"role": "user", "content": text}
-            ]
-        }
-        
-        # Appel API
-        response = requests.post(api_url, json=payload, headers=headers)
-        response_json = response.json()
-        
-        # Extraction du texte de la réponse
-        return response_json['choices'][0]['message']['content']
+        return pipeline.generate_document_summary(analysis, text, api_key, model, metrics=metrics)
         
     except Exception as e:
         st.error(f"Erreur lors de la génération du résumé: {str(e)}")
@@ -241,43 +249,124 @@ def generate_summary(text, api_key, model):
 # Fonction pour répondre aux questions via OpenRouter
 def answer_question(question, text, api_key, model):
     try:
-        # Configuration pour OpenRouter
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "http://localhost:8888/",
-            "Content-Type": "application/json"
-        }
-        
-        # URL de l'API OpenRouter
-        api_url = "https://openrouter.ai/api/v1/chat/completions"
+        return pipeline.answer_question(question, text, api_key, model, metrics=metrics)
         
-        consignes_questions = (
-            "Tu es analyste financier. On te donne le texte d'un rapport financier. "
-            "Réponds uniquement à la question posée, sans inventer de données. "
-            "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
-            "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
-        )
-        
-        # Préparation de la requête
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": consignes_questions},
-                {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
-            ]
-        }
+    except Exception as e:
+        st.error(f"Erreur lors de la réponse à la question: {str(e)}")
+        return None
+
+# Fonction pour répondre à une checklist de questions en un seul appel
+def answer_questions(questions, text, api_key, model):
+    try:
+        return pipeline.answer_questions(questions, text, api_key, model, metrics=metrics)
         
-        # Appel API
-        response = requests.post(api_url, json=payload, headers=headers)
-        response_json = response.json()
+    except Exception as e:
+        st.error(f"Erreur lors de la réponse aux questions: {str(e)}")
+        return None
+
+# Contexte dans lequel une réponse préchargée reste valable
+def prefetch_key(text, model):
+    return (hash(text), model)
+
+# Fonction pour précharger les réponses aux questions rapides (le préchargement précédent est annulé)
+# Le texte reste compressé pendant le préchargement ; il n'est décompressé qu'au moment de chaque appel
+def start_prefetch(stored_text, api_key, model):
+    if st.session_state.get('prefetch') is not None:
+        st.session_state.prefetch.cancel()
+    st.session_state.prefetch = Prefetcher(
+        prefetch_key(stored_text.get(), model),
+        lambda question: pipeline.answer_question(question, stored_text.get(), api_key, model, metrics=metrics, call="prefetch"),
+        stored_text
+    ).start()
+
+# Fonction pour répondre à une question rapide (réponse préchargée si disponible)
+def answer_quick_question(question, text, api_key, model):
+    prefetcher = st.session_state.get('prefetch')
+    if prefetcher is not None and prefetcher.key != prefetch_key(text, model):
+        prefetcher = None
+    
+    if prefetcher is not None and prefetcher.get(question):
+        return prefetcher.get(question)
+    
+    answer = answer_question(question, text, api_key, model)
+    if answer and prefetcher is not None:
+        prefetcher.store(question, answer)
+    return answer
+
+# Fonction pour extraire un document du mode comparaison
+def load_compared_document(pdf_source):
+    return pipeline.load_document(pdf_source, metrics=metrics)
+
+# Fonction pour comparer les chiffres clés de plusieurs documents (extraits une fois par document et par modèle)
+def compare_kpis(documents, api_key, model):
+    try:
+        tables = [pipeline.extract_kpis(document, api_key, model, metrics=metrics) for document in documents]
+        return merge_kpis(documents, tables)
         
-        # Extraction du texte de la réponse
-        return response_json['choices'][0]['message']['content']
+    except Exception as e:
+        st.error(f"Erreur lors de l'extraction des chiffres clés: {str(e)}")
+        return None
+
+# Fonction pour répondre à une question portant sur plusieurs documents via OpenRouter
+def answer_comparison(question, documents, api_key, model, max_chars):
+    try:
+        return pipeline.answer_comparison(question, documents, api_key, model, max_chars, metrics=metrics)
         
     except Exception as e:
-        st.error(f"Erreur lors de la réponse à la question: {str(e)}")
+        st.error(f"Erreur lors de la comparaison: {str(e)}")
         return None
 
+# Modèle enregistré dans l'archive (en automatique, celui qui a réellement répondu)
+def archived_model(model):
+    return model if model != AUTO_MODEL else (last_routed_model(metrics) or AUTO_MODEL)
+
+# Fonction pour archiver un document analysé (un échec n'interrompt pas l'analyse)
+def archive_analysis(doc_hash, filename, analysis, pdf_source, summary, model):
+    try:
+        with metrics.stage("archive", call="save"):
+            ARCHIVE.save_document(doc_hash, filename, analysis, pdf_source)
+            ARCHIVE.save_summary(doc_hash, archived_model(model), summary, analysis)
+    except Exception as e:
+        st.warning(f"⚠️ Archivage impossible: {str(e)}")
+
+# Fonction pour archiver un échange question-réponse
+def archive_answer(question, answer, model):
+    try:
+        ARCHIVE.save_answer(st.session_state.pdf_hash, question, answer, archived_model(model))
+    except Exception as e:
+        st.warning(f"⚠️ Archivage de la réponse impossible: {str(e)}")
+
+# Fonction pour rouvrir un document archivé, sans extraction ni appel au modèle
+def open_archived_document(doc_hash, max_length):
+    try:
+        with metrics.stage("archive", call="open"):
+            archived = ARCHIVE.load(doc_hash)
+    except Exception as e:
+        st.error(f"Erreur lors de la lecture de l'archive: {str(e)}")
+        return False
+    if archived is None or archived.summary is None:
+        st.error("Document introuvable dans l'archive")
+        return False
+    
+    st.session_state.analysis = archived.analysis
+    # Sans PDF archivé, la visionneuse de pages est indisponible
+    st.session_state.pdf_bytes = archived.pdf_source
+    st.session_state.pdf_hash = doc_hash
+    st.session_state.page_count = len(archived.analysis.pages)
+    st.session_state.pdf_text = CompressedText(archived.analysis.text(max_length)[0])
+    st.session_state.summary = archived.summary
+    st.session_state.revision = None
+    st.session_state.batch_answers = None
+    st.session_state.chat_history = [
+        {"role": role, "content": CompressedText(entry[field])}
+        for entry in archived.answers
+        for role, field in (("user", "question"), ("assistant", "answer"))
+    ]
+    if st.session_state.get('prefetch') is not None:
+        st.session_state.prefetch.cancel()
+        st.session_state.prefetch = None
+    return True
+
 # Interface principale
 if not api_key:
     st.markdown('<h2 class="sub-header">🚫 Configuration requise</h2>', unsafe_allow_html=True)
@@ -307,6 +396,70 @@ if not api_key:
     
     st.stop()
 
+# Mode comparaison : chaque document est extrait et indexé une seule fois par session
+if comparison_mode:
+    st.markdown('<h2 class="sub-header">🔀 Comparaison de Documents</h2>', unsafe_allow_html=True)
+    uploaded_files = st.file_uploader(
+        f"Choisissez de 2 à {MAX_DOCUMENTS} documents PDF financiers",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Par exemple les rapports annuels de plusieurs exercices, ou ceux de sociétés comparables"
+    ) or []
+    if len(uploaded_files) > MAX_DOCUMENTS:
+        st.warning(f"⚠️ Seuls les {MAX_DOCUMENTS} premiers documents sont comparés.")
+    
+    if 'comparison' not in st.session_state:
+        st.session_state.comparison = ComparisonSet()
+    selected = []
+    for uploaded in uploaded_files[:MAX_DOCUMENTS]:
+        try:
+            with st.spinner(f"Extraction de {uploaded.name}..."):
+                document = st.session_state.comparison.add_upload(uploaded, load_compared_document)
+            selected.append(document.doc_hash)
+        except Exception as e:
+            st.error(f"Erreur lors de la lecture de {uploaded.name}: {str(e)}")
+    st.session_state.comparison.retain(selected)
+    documents = st.session_state.comparison.documents()
+    
+    if len(documents) < 2:
+        st.info("📂 Importez au moins deux documents pour les comparer.")
+    else:
+        st.caption(" · ".join(
+            f"**{label}** : {document.name} ({len(document.analysis.pages)} pages)"
+            for label, document in zip(document_labels(documents), documents)
+        ))
+        selection_key = (tuple(document.doc_hash for document in documents), model)
+        
+        st.markdown('<h2 class="sub-header">📈 Chiffres Clés Comparés</h2>', unsafe_allow_html=True)
+        if st.button("📊 Comparer les chiffres clés", type="primary"):
+            with st.spinner("Extraction des chiffres clés de chaque document..."):
+                rows = compare_kpis(documents, api_key, model)
+            if rows is not None:
+                st.session_state.comparison_kpis = (selection_key, rows)
+        if st.session_state.get('comparison_kpis', (None,))[0] == selection_key:
+            render_kpi_comparison(st.session_state.comparison_kpis[1], key="comparison_kpis")
+        
+        st.markdown('<h2 class="sub-header">❓ Question sur l\'Ensemble des Documents</h2>', unsafe_allow_html=True)
+        comparison_question = st.text_input(
+            "Votre question :",
+            placeholder="Ex: Comment la marge opérationnelle a-t-elle évolué d'un exercice à l'autre ?",
+            key="comparison_question"
+        )
+        if st.button("🔍 Comparer", key="comparison_ask") and comparison_question:
+            with st.spinner("Recherche des pages pertinentes et analyse..."):
+                result = answer_comparison(comparison_question, documents, api_key, model, max_length)
+            if result is not None:
+                answer, pages = result
+                st.session_state.comparison_answer = (selection_key, answer, pages_caption(documents, pages))
+        if st.session_state.get('comparison_answer', (None,))[0] == selection_key:
+            _, answer, caption = st.session_state.comparison_answer
+            st.markdown(answer)
+            st.caption(f"📄 Pages consultées : {caption}")
+    
+    render_metrics_panel(metrics)
+    render_session_memory(st.session_state)
+    st.stop()
+
 # Section de téléchargement du PDF
 st.markdown('<h2 class="sub-header">📁 Téléchargement du Document</h2>', unsafe_allow_html=True)
 
@@ -323,29 +476,81 @@ if 'summary' not in st.session_state:
     st.session_state.summary = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'batch_answers' not in st.session_state:
+    st.session_state.batch_answers = None
 
-# Traitement du PDF
-if uploaded_file is not None:
-    with st.spinner("📖 Analyse du document en cours..."):
-        pdf_text = extract_pdf_text(uploaded_file, max_length)
+# Archive des analyses : recherche plein texte, réouverture sans appel au modèle
+with st.expander("🗄️ Analyses archivées"):
+    archived_hash = render_archive_search(ARCHIVE, metrics, key="archive")
+if archived_hash and open_archived_document(archived_hash, max_length):
+    # Le fichier encore présent dans la zone d'import ne remplace pas le document rouvert
+    st.session_state.superseded_upload = uploaded_file.file_id if uploaded_file is not None else None
+    st.rerun()
+
+# Traitement du PDF (extraction uniquement lorsqu'un nouveau fichier est importé)
+if uploaded_file is not None and uploaded_file.file_id != st.session_state.get('superseded_upload'):
+    # Octets en mémoire, ou fichier temporaire sur disque (le même à chaque rerun) pour un gros document
+    pdf_bytes = read_upload(uploaded_file)
+    # Nouveau fichier, ou même fichier à extraire dans un autre mode
+    if st.session_state.get('pdf_bytes') != pdf_bytes or st.session_state.analysis.mode != extraction_mode:
+        profile = nullcontext()
+        if profile_enabled:
+            profile = st.session_state.profile = ProfileRun(profile_mode, "openrouter", pdf_digest(pdf_bytes))
+        with profile, st.spinner("📖 Analyse du document en cours..."):
+            analysis = load_document(pdf_bytes, previous=st.session_state.get('analysis'), mode=extraction_mode)
+        
+        if analysis is not None:
+            # Conserver les pages extraites et le PDF pour la vérification des pages citées
+            st.session_state.analysis = analysis
+            st.session_state.pdf_bytes = pdf_bytes
+            st.session_state.pdf_hash, st.session_state.page_count = document_info(pdf_bytes)
+            st.session_state.summary = None
+            st.session_state.revision = None
+            st.session_state.batch_answers = None
+    
+    if st.session_state.get('pdf_bytes') == pdf_bytes:
+        pdf_text = extract_pdf_text(st.session_state.analysis, max_length)
         
         if pdf_text:
-            st.session_state.pdf_text = pdf_text
+            # Texte conservé compressé entre les reruns (recompressé seulement s'il change)
+            if st.session_state.pdf_text is None or st.session_state.pdf_text.get() != pdf_text:
+                st.session_state.pdf_text = CompressedText(pdf_text)
             
             # Aperçu du texte
             with st.expander("👁️ Aperçu du document (cliquez pour voir)"):
                 st.text(pdf_text[:1000] + "..." if len(pdf_text) > 1000 else pdf_text)
             
             st.success(f"✅ Document analysé avec succès ! ({len(pdf_text)} caractères)")
+            if st.session_state.analysis.boilerplate_bytes:
+                st.caption(format_savings(st.session_state.analysis.boilerplate_bytes, st.session_state.analysis.text_bytes))
             
             # Bouton pour générer le résumé
             if st.button("🚀 Générer le Résumé Financier", use_container_width=True):
-                with st.spinner("🤖 Génération du résumé en cours..."):
-                    summary = generate_summary(pdf_text, api_key, model)
+                # Le résumé complète le profil de l'extraction du même document
+                profile = nullcontext()
+                if profile_enabled:
+                    profile = st.session_state.get('profile')
+                    if profile is None or profile.doc_hash != st.session_state.pdf_hash:
+                        profile = st.session_state.profile = ProfileRun(profile_mode, "openrouter", st.session_state.pdf_hash)
+                with profile, st.spinner("🤖 Génération du résumé en cours..."):
+                    summary = generate_summary(st.session_state.analysis, pdf_text, api_key, model)
                     
                     if summary:
                         st.session_state.summary = summary
+                        st.session_state.revision = st.session_state.analysis.revision_report()
                         st.success("✅ Résumé généré avec succès !")
+                        if archive_enabled:
+                            archive_analysis(
+                                st.session_state.pdf_hash, uploaded_file.name, st.session_state.analysis,
+                                pdf_bytes, summary, model
+                            )
+                        
+                        # Réponses spéculatives aux questions rapides, sur la capacité libre du backend
+                        if prefetch_enabled:
+                            start_prefetch(st.session_state.pdf_text, api_key, model)
+                        elif st.session_state.get('prefetch') is not None:
+                            st.session_state.prefetch.cancel()
+                            st.session_state.prefetch = None
 
 # Affichage du résumé
 if st.session_state.summary:
@@ -354,14 +559,21 @@ if st.session_state.summary:
     # Métriques rapides
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📄 Pages analysées", str(pdf_text.count("=== [PAGE")) if st.session_state.pdf_text else "0")
+        st.metric("📄 Pages analysées", str(st.session_state.pdf_text.get().count("=== [PAGE")) if st.session_state.pdf_text else "0")
     with col2:
         st.metric("📊 Caractères", f"{len(st.session_state.pdf_text):,}" if st.session_state.pdf_text else "0")
     with col3:
-        st.metric("🤖 Modèle utilisé", model)
+        st.metric("🤖 Modèle utilisé", model if model != AUTO_MODEL else f"🔀 {last_routed_model(metrics) or AUTO_MODEL}")
+    
+    # Bilan de la réanalyse lorsqu'une nouvelle version du rapport a été importée
+    if st.session_state.get('revision'):
+        render_revision_report(st.session_state.revision)
     
     # Affichage du résumé
-    st.markdown(st.session_state.summary)
+    with metrics.stage("rendu", call="summary"):
+        st.markdown(st.session_state.summary)
+    if st.session_state.get('pdf_bytes'):
+        render_citation_links(st.session_state.summary, st.session_state.page_count, key="summary")
     
     # Bouton de téléchargement
     st.download_button(
@@ -373,19 +585,53 @@ if st.session_state.summary:
 
 # Section de questions interactives
 if st.session_state.pdf_text:
+    # Texte décompressé une fois par exécution (le plus souvent lu dans le cache partagé)
+    pdf_text = st.session_state.pdf_text.get()
     st.markdown('<h2 class="sub-header">❓ Questions Interactives</h2>', unsafe_allow_html=True)
     
     st.info("💡 Posez des questions spécifiques sur votre document financier")
     
-    # Interface de chat
-    for message in st.session_state.chat_history:
+    # Interface de chat (messages conservés compressés)
+    for i, message in enumerate(st.session_state.chat_history):
+        content = message["content"].get()
         with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+            st.markdown(content)
+            if i == len(st.session_state.chat_history) - 1 and message["role"] == "assistant":
+                render_citation_links(content, st.session_state.page_count, key="answer_history")
+    
+    # Questions rapides (⚡ : réponse déjà préchargée)
+    prefetcher = st.session_state.get('prefetch')
+    if prefetcher is not None:
+        if prefetcher.key != prefetch_key(pdf_text, model):
+            # Modèle changé : les réponses préchargées ne correspondent plus
+            prefetcher.cancel()
+            st.session_state.prefetch = prefetcher = None
+        else:
+            render_prefetch_status(prefetcher, key="prefetch")
+    
+    quick_question = None
+    for i, (column, suggested_q) in enumerate(zip(st.columns(len(SUGGESTED_QUESTIONS)), SUGGESTED_QUESTIONS)):
+        ready = prefetcher is not None and prefetcher.get(suggested_q)
+        with column:
+            if st.button(f"{'⚡' if ready else '❓'} {suggested_q}", key=f"quick_{i}", use_container_width=True):
+                quick_question = suggested_q
+    
+    if quick_question:
+        with st.spinner("🤔 Recherche de la réponse..."):
+            response = answer_quick_question(quick_question, pdf_text, api_key, model)
+        if response:
+            st.session_state.chat_history.append({"role": "user", "content": CompressedText(quick_question)})
+            st.session_state.chat_history.append({"role": "assistant", "content": CompressedText(response)})
+            if archive_enabled:
+                archive_answer(quick_question, response, model)
+            st.rerun()
+        else:
+            st.error("❌ Impossible de générer une réponse")
     
     # Input pour la question
     if prompt := st.chat_input("Posez votre question..."):
         # Ajouter la question à l'historique
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
+        st.session_state.chat_history.append({"role": "user", "content": CompressedText(prompt)})
         
         # Afficher la question
         with st.chat_message("user"):
@@ -394,11 +640,14 @@ if st.session_state.pdf_text:
         # Générer la réponse
         with st.chat_message("assistant"):
             with st.spinner("🤔 Recherche de la réponse..."):
-                response = answer_question(prompt, st.session_state.pdf_text, api_key, model)
+                response = answer_question(prompt, pdf_text, api_key, model)
                 
                 if response:
                     st.markdown(response)
-                    st.session_state.chat_history.append({"role": "assistant", "content": response})
+                    render_citation_links(response, st.session_state.page_count, key="answer_latest")
+                    st.session_state.chat_history.append({"role": "assistant", "content": CompressedText(response)})
+                    if archive_enabled:
+                        archive_answer(prompt, response, model)
                 else:
                     st.error("❌ Impossible de générer une réponse")
     
@@ -407,12 +656,51 @@ if st.session_state.pdf_text:
         if st.button("🗑️ Effacer l'historique des questions", use_container_width=True):
             st.session_state.chat_history = []
             st.rerun()
+    
+    # Checklist de revue : toutes les questions en un seul appel
+    with st.expander("📋 Checklist de revue", expanded=bool(st.session_state.batch_answers)):
+        checklist = st.text_area(
+            "Une question par ligne",
+            placeholder="Quel est le chiffre d'affaires ?\nQuelle est la dette nette ?\nQuels sont les principaux risques ?",
+            key="checklist"
+        )
+        if st.button("⚡ Répondre à la checklist (1 appel)", key="checklist_run", use_container_width=True):
+            questions = parse_checklist(checklist)
+            if questions:
+                with st.spinner(f"🤔 Réponse à {len(questions)} questions en cours..."):
+                    results = answer_questions(questions, pdf_text, api_key, model)
+                if results:
+                    st.session_state.batch_answers = results
+                    if archive_enabled:
+                        for result in results:
+                            archive_answer(result["question"], result["answer"], model)
+            else:
+                st.warning("⚠️ La checklist ne contient aucune question")
+        
+        if st.session_state.batch_answers:
+            render_batch_answers(st.session_state.batch_answers, st.session_state.page_count, key="batch")
+
+# Visionneuse des pages (sidebar : visible à côté du résumé et des réponses)
+if st.session_state.get('pdf_bytes'):
+    with st.sidebar.expander("📄 Vérification des pages", expanded=True):
+        with metrics.stage("rendu", call="page_viewer"):
+            render_page_viewer(
+                st.session_state.pdf_bytes,
+                st.session_state.pdf_hash,
+                st.session_state.page_count
+            )
+
+# Panneau d'instrumentation (rendu en fin de script pour refléter l'exécution courante)
+render_metrics_panel(metrics)
+if st.session_state.get('profile'):
+    render_profile_panel(st.session_state.profile, key="profile")
+render_session_memory(st.session_state)
 
 # Footer
 st.markdown("---")
 st.markdown("""
 <div style="text-align: center; color: #666; padding: 2rem;">
-    <p>🔒 Vos données restent confidentielles et ne sont pas stockées</p>
+    <p>🔒 Vos données ne sont stockées que si l'archive est activée</p>
     <p>⚡ Propulsé par OpenRouter et Streamlit</p>
 </div>
 """, unsafe_allow_html=True)
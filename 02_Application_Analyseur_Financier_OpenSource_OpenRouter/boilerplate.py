@@ -0,0 +1,118 @@
+"""Suppression du texte répété de page en page avant l'envoi au modèle.
+
+Les rapports annuels répètent sur chaque page les mêmes en-têtes, pieds de
+page, mentions légales et numéros de page. Les lignes présentes sur une
+grande partie des pages sont repérées par comptage de leurs empreintes,
+puis retirées : seule leur première occurrence est conservée.
+
+Seuls les numéros de pagination sont neutralisés : ligne entière
+(« Page 3 / 120 », « 3 sur 120 ») ou mention finale (« Rapport annuel 2024 —
+page 3 »). Un numéro de page est rapporté à l'index de la page, si bien que
+« 12 » en bas de la page 14 ne se confond pas avec une cellule de tableau.
+Les autres chiffres (dates, montants) font partie de l'empreinte : une ligne
+de chiffres clés dont les valeurs changent d'une page à l'autre n'est jamais
+considérée comme répétée.
+"""
+import hashlib
+import math
+import re
+from collections import Counter
+
+# Part minimale des pages sur lesquelles une ligne doit apparaître
+MIN_PAGE_RATIO = 0.5
+
+# En dessous de ce nombre de pages, aucune ligne n'est considérée comme répétitive
+MIN_PAGES = 4
+
+# Lignes courtes ignorées (en-têtes de colonnes « 2024 », « M€ »...), sauf numéros de page
+MIN_LINE_CHARS = 12
+
+_DIGITS_RE = re.compile(r"\d+")
+# Ligne de pagination entière : « 12 », « p. 12 », « Page 3 / 120 », « 3 sur 120 »
+_PAGE_NUMBER_RE = re.compile(r"^\s*(?:p(?:age|\.)?\s*)?\d{1,4}(?:\s*(?:/|sur|of)\s*\d{1,4})?\s*$", re.IGNORECASE)
+# Mention de pagination en fin de ligne, introduite par « page » ou « p. » (jamais une date « 31/12/2024 »)
+_PAGINATION_SUFFIX_RE = re.compile(r"(?:\bpage|\bp\.)\s*(\d{1,4})(?:\s*(?:/|sur|of)\s*\d{1,4})?\s*$", re.IGNORECASE)
+
+
+def _line_key(line, page_number):
+    """Empreinte d'une ligne candidate, ou None si elle doit toujours être conservée."""
+    normalized = line.strip().lower()
+    if _PAGE_NUMBER_RE.match(normalized):
+        # Numéro de page seul : décalage constant par rapport à l'index de la page
+        number = _DIGITS_RE.search(normalized)
+        offset = int(number.group()) - page_number
+        normalized = f"{normalized[:number.start()]}<p{offset:+d}>{_DIGITS_RE.sub('#', normalized[number.end():])}"
+    elif len(normalized) < MIN_LINE_CHARS:
+        return None
+    else:
+        # Seule la mention finale « page N / M » est neutralisée, le reste de la ligne est gardé tel quel
+        suffix = _PAGINATION_SUFFIX_RE.search(normalized)
+        if suffix:
+            offset = int(suffix.group(1)) - page_number
+            normalized = f"{normalized[:suffix.start()]}<p{offset:+d}>"
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+def _page_keys(text, page_number):
+    return [_line_key(line, page_number) for line in text.splitlines()]
+
+
+def find_boilerplate(pages, min_ratio=MIN_PAGE_RATIO):
+    """Empreintes des lignes présentes sur au moins `min_ratio` des pages.
+
+    `pages` est la liste ordonnée des textes de toutes les pages du document.
+    """
+    if len(pages) < MIN_PAGES:
+        return set()
+    counts = Counter()
+    for page_number, text in enumerate(pages, start=1):
+        counts.update({key for key in _page_keys(text, page_number) if key is not None})
+    threshold = max(MIN_PAGES, math.ceil(min_ratio * len(pages)))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def boilerplate_lines(pages, min_ratio=MIN_PAGE_RATIO):
+    """Indices des lignes répétitives à retirer de chaque page, première occurrence conservée.
+
+    Retourne le couple (tuple d'indices de lignes par page, octets économisés).
+    """
+    boilerplate = find_boilerplate(pages, min_ratio)
+    if not boilerplate:
+        return [()] * len(pages), 0
+
+    seen = set()
+    saved = 0
+    dropped = []
+    for page_number, text in enumerate(pages, start=1):
+        indexes = []
+        for index, (line, key) in enumerate(zip(text.splitlines(), _page_keys(text, page_number))):
+            if key in boilerplate:
+                if key in seen:
+                    saved += len(line.encode("utf-8")) + 1
+                    indexes.append(index)
+                    continue
+                seen.add(key)
+        dropped.append(tuple(indexes))
+    return dropped, saved
+
+
+def strip_boilerplate(pages, min_ratio=MIN_PAGE_RATIO):
+    """Retire les lignes répétitives en conservant leur première occurrence.
+
+    Retourne le couple (textes des pages nettoyés, octets économisés).
+    """
+    dropped, saved = boilerplate_lines(pages, min_ratio)
+    cleaned = []
+    for text, indexes in zip(pages, dropped):
+        skip = set(indexes)
+        cleaned.append("\n".join(line for i, line in enumerate(text.splitlines()) if i not in skip) if skip else text)
+    return cleaned, saved
+
+
+def format_savings(saved_bytes, total_bytes):
+    """Message court décrivant le volume de texte répétitif retiré."""
+    share = saved_bytes / total_bytes if total_bytes else 0.0
+    return (
+        f"🧹 En-têtes, pieds de page et mentions répétés retirés du prompt : "
+        f"{saved_bytes / 1024:,.1f} Ko ({share:.0%} du texte)"
+    )
@@ -0,0 +1,139 @@
+"""Modes d'extraction du texte des pages PDF.
+
+- `text` : texte brut de PyMuPDF, dans l'ordre du flux de contenu (le plus
+  rapide ; les colonnes d'un rapport peuvent s'y entremêler) ;
+- `blocks` : blocs de texte triés de haut en bas puis de gauche à droite ;
+- `layout` : ordre de lecture reconstruit depuis la géométrie des lignes
+  (`get_text("dict")`, découpe XY récursive) : colonnes lues l'une après
+  l'autre, lignes de tableau réassemblées cellule par cellule ;
+- `numbers` : seules les lignes contenant des chiffres, pour les pages de
+  chiffres clés (beaucoup moins de tokens envoyés au modèle).
+
+Un mode supplémentaire se déclare avec `@extraction_mode(nom, libellé)` sur
+une fonction `page -> texte`.
+"""
+import os
+import re
+
+MODES = {}          # nom -> libellé affiché dans la sidebar
+_EXTRACTORS = {}    # nom -> fonction(page) -> texte
+
+# Largeur minimale (part de la page) d'une ligne de colonne de texte : des blocs côte à côte
+# dont les lignes sont plus courtes sont les cellules d'un tableau, lues ligne par ligne
+MIN_COLUMN_WIDTH = 0.2
+
+CELL_SEPARATOR = " | "
+
+# Écart (points) sous lequel deux bandes vides sont de même largeur ; profondeur maximale des découpes
+CUT_TOLERANCE = 1.0
+MAX_CUT_DEPTH = 40
+
+_DIGIT_RE = re.compile(r"\d")
+
+
+def extraction_mode(name, label):
+    """Déclare un mode d'extraction : la fonction décorée reçoit une page PyMuPDF et retourne son texte."""
+    def register(extract):
+        MODES[name] = label
+        _EXTRACTORS[name] = extract
+        return extract
+    return register
+
+
+def extract_page_text(page, mode):
+    """Texte d'une page selon le mode d'extraction `mode`."""
+    try:
+        extract = _EXTRACTORS[mode]
+    except KeyError:
+        raise ValueError(f"Mode d'extraction inconnu : {mode}") from None
+    return extract(page)
+
+
+def _rows(items):
+    """Regroupe des fragments (x0, y0, x1, y1, texte) alignés verticalement en lignes, de haut en bas."""
+    rows = []
+    for item in sorted(items, key=lambda item: (item[1] + item[3]) / 2):
+        middle = (item[1] + item[3]) / 2
+        if rows and abs(middle - rows[-1][0]) <= (item[3] - item[1]) / 2:
+            rows[-1][1].append(item)
+        else:
+            rows.append((middle, [item]))
+    return [sorted(row, key=lambda item: item[0]) for _, row in rows]
+
+
+def _gaps(intervals):
+    """Espaces libres entre des intervalles [début, fin] : [(largeur, position de coupe)]."""
+    gaps, reach = [], None
+    for low, high in sorted(intervals):
+        if reach is not None and low > reach:
+            gaps.append((low - reach, (low + reach) / 2))
+        reach = high if reach is None else max(reach, high)
+    return gaps
+
+
+def _xy_cut(lines, min_width, depth=0):
+    """Ordre de lecture de lignes (x0, y0, x1, y1, texte) par découpes récursives de la page.
+
+    À chaque niveau, la plus large bande vide est retenue : verticale (entre
+    deux colonnes de texte, lues l'une après l'autre) ou horizontale (entre
+    blocs, lus de haut en bas). Sans découpe possible, les lignes sont
+    regroupées par hauteur, cellules d'une même ligne côte à côte.
+    """
+    vertical = [
+        (gap, cut) for gap, cut in _gaps((line[0], line[2]) for line in lines)
+        # Découpe entre colonnes de texte seulement, pas entre colonnes d'un tableau
+        if max((line[2] - line[0] for line in lines if line[2] <= cut), default=0) >= min_width
+        and max((line[2] - line[0] for line in lines if line[0] >= cut), default=0) >= min_width
+    ]
+    horizontal = _gaps((line[1], line[3]) for line in lines)
+    widest = max((gap for gap, _ in horizontal), default=0)
+    if depth < MAX_CUT_DEPTH and vertical and max(vertical)[0] >= widest:
+        cut = max(vertical)[1]
+        return (_xy_cut([line for line in lines if line[2] <= cut], min_width, depth + 1)
+                + _xy_cut([line for line in lines if line[0] >= cut], min_width, depth + 1))
+    if depth < MAX_CUT_DEPTH and horizontal:
+        # Toutes les bandes vides de la plus grande largeur à la fois (interlignes réguliers)
+        cuts = [cut for gap, cut in horizontal if gap >= widest - CUT_TOLERANCE]
+        bands = [[] for _ in range(len(cuts) + 1)]
+        for line in lines:
+            bands[sum(line[1] >= cut for cut in cuts)].append(line)
+        return [text for band in bands for text in _xy_cut(band, min_width, depth + 1)]
+    return [CELL_SEPARATOR.join(item[4].strip() for item in row) for row in _rows(lines)]
+
+
+@extraction_mode("text", "Texte brut (rapide)")
+def _plain_text(page):
+    return page.get_text()
+
+
+@extraction_mode("blocks", "Blocs triés")
+def _sorted_blocks(page):
+    # (x0, y0, x1, y1, texte, numéro, type) ; type 1 = image
+    return "\n".join(block[4].rstrip("\n") for block in page.get_text("blocks", sort=True) if block[6] == 0)
+
+
+@extraction_mode("layout", "Mise en page (colonnes, tableaux)")
+def _reading_order(page):
+    import fitz  # PyMuPDF, déjà chargé pour ouvrir le document
+
+    lines = [
+        (*line["bbox"], "".join(span["text"] for span in line["spans"]))
+        for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+        for line in block.get("lines", ())
+    ]
+    lines = [line for line in lines if line[4].strip()]
+    return "\n".join(_xy_cut(lines, MIN_COLUMN_WIDTH * page.rect.width))
+
+
+@extraction_mode("numbers", "Chiffres uniquement (pages de KPI)")
+def _number_rows(page):
+    # (x0, y0, x1, y1, mot, bloc, ligne, rang) : lignes reconstruites par position, libellé compris
+    rows = _rows(word[:5] for word in page.get_text("words"))
+    lines = (" ".join(item[4] for item in row) for row in rows)
+    return "\n".join(line for line in lines if _DIGIT_RE.search(line))
+
+
+# Mode par défaut (sidebar et exécutions sans interface)
+DEFAULT_MODE = os.getenv("PDF_EXTRACTION_MODE", "text")
+if DEFAULT_MODE not in MODES:
+    DEFAULT_MODE = "text"
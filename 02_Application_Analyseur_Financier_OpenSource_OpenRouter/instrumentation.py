@@ -0,0 +1,216 @@
+"""Instrumentation du pipeline d'analyse.
+
+Mesure la durée de chaque étape (extraction PDF, construction du prompt,
+appel LLM, rendu), les tokens de prompt / de complétion renvoyés par l'API
+et le débit de génération (tokens/s). Les mesures sont exportables en
+JSON lines ou au format texte Prometheus.
+
+Les événements bruts forment une fenêtre bornée (affichage, export JSON) ;
+les compteurs Prometheus sont des totaux cumulés à part, qui ne baissent
+jamais, même quand la fenêtre déborde ou est vidée.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Étapes instrumentées, dans l'ordre du pipeline
+STAGES = ("extraction", "prompt", "llm", "rendu")
+
+
+class PipelineMetrics:
+    """Collecte les mesures d'une session (fenêtre bornée d'événements)."""
+
+    def __init__(self, backend, max_events=500):
+        self.backend = backend
+        self.events = deque(maxlen=max_events)
+        self.totals = {}          # étape -> totaux cumulés depuis la création (compteurs Prometheus)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Chronomètre une étape ; l'événement produit peut être enrichi dans le bloc."""
+        event = {"stage": name, "backend": self.backend, **labels}
+        start = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event["error"] = type(e).__name__
+            raise
+        finally:
+            event["duration_s"] = time.perf_counter() - start
+            event["ts"] = time.time()
+            self._finalize_tokens(event)
+            with self._lock:
+                self.events.append(event)
+                self._accumulate(event)
+
+    def _accumulate(self, event):
+        totals = self.totals.setdefault(event["stage"], {
+            "count": 0, "total_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "coalesced": 0,
+        })
+        totals["count"] += 1
+        totals["total_s"] += event["duration_s"]
+        totals["prompt_tokens"] += event.get("prompt_tokens") or 0
+        totals["completion_tokens"] += event.get("completion_tokens") or 0
+        totals["coalesced"] += 1 if event.get("coalesced") else 0
+
+    @staticmethod
+    def _finalize_tokens(event):
+        """Calcule le débit de génération si l'API ne l'a pas fourni."""
+        completion = event.get("completion_tokens")
+        if completion and not event.get("tokens_per_s"):
+            generation_s = event.get("generation_s") or event["duration_s"]
+            if generation_s > 0:
+                event["tokens_per_s"] = completion / generation_s
+
+    def clear(self):
+        """Vide la fenêtre d'événements ; les totaux cumulés (compteurs Prometheus) sont conservés."""
+        with self._lock:
+            self.events.clear()
+
+    def summary(self):
+        """Agrège les événements par étape (nombre, total, moyenne, dernière durée)."""
+        with self._lock:
+            events = list(self.events)
+        stats = {}
+        for event in events:
+            s = stats.setdefault(event["stage"], {
+                "count": 0, "total_s": 0.0, "last_s": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "tokens_per_s": None,
+                "coalesced": 0,
+            })
+            s["count"] += 1
+            s["total_s"] += event["duration_s"]
+            s["last_s"] = event["duration_s"]
+            s["prompt_tokens"] += event.get("prompt_tokens") or 0
+            s["completion_tokens"] += event.get("completion_tokens") or 0
+            s["coalesced"] += 1 if event.get("coalesced") else 0
+            if event.get("tokens_per_s"):
+                s["tokens_per_s"] = event["tokens_per_s"]
+        for s in stats.values():
+            s["mean_s"] = s["total_s"] / s["count"]
+        return stats
+
+    def to_jsonl(self):
+        """Exporte les événements bruts, un objet JSON par ligne."""
+        with self._lock:
+            events = list(self.events)
+        return "\n".join(json.dumps(e, ensure_ascii=False) for e in events) + ("\n" if events else "")
+
+    def to_prometheus(self):
+        """Exporte les agrégats au format texte d'exposition Prometheus.
+
+        Compteurs et `_sum` / `_count` viennent des totaux cumulés ; seul le
+        débit (jauge) vient de la fenêtre d'événements.
+        """
+        backend = _escape_label(self.backend)
+        lines = [
+            "# HELP analyseur_stage_duration_seconds Durée des étapes du pipeline",
+            "# TYPE analyseur_stage_duration_seconds summary",
+        ]
+        with self._lock:
+            totals = {stage: dict(t) for stage, t in self.totals.items()}
+        for stage, s in totals.items():
+            labels = f'backend="{backend}",stage="{_escape_label(stage)}"'
+            lines.append(f"analyseur_stage_duration_seconds_sum{{{labels}}} {s['total_s']:.6f}")
+            lines.append(f"analyseur_stage_duration_seconds_count{{{labels}}} {s['count']}")
+        lines += [
+            "# HELP analyseur_llm_tokens_total Tokens consommés par les appels LLM",
+            "# TYPE analyseur_llm_tokens_total counter",
+        ]
+        for stage, s in totals.items():
+            for kind in ("prompt", "completion"):
+                labels = f'backend="{backend}",stage="{_escape_label(stage)}",kind="{kind}"'
+                lines.append(f"analyseur_llm_tokens_total{{{labels}}} {s[f'{kind}_tokens']}")
+        lines += [
+            "# HELP analyseur_llm_coalesced_total Appels servis par une requête identique déjà en cours",
+            "# TYPE analyseur_llm_coalesced_total counter",
+        ]
+        for stage, s in totals.items():
+            if s["coalesced"]:
+                labels = f'backend="{backend}",stage="{_escape_label(stage)}"'
+                lines.append(f"analyseur_llm_coalesced_total{{{labels}}} {s['coalesced']}")
+        lines += [
+            "# HELP analyseur_llm_tokens_per_second Débit du dernier appel LLM",
+            "# TYPE analyseur_llm_tokens_per_second gauge",
+        ]
+        for stage, s in self.summary().items():
+            if s["tokens_per_s"] is not None:
+                labels = f'backend="{backend}",stage="{_escape_label(stage)}"'
+                lines.append(f"analyseur_llm_tokens_per_second{{{labels}}} {s['tokens_per_s']:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def ollama_usage(response):
+    """Extrait tokens et temps de génération d'une réponse `ollama.chat`."""
+    eval_duration = response.get("eval_duration") or 0
+    return {
+        "prompt_tokens": response.get("prompt_eval_count") or 0,
+        "completion_tokens": response.get("eval_count") or 0,
+        # Durées Ollama exprimées en nanosecondes
+        "generation_s": eval_duration / 1e9 if eval_duration else None,
+        "load_s": (response.get("load_duration") or 0) / 1e9,
+    }
+
+
+def openai_usage(usage):
+    """Extrait les tokens du champ `usage` (objet SDK OpenAI ou dict JSON)."""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0}
+    if isinstance(usage, dict):
+        return {
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+        }
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def render_metrics_panel(metrics):
+    """Affiche le panneau d'instrumentation dans la sidebar Streamlit."""
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Instrumentation", expanded=False):
+        stats = metrics.summary()
+        if not stats:
+            st.caption("Aucune mesure pour cette session.")
+            return
+        rows = []
+        for stage in sorted(stats, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            s = stats[stage]
+            rows.append({
+                "Étape": stage,
+                "Appels": s["count"],
+                "Dernière (s)": round(s["last_s"], 3),
+                "Moyenne (s)": round(s["mean_s"], 3),
+                "Tokens prompt": s["prompt_tokens"],
+                "Tokens générés": s["completion_tokens"],
+                "Tokens/s": round(s["tokens_per_s"], 1) if s["tokens_per_s"] else None,
+                "Mutualisés": s["coalesced"],
+            })
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        st.download_button(
+            "📥 Export JSON lines",
+            data=metrics.to_jsonl(),
+            file_name="metrics.jsonl",
+            mime="application/x-ndjson",
+            key="metrics_export_jsonl",
+        )
+        st.download_button(
+            "📥 Export Prometheus",
+            data=metrics.to_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            key="metrics_export_prom",
+        )
+        if st.button("🗑️ Réinitialiser les mesures", key="metrics_clear"):
+            metrics.clear()
+            st.rerun()
@@ -0,0 +1,411 @@
+"""Pipeline d'analyse indépendant de l'interface Streamlit.
+
+Extraction du texte PDF, construction des prompts et appels à l'API
+OpenRouter. Les fonctions lèvent des exceptions au lieu d'afficher des
+messages : c'est `app.py` qui les présente à l'utilisateur. Ce module est
+aussi utilisé tel quel par les scripts de `benchmarks/`.
+
+`requests` et PyMuPDF ne sont importés qu'au premier appel, et la session
+HTTP est réutilisée d'un appel à l'autre (connexion TLS conservée).
+
+Avec le modèle `auto`, chaque appel est confié au modèle choisi par le
+routeur adaptatif de `routing.py` (latence, erreurs, fenêtre de contexte).
+Tous les appels passent par l'ordonnanceur de `ratelimit.py` (quotas par
+minute, priorités, reprise après 429, budget quotidien).
+"""
+import json
+import os
+import threading
+import time
+
+from instrumentation import PipelineMetrics, openai_usage
+from batch import batch_max_tokens, build_batch_messages, parse_batch_answers
+from extraction import DEFAULT_MODE
+from compare import COMPARISON_CHARS, build_comparison_messages, build_kpi_messages, kpi_context, select_pages
+from ratelimit import SCHEDULER, RateLimited, key_fingerprint, retry_after
+from revisions import DocumentAnalysis, parse_kpi_table
+from routing import AUTO_MODEL, REQUEST_TIMEOUT_S, ROUTER, estimate_tokens
+from singleflight import INFLIGHT, request_key
+from spool import read_pdf
+
+BACKEND = "openrouter"
+
+# URL de l'API OpenRouter (surchargeable pour pointer vers un serveur local)
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _metrics_or_discard(metrics):
+    # Sans collecteur fourni, les mesures sont simplement ignorées
+    return metrics if metrics is not None else PipelineMetrics(BACKEND, max_events=0)
+
+
+def _http_session():
+    """Session HTTP partagée par le processus, créée au premier appel"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+        return _session
+
+
+# Fonction pour extraire les pages du PDF (réutilise les pages inchangées de `previous`)
+def load_document(pdf_source, previous=None, metrics=None, mode=DEFAULT_MODE):
+    """Extrait les pages d'un PDF (octets, ou `SpooledPDF` pour un fichier volumineux) avec leurs empreintes.
+
+    Retourne une `DocumentAnalysis` ; les pages déjà présentes dans la
+    version précédente `previous` ne sont pas ré-extraites. `mode` : mode
+    d'extraction du texte (voir `extraction.MODES`).
+    """
+    return DocumentAnalysis.from_pdf(pdf_source, previous, metrics=_metrics_or_discard(metrics), mode=mode)
+
+
+# Fonction pour extraire le texte du PDF
+def extract_pdf_text(pdf_file, max_length, metrics=None):
+    """Extrait le texte d'un fichier PDF avec repères de pages.
+
+    Retourne le couple (texte, tronqué).
+    """
+    # Au-delà du seuil, le fichier est recopié par blocs sur disque plutôt que lu en mémoire
+    return load_document(read_pdf(pdf_file), metrics=metrics).text(max_length)
+
+
+# Construction des messages pour le résumé
+def build_summary_messages(text):
+    consignes = (
+        "Tu es analyste financier. On te fournit le texte d'un document financier\n"
+        "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
+        "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
+        "- **Société / Période / Devise** : (si repérable)\n"
+        "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
+        "- **Chiffres clés** (tableau) :\n"
+        " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
+        " |---|---:|---|---|---:|\n"
+        " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,\n"
+        " Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
+        "- **Analyse** :\n"
+        " - Performance (croissance, marges, cash)\n"
+        " - Structure financière (dette, liquidité)\n"
+        " - Risques & incertitudes (marché, réglementation, change)\n"
+        " - Outlook / Guidance (si communiqué)\n"
+        "- **Références internes** : pages/sections à relire\n\n"
+        "Exigences :\n"
+        "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
+        "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
+        "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
+        "- Reste concis : 200–350 mots hors tableau."
+    )
+
+    return [
+        {"role": "system", "content": consignes},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour les notes d'une section
+def build_section_messages(text):
+    consignes_section = (
+        "Tu es analyste financier. On te fournit une section (quelques pages) d'un document financier.\n"
+        "Relève en Markdown, sous forme de liste concise :\n"
+        "- les indicateurs chiffrés (indicateur, valeur, période, page) ;\n"
+        "- les faits marquants, risques et perspectives mentionnés.\n\n"
+        "Exigences :\n"
+        "- **N'invente aucun chiffre** et n'ajoute rien qui ne figure pas dans la section.\n"
+        "- Cite la **Page** d'origine (repère `=== [PAGE X] ===`).\n"
+        "- 200 mots maximum hors chiffres."
+    )
+
+    return [
+        {"role": "system", "content": consignes_section},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour une question
+def build_question_messages(question, text):
+    consignes_questions = (
+        "Tu es analyste financier. On te donne le texte d'un rapport financier. "
+        "Réponds uniquement à la question posée, sans inventer de données. "
+        "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
+        "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
+    )
+
+    return [
+        {"role": "system", "content": consignes_questions},
+        {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
+    ]
+
+
+# Appel instrumenté à OpenRouter
+def chat(api_key, model, messages, call, metrics=None, max_tokens=None, json_output=False):
+    """Envoie les messages à OpenRouter et retourne le contenu de la réponse.
+
+    Avec `model="auto"`, le routeur choisit le modèle et bascule sur le
+    suivant en cas d'erreur ou de délai dépassé.
+    """
+    metrics = _metrics_or_discard(metrics)
+    if model != AUTO_MODEL:
+        return _chat(api_key, model, messages, call, metrics, max_tokens, json_output)
+
+    content, _ = ROUTER.call(
+        messages,
+        lambda routed, attempt: _chat(api_key, routed, messages, call, metrics, max_tokens, json_output,
+                                      deadline_s=REQUEST_TIMEOUT_S, attempt=attempt),
+        completion_tokens=max_tokens,
+        metrics=metrics,
+        call=call,
+    )
+    return content
+
+
+def _chat(api_key, model, messages, call, metrics, max_tokens=None, json_output=False, deadline_s=None,
+          attempt=None):
+    """Appel à un modèle précis (voir `chat`).
+
+    `deadline_s` borne la durée totale de la requête HTTP ; sa durée est
+    notée dans `attempt["http_s"]` (latence mesurée par le routeur).
+    """
+    # Configuration pour OpenRouter
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "http://localhost:8888/",
+        "Content-Type": "application/json"
+    }
+
+    # Préparation de la requête
+    payload = {
+        "model": model,
+        "messages": messages
+    }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    if json_output:
+        # Ignoré par les modèles qui ne le prennent pas en charge
+        payload["response_format"] = {"type": "json_object"}
+
+    # Appel API à son tour dans la file (les appels identiques simultanés partagent une seule requête)
+    with metrics.stage("llm", call=call, model=model) as event:
+        def send():
+            start = time.perf_counter()
+            try:
+                response, body = _post(OPENROUTER_API_URL, payload, headers, deadline_s)
+                return _read_response(response, body)
+            finally:
+                if attempt is not None:
+                    attempt["http_s"] = time.perf_counter() - start
+
+        def request():
+            content, info = SCHEDULER.run(api_key, model, messages, send, call, max_tokens)
+            event.update(info)
+            return content
+
+        # Une requête par clé API : chaque clé paie et consomme son propre quota
+        key = request_key(BACKEND, model, messages, key=key_fingerprint(api_key), max_tokens=max_tokens,
+                          json_output=json_output)
+        content, event["coalesced"] = INFLIGHT.do(key, request)
+    return content
+
+
+def _raise_for_error(response, response_json=None):
+    """Lève une exception explicite pour une réponse d'erreur (HTTP ou champ `error`)"""
+    error = (response_json or {}).get("error")
+    code = error.get("code") if isinstance(error, dict) else None
+    message = (error.get("message") if isinstance(error, dict) else error) or f"HTTP {response.status_code}"
+    if response.status_code == 429 or code == 429:
+        raise RateLimited(f"OpenRouter : quota dépassé (429) : {message}", retry_after(response.headers))
+    if error or not response.ok:
+        raise RuntimeError(f"OpenRouter : {message}")
+
+
+def _post(url, payload, headers, deadline_s=None):
+    """Envoie la requête ; retourne la réponse et son corps, lu en entier avant `deadline_s` secondes.
+
+    Le délai de `requests` ne borne que l'attente entre deux paquets :
+    OpenRouter envoie des octets de maintien de connexion pendant la
+    génération, qui le repousseraient indéfiniment. Le corps est donc lu
+    par blocs, l'échéance étant vérifiée après chacun.
+    """
+    if deadline_s is None:
+        response = _http_session().post(url, json=payload, headers=headers)
+        return response, response.content
+    import requests
+
+    deadline = time.monotonic() + deadline_s
+    with _http_session().post(url, json=payload, headers=headers, timeout=deadline_s, stream=True) as response:
+        chunks = []
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"OpenRouter : réponse incomplète après {deadline_s} s")
+    return response, b"".join(chunks)
+
+
+def _read_response(response, body):
+    """Contenu, usage et en-têtes d'une réponse OpenRouter (`body` : corps de la réponse)"""
+    try:
+        response_json = json.loads(body)
+    except ValueError:
+        _raise_for_error(response)
+        raise RuntimeError(f"OpenRouter : réponse illisible (HTTP {response.status_code})")
+    _raise_for_error(response, response_json)
+    if not response_json.get("choices"):
+        raise RuntimeError("OpenRouter : réponse sans contenu")
+
+    usage = openai_usage(response_json.get("usage"))
+    if (response_json.get("usage") or {}).get("cost") is not None:
+        usage["cost"] = response_json["usage"]["cost"]
+    # Extraction du texte de la réponse
+    return response_json['choices'][0]['message']['content'], usage, response.headers
+
+
+# Appel instrumenté à OpenRouter, réponse produite au fil de la génération (SSE)
+def chat_stream(api_key, model, messages, call, metrics=None):
+    """Comme `chat`, mais produit les fragments de texte dès leur génération.
+
+    Avec `model="auto"`, le modèle le mieux classé par le routeur est
+    utilisé, sans bascule une fois le flux commencé.
+    """
+    metrics = _metrics_or_discard(metrics)
+    if model == AUTO_MODEL:
+        model = ROUTER.candidates(estimate_tokens(messages))[0][0]
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "http://localhost:8888/",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True
+    }
+
+    with metrics.stage("llm", call=call, model=model, stream=True) as event, \
+            SCHEDULER.reserve(api_key, model, messages, call) as reservation, \
+            _http_session().post(OPENROUTER_API_URL, json=payload, headers=headers, stream=True) as response:
+        event["queue_s"] = round(reservation.queue_s, 4)
+        if not response.ok:
+            try:
+                _raise_for_error(response, response.json())
+            except ValueError:
+                _raise_for_error(response)
+        for line in response.iter_lines(decode_unicode=True):
+            # Lignes SSE « data: {...} » ; les commentaires de maintien de connexion sont ignorés
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                usage = openai_usage(chunk["usage"])
+                event.update(usage)
+                reservation.record(usage, response.headers)
+            for choice in chunk.get("choices", []):
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    yield content
+
+
+# Fonction pour générer le résumé via OpenRouter
+def generate_summary(text, api_key, model, metrics=None):
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="summary"):
+        messages = build_summary_messages(text)
+
+    return chat(api_key, model, messages, call="summary", metrics=metrics)
+
+
+# Fonction pour produire les notes de lecture d'une section via OpenRouter
+def summarize_section(text, api_key, model, metrics=None):
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="section"):
+        messages = build_section_messages(text)
+
+    return chat(api_key, model, messages, call="section", metrics=metrics)
+
+
+# Fonction pour résumer un document par sections (réanalyse incrémentale)
+def generate_document_summary(analysis, text, api_key, model, metrics=None):
+    """Résume `text` par sections ; sur une nouvelle version, seules les sections modifiées repassent par le modèle"""
+    return analysis.summarize(
+        text,
+        summarize_section=lambda section: summarize_section(section, api_key, model, metrics=metrics),
+        summarize_document=lambda content: generate_summary(content, api_key, model, metrics=metrics),
+        variant=f"{BACKEND}|{model}",
+    )
+
+
+# Fonction pour répondre aux questions via OpenRouter
+def answer_question(question, text, api_key, model, metrics=None, call="question"):
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call=call):
+        messages = build_question_messages(question, text)
+
+    return chat(api_key, model, messages, call=call, metrics=metrics)
+
+
+# Fonction pour répondre aux questions via OpenRouter, au fil de la génération
+def stream_answer(question, text, api_key, model, metrics=None):
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="question"):
+        messages = build_question_messages(question, text)
+
+    yield from chat_stream(api_key, model, messages, call="question", metrics=metrics)
+
+
+# Fonction pour répondre à plusieurs questions en un seul appel à OpenRouter
+def answer_questions(questions, text, api_key, model, metrics=None):
+    """Répond à une liste de questions avec une seule copie du document.
+
+    Retourne une liste de dictionnaires {question, answer, batched} ; les
+    questions restées sans réponse exploitable sont reposées une à une.
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="batch"):
+        messages = build_batch_messages(questions, text)
+
+    raw = chat(api_key, model, messages, call="batch", metrics=metrics,
+               max_tokens=batch_max_tokens(len(questions)), json_output=True)
+
+    results = []
+    for question, answer in zip(questions, parse_batch_answers(raw, len(questions))):
+        batched = answer is not None
+        if not batched:
+            answer = answer_question(question, text, api_key, model, metrics=metrics)
+        results.append({"question": question, "answer": answer, "batched": batched})
+    return results
+
+
+# Fonction pour extraire les chiffres clés d'un document du mode comparaison
+def extract_kpis(document, api_key, model, metrics=None):
+    """Chiffres clés d'un `ComparedDocument` ({indicateur: {value, period, page}}), extraits une fois par modèle"""
+    variant = f"{BACKEND}|{model}"
+    if variant not in document.kpis:
+        metrics = _metrics_or_discard(metrics)
+        with metrics.stage("prompt", call="kpis"):
+            messages = build_kpi_messages(kpi_context(document))
+
+        raw = chat(api_key, model, messages, call="kpis", metrics=metrics, max_tokens=800)
+        document.kpis[variant] = parse_kpi_table(raw)
+    return document.kpis[variant]
+
+
+# Fonction pour répondre à une question portant sur plusieurs documents
+def answer_comparison(question, documents, api_key, model, max_chars=COMPARISON_CHARS, metrics=None):
+    """Répond à partir des pages de chaque document les plus pertinentes pour la question.
+
+    Les documents se partagent un budget commun de `max_chars` caractères.
+    Retourne le couple (réponse, numéros des pages retenues par document).
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="comparison") as event:
+        selection = select_pages(documents, question, max_chars)
+        messages = build_comparison_messages(question, documents, selection)
+        event["pages"] = sum(len(numbers) for numbers in selection)
+
+    answer = chat(api_key, model, messages, call="comparison", metrics=metrics)
+    return answer, selection
@@ -0,0 +1,159 @@
+"""Préchargement spéculatif des réponses aux questions suggérées.
+
+Juste après le résumé, l'utilisateur pose presque toujours les mêmes
+questions (chiffre d'affaires, marge, dette...). Un `Prefetcher` y répond en
+arrière-plan, une question à la fois et seulement lorsqu'aucun autre appel
+LLM n'est en cours dans le processus : les questions posées par les
+utilisateurs passent toujours en premier. Les boutons de questions
+suggérées lisent ensuite la réponse dans son cache.
+
+Le préchargement est annulable (nouveau document, changement de modèle,
+bouton d'arrêt) et borné par un budget : nombre de questions et tokens de
+prompt estimés. Une question cliquée pendant son préchargement n'est pas
+envoyée deux fois : les deux appels identiques sont mutualisés.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import INFLIGHT
+
+SUGGESTED_QUESTIONS = [
+    "Quel est le chiffre d'affaires ?",
+    "Quelle est la marge nette ?",
+    "Quels sont les principaux risques identifiés ?",
+    "Quelle est la dette nette ?",
+    "Quel est le cash flow opérationnel ?",
+]
+
+# Budget par document : questions préchargées et tokens de prompt estimés
+MAX_QUESTIONS = 5
+MAX_PROMPT_TOKENS = 150_000
+
+# Préchargements exécutés simultanément dans le processus (toutes sessions confondues)
+WORKERS = 2
+
+# Attente d'un backend inactif : intervalle de vérification et abandon (s)
+IDLE_POLL_S = 0.2
+IDLE_TIMEOUT_S = 120
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="prefetch")
+
+
+def estimate_prompt_tokens(text, question):
+    # Approximation usuelle : ~4 caractères par token
+    return (len(text) + len(question)) // 4
+
+
+class Prefetcher:
+    """Répond en arrière-plan à une liste de questions sur un document.
+
+    `answer(question)` est appelée depuis un thread du pool : elle ne doit
+    pas utiliser Streamlit. `key` identifie le contexte (document, modèle)
+    dans lequel les réponses restent valables.
+    """
+
+    def __init__(self, key, answer, text, questions=SUGGESTED_QUESTIONS,
+                 max_questions=MAX_QUESTIONS, max_prompt_tokens=MAX_PROMPT_TOKENS):
+        self.key = key
+        self.questions = list(questions)[:max_questions]
+        self.max_prompt_tokens = max_prompt_tokens
+        self.prompt_tokens = 0
+        self.skipped = []      # questions hors budget
+        self.error = None
+        self._answer = answer
+        self._text = text
+        self._answers = {}
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._future = None
+
+    def start(self):
+        self._future = _executor.submit(self._run)
+        return self
+
+    def cancel(self):
+        """Arrête le préchargement après l'appel en cours (les réponses obtenues restent en cache)."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def running(self):
+        return self._future is not None and not self._future.done()
+
+    def get(self, question):
+        with self._lock:
+            return self._answers.get(question)
+
+    def store(self, question, answer):
+        """Ajoute une réponse obtenue ailleurs (question posée avant son préchargement)."""
+        with self._lock:
+            self._answers.setdefault(question, answer)
+
+    def _wait_idle(self):
+        # Laisse passer les appels interactifs : attend qu'aucun appel LLM ne soit en vol
+        deadline = time.monotonic() + IDLE_TIMEOUT_S
+        while INFLIGHT.stats()["inflight"]:
+            if self.cancelled:
+                return False
+            if time.monotonic() > deadline:
+                self.error = "backend occupé, préchargement abandonné"
+                return False
+            time.sleep(IDLE_POLL_S)
+        return not self.cancelled
+
+    def _run(self):
+        for question in self.questions:
+            if self.get(question) is not None:
+                continue
+            cost = estimate_prompt_tokens(self._text, question)
+            if self.prompt_tokens + cost > self.max_prompt_tokens:
+                self.skipped.append(question)
+                continue
+            if not self._wait_idle():
+                return
+            try:
+                answer = self._answer(question)
+            except Exception as e:
+                self.error = str(e)
+                return
+            self.prompt_tokens += cost
+            if answer:
+                self.store(question, answer)
+
+    def status(self):
+        with self._lock:
+            ready = sum(question in self._answers for question in self.questions)
+        return {
+            "ready": ready,
+            "total": len(self.questions),
+            "running": self.running,
+            "cancelled": self.cancelled,
+            "skipped": len(self.skipped),
+            "prompt_tokens": self.prompt_tokens,
+            "error": self.error,
+        }
+
+
+def render_prefetch_status(prefetcher, key):
+    """Avancement du préchargement, avec un bouton d'arrêt tant qu'il tourne"""
+    import streamlit as st
+
+    if prefetcher.running and st.button("⏹️ Arrêter le préchargement", key=f"{key}_cancel"):
+        prefetcher.cancel()
+
+    status = prefetcher.status()
+    state = "arrêté" if status["cancelled"] else "en cours" if status["running"] else "terminé"
+    tokens = f"{status['prompt_tokens']:,}".replace(",", " ")
+    message = (
+        f"⚡ Préchargement {state} : {status['ready']}/{status['total']} réponse(s) prête(s), "
+        f"≈ {tokens} tokens de prompt"
+    )
+    if status["skipped"]:
+        message += f" ; {status['skipped']} question(s) hors budget"
+    if status["error"]:
+        message += f" ; interrompu : {status['error']}"
+    st.caption(message)
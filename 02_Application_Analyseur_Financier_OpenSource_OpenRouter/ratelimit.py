@@ -0,0 +1,494 @@
+"""Ordonnancement des appels aux API cloud : quotas, priorités et budget.
+
+Les fournisseurs (OpenAI, OpenRouter) limitent le nombre de requêtes et de
+tokens par minute ; au-delà, ils répondent 429. Un ordonnanceur unique par
+processus tient, pour chaque couple (clé API, modèle), deux seaux à jetons
+(requêtes / minute et tokens / minute) et une file d'attente :
+
+- une requête réserve 1 requête et ses tokens estimés (prompt + réponse
+  maximale) avant d'être envoyée ; l'écart avec l'usage réel est rendu au
+  seau à la réception ;
+- la file est servie par priorité : les questions interactives passent avant
+  les résumés, les checklists et les préchargements ;
+- un 429 suspend toute la file de ce couple pendant la durée `Retry-After`
+  (ou un recul exponentiel), au lieu de laisser chaque requête réessayer de
+  son côté ; la requête est ensuite reprise à sa place ;
+- les en-têtes `x-ratelimit-*` renvoyés par le fournisseur ajustent les
+  quotas pour rester au plafond réel de la clé.
+
+Un budget quotidien en dollars (`LLM_DAILY_BUDGET_USD`) est vérifié avant
+chaque appel, d'après le coût maximal de la requête, puis décompté d'après
+le champ `usage` de la réponse. La dépense du jour est enregistrée dans une
+base SQLite (`LLM_BUDGET_PATH`) : elle survit aux redémarrages et est
+partagée par tous les processus qui pointent vers le même fichier (par
+défaut, ceux d'une même application et le service qui l'utilise).
+
+Les erreurs passagères du fournisseur (5xx, connexion coupée, délai
+dépassé) sont reprises quelques fois, avec un recul exponentiel court.
+"""
+import hashlib
+import heapq
+import itertools
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+# Quotas par défaut par clé API et modèle, tant que le fournisseur ne les indique pas
+DEFAULT_RPM = 60
+DEFAULT_TPM = 200_000
+
+# Priorité par type d'appel (la plus petite valeur est servie en premier)
+PRIORITIES = {"question": 0, "comparison": 0, "summary": 1, "section": 1, "kpis": 1, "batch": 2, "prefetch": 3}
+DEFAULT_PRIORITY = 1
+
+# Attente maximale dans la file avant abandon (s)
+QUEUE_TIMEOUT_S = 300
+
+# Reprises après un 429, et recul quand le fournisseur n'indique pas Retry-After (s)
+MAX_RETRIES = 4
+BACKOFF_S = 2.0
+BACKOFF_MAX_S = 60.0
+
+# Reprises après une erreur passagère (5xx, connexion), et premier recul (s), comme le SDK OpenAI
+TRANSIENT_RETRIES = 2
+TRANSIENT_BACKOFF_S = 0.5
+
+# Base de la dépense quotidienne (un fichier commun à plusieurs applications partage leur budget)
+BUDGET_PATH = str(Path(__file__).with_name("llm_budget.sqlite3"))
+
+# Estimation des tokens de prompt, et réponse réservée quand max_tokens n'est pas précisé
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 1000
+
+# Prix publics en dollars par million de tokens (entrée, sortie)
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3.5-sonnet": (3.00, 15.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "llama-3.1-70b-instruct": (0.40, 0.40),
+    "llama-3.1-8b-instruct": (0.05, 0.05),
+    "mistral-7b-instruct": (0.06, 0.06),
+}
+# Modèle inconnu : estimation prudente
+DEFAULT_PRICE = (10.00, 30.00)
+
+
+class RateLimited(Exception):
+    """Réponse 429 du fournisseur ; `retry_after` en secondes s'il est indiqué."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Unavailable(RuntimeError):
+    """Erreur passagère du fournisseur (5xx, connexion coupée, délai dépassé) : l'appel peut être repris."""
+
+
+class QuotaExceeded(RuntimeError):
+    """Attente trop longue dans la file, ou 429 répétés malgré les reprises."""
+
+
+class BudgetExceeded(RuntimeError):
+    """Le budget quotidien ne permet pas cet appel."""
+
+
+def _env_number(name, default):
+    # Lu à l'usage : le fichier .env est chargé par l'application après l'import des modules
+    value = os.getenv(name)
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+
+def estimate_prompt_tokens(messages):
+    return sum(len(m["content"]) for m in messages) // CHARS_PER_TOKEN
+
+
+def price(model):
+    """Prix (entrée, sortie) par million de tokens ; le préfixe OpenRouter est ignoré"""
+    return PRICES.get(model) or PRICES.get(model.split("/")[-1], DEFAULT_PRICE)
+
+
+def cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = price(model)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def retry_after(headers):
+    """Délai demandé par le fournisseur (en-têtes retry-after-ms ou retry-after), en secondes"""
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                continue
+    return None
+
+
+def call_with_retries(send):
+    """Appelle `send()`, repris jusqu'à TRANSIENT_RETRIES fois s'il lève `Unavailable`"""
+    for failure in itertools.count():
+        try:
+            return send()
+        except Unavailable:
+            if failure >= TRANSIENT_RETRIES:
+                raise
+            time.sleep(TRANSIENT_BACKOFF_S * 2 ** failure * random.uniform(1.0, 1.25))
+
+
+def key_fingerprint(api_key):
+    """Empreinte d'une clé API : la clé elle-même n'est jamais conservée ni affichée."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class TokenBucket:
+    """Seau rempli en continu de `per_minute` unités par minute, plafonné à `per_minute`."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Secondes avant de pouvoir prélever `amount` (une demande plus grande que le seau attend qu'il soit plein)"""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) * 60 / self.capacity
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def give_back(self, amount, now):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def observe(self, limit, remaining, now):
+        """Aligne le seau sur les valeurs annoncées par le fournisseur"""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class Lane:
+    """Quotas et file d'attente d'un couple (clé API, modèle)."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.waiting = []          # tas de (priorité, numéro d'arrivée)
+        self.sent = 0
+        self.throttled = 0         # réponses 429 reçues
+        self.strikes = 0           # 429 consécutifs (remis à zéro au premier succès)
+
+
+def _header_number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class Reservation:
+    """Place obtenue dans la file pour un appel ; à utiliser comme gestionnaire de contexte.
+
+    `record(usage, headers)` transmet l'usage réel (tokens, coût éventuel)
+    et les en-têtes de la réponse. Sans usage, un appel en erreur est
+    remboursé ; un appel réussi (flux interrompu) reste compté à son
+    estimation.
+    """
+
+    def __init__(self, scheduler, lane, model, prompt_tokens, completion_tokens, priority):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.priority = priority
+        self.queue_s = 0.0
+        self.cost_usd = 0.0
+        self.usage = None
+        self._budgeted = cost(model, prompt_tokens, completion_tokens)
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def __enter__(self):
+        self.scheduler.budget.reserve(self._budgeted)
+        try:
+            self.queue_s = self.scheduler._acquire(self.lane, self.tokens, self.priority)
+        except BaseException:
+            self.scheduler.budget.settle(self._budgeted, 0.0)
+            raise
+        return self
+
+    def record(self, usage, headers=None):
+        self.usage = usage
+        self.scheduler._observe(self.lane, headers or {})
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, RateLimited):
+            self.scheduler._throttle(self.lane, exc.retry_after)
+        if self.usage is not None:
+            used = (self.usage.get("prompt_tokens") or 0) + (self.usage.get("completion_tokens") or 0)
+            spent = self.usage.get("cost")
+            if spent is None:
+                spent = cost(self.model, self.usage.get("prompt_tokens") or 0, self.usage.get("completion_tokens") or 0)
+        elif exc_type is not None:
+            used, spent = 0, 0.0
+        else:
+            used, spent = self.tokens, self._budgeted
+        self.cost_usd = spent
+        self.scheduler._refund(self.lane, self.tokens - used)
+        self.scheduler.budget.settle(self._budgeted, spent)
+        return False
+
+    def info(self):
+        return {"queue_s": round(self.queue_s, 4), "priority": self.priority, "cost_usd": round(self.cost_usd, 6)}
+
+
+class DailyBudget:
+    """Dépense du jour, plafonnée par LLM_DAILY_BUDGET_USD (0 ou absent : sans plafond).
+
+    La dépense est lue et incrémentée dans la base SQLite `path` (par défaut
+    LLM_BUDGET_PATH) ; seul le coût maximal des appels en cours de ce
+    processus (`reserved`) reste en mémoire.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self.reserved = 0.0       # coût maximal des appels en cours
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        # Lu à l'usage, comme le plafond (fichier .env chargé après l'import)
+        return self._path or os.getenv("LLM_BUDGET_PATH") or BUDGET_PATH
+
+    @property
+    def limit(self):
+        return _env_number("LLM_DAILY_BUDGET_USD", 0.0)
+
+    def _db(self):
+        # Connexion courte par opération : partagée entre threads et processus sans état à gérer
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("CREATE TABLE IF NOT EXISTS spending (day TEXT PRIMARY KEY, spent REAL NOT NULL)")
+        return db
+
+    def _spent(self, db, day):
+        row = db.execute("SELECT spent FROM spending WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else 0.0
+
+    def reserve(self, amount):
+        limit = self.limit
+        with self._lock:
+            if limit:
+                db = self._db()
+                try:
+                    spent = self._spent(db, date.today().isoformat())
+                finally:
+                    db.close()
+                if spent + self.reserved + amount > limit:
+                    raise BudgetExceeded(
+                        f"Budget quotidien atteint : {spent:.2f} $ dépensés sur {limit:.2f} $ "
+                        f"(appel estimé à {amount:.4f} $ au plus). Réessayez demain ou relevez LLM_DAILY_BUDGET_USD."
+                    )
+            self.reserved += amount
+
+    def settle(self, reserved, spent):
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - reserved)
+            if spent:
+                db = self._db()
+                try:
+                    with db:
+                        db.execute(
+                            "INSERT INTO spending (day, spent) VALUES (?, ?) "
+                            "ON CONFLICT (day) DO UPDATE SET spent = spent + excluded.spent",
+                            (date.today().isoformat(), spent),
+                        )
+                finally:
+                    db.close()
+
+    def snapshot(self):
+        day = date.today().isoformat()
+        with self._lock:
+            db = self._db()
+            try:
+                spent = self._spent(db, day)
+            finally:
+                db.close()
+            return {"day": day, "spent_usd": round(spent, 6),
+                    "reserved_usd": round(self.reserved, 6), "limit_usd": self.limit or None}
+
+
+class Scheduler:
+    """Ordonnanceur partagé par toutes les sessions et tous les threads du processus."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._lanes = {}
+        self._arrivals = itertools.count()
+        self.budget = DailyBudget()
+
+    def lane(self, api_key, model):
+        key = (key_fingerprint(api_key), model)
+        with self._cond:
+            if key not in self._lanes:
+                self._lanes[key] = Lane(_env_number("LLM_RATE_LIMIT_RPM", DEFAULT_RPM),
+                                        _env_number("LLM_RATE_LIMIT_TPM", DEFAULT_TPM))
+            return self._lanes[key]
+
+    def _acquire(self, lane, tokens, priority, timeout=QUEUE_TIMEOUT_S):
+        """Attend son tour et la capacité nécessaire ; retourne le temps passé dans la file"""
+        start = time.monotonic()
+        deadline = start + timeout
+        ticket = (priority, next(self._arrivals))
+        with self._cond:
+            heapq.heappush(lane.waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if lane.waiting[0] == ticket:
+                        delay = max(lane.blocked_until - now,
+                                    lane.requests.wait_time(1, now),
+                                    lane.tokens.wait_time(tokens, now))
+                        if delay <= 0:
+                            lane.requests.take(1, now)
+                            lane.tokens.take(tokens, now)
+                            lane.sent += 1
+                            return now - start
+                    if now >= deadline:
+                        raise QuotaExceeded(
+                            f"File d'attente saturée : aucune place obtenue en {timeout:.0f} s "
+                            "(quota de requêtes ou de tokens par minute atteint)"
+                        )
+                    # Tête de file : attend la capacité ; autres : attendent d'être réveillés
+                    self._cond.wait(min(delay, deadline - now) if delay is not None else deadline - now)
+            finally:
+                lane.waiting.remove(ticket)
+                heapq.heapify(lane.waiting)
+                self._cond.notify_all()
+
+    def _refund(self, lane, tokens):
+        if tokens:
+            with self._cond:
+                lane.tokens.give_back(tokens, time.monotonic())
+                self._cond.notify_all()
+
+    def _throttle(self, lane, delay):
+        with self._cond:
+            lane.throttled += 1
+            lane.strikes += 1
+            if delay is None:
+                # Recul exponentiel selon les 429 consécutifs, avec une part aléatoire
+                delay = min(BACKOFF_MAX_S, BACKOFF_S * 2 ** min(lane.strikes - 1, 6)) * random.uniform(1.0, 1.25)
+            lane.blocked_until = max(lane.blocked_until, time.monotonic() + delay)
+            self._cond.notify_all()
+
+    def _observe(self, lane, headers):
+        now = time.monotonic()
+        with self._cond:
+            lane.strikes = 0
+            lane.requests.observe(_header_number(headers, "x-ratelimit-limit-requests"),
+                                  _header_number(headers, "x-ratelimit-remaining-requests"), now)
+            lane.tokens.observe(_header_number(headers, "x-ratelimit-limit-tokens"),
+                                _header_number(headers, "x-ratelimit-remaining-tokens"), now)
+            self._cond.notify_all()
+
+    def reserve(self, api_key, model, messages, call, max_tokens=None):
+        """Place dans la file pour un appel (`with scheduler.reserve(...) as reservation:`)"""
+        return Reservation(self, self.lane(api_key, model), model, estimate_prompt_tokens(messages),
+                           max_tokens or DEFAULT_COMPLETION_TOKENS, PRIORITIES.get(call, DEFAULT_PRIORITY))
+
+    def run(self, api_key, model, messages, send, call, max_tokens=None):
+        """Envoie la requête à son tour, en reprenant après les 429.
+
+        `send()` effectue l'appel et retourne (contenu, usage, en-têtes) ;
+        elle lève `RateLimited` sur un 429, `Unavailable` sur une erreur
+        passagère (reprise après un court recul, sans repasser par la file). Retourne
+        (contenu, infos) où les infos décrivent l'attente, les reprises
+        après 429, le coût et les tokens.
+        """
+        queue_s = 0.0
+        for attempt in range(MAX_RETRIES + 1):
+            reservation = self.reserve(api_key, model, messages, call, max_tokens)
+            try:
+                with reservation:
+                    content, usage, headers = call_with_retries(send)
+                    reservation.record(usage, headers)
+            except RateLimited as e:
+                # La file est suspendue par le 429 : la reprise attend son tour comme les autres
+                queue_s += reservation.queue_s
+                if attempt == MAX_RETRIES:
+                    raise QuotaExceeded(f"{e} ; abandon après {MAX_RETRIES} reprises") from e
+                continue
+            info = reservation.info()
+            info.update(queue_s=round(queue_s + reservation.queue_s, 4), retries=attempt,
+                        prompt_tokens=usage.get("prompt_tokens") or 0,
+                        completion_tokens=usage.get("completion_tokens") or 0)
+            return content, info
+
+    def snapshot(self):
+        """État de chaque couple (clé, modèle) pour l'affichage"""
+        now = time.monotonic()
+        with self._cond:
+            rows = []
+            for (fingerprint, model), lane in self._lanes.items():
+                lane.requests._refill(now)
+                lane.tokens._refill(now)
+                rows.append({
+                    "Modèle": model,
+                    "Clé": f"…{fingerprint}",
+                    "RPM": int(lane.requests.capacity),
+                    "TPM": int(lane.tokens.capacity),
+                    "Requêtes dispo": int(max(lane.requests.level, 0)),
+                    "Tokens dispo": int(max(lane.tokens.level, 0)),
+                    "En attente": len(lane.waiting),
+                    "Envoyées": lane.sent,
+                    "429 reçus": lane.throttled,
+                    "Suspendu (s)": round(max(0.0, lane.blocked_until - now), 1),
+                })
+            return rows
+
+
+# Ordonnanceur unique pour le processus (quotas et budget partagés entre sessions)
+SCHEDULER = Scheduler()
+
+
+def render_scheduler_status(scheduler=SCHEDULER):
+    """Quotas par modèle et dépense du jour"""
+    import streamlit as st
+
+    budget = scheduler.budget.snapshot()
+    if budget["limit_usd"]:
+        st.progress(min(1.0, budget["spent_usd"] / budget["limit_usd"]),
+                    text=f"Dépense du jour : {budget['spent_usd']:.4f} $ / {budget['limit_usd']:.2f} $")
+    else:
+        st.caption(f"Dépense du jour : {budget['spent_usd']:.4f} $ (sans plafond : LLM_DAILY_BUDGET_USD)")
+    rows = scheduler.snapshot()
+    if rows:
+        st.dataframe(rows, hide_index=True)
+    st.caption("Priorité : questions, puis résumés, checklists et préchargements. "
+               "Quotas ajustés d'après les en-têtes x-ratelimit-* du fournisseur.")
@@ -0,0 +1,392 @@
+"""Réanalyse incrémentale lorsqu'une nouvelle version d'un rapport est importée.
+
+Chaque analyse conserve une empreinte par page. À l'import d'une version
+amendée, seules les pages dont le contenu a changé sont ré-extraites, et le
+résumé est produit par sections : les notes des sections inchangées sont
+réutilisées, seules les sections modifiées repassent par le modèle. Les
+limites des sections et les clés des notes ne dépendent que du contenu des
+pages : modifier, insérer ou retirer une page ne touche que les sections
+voisines. Les chiffres clés des deux résumés sont ensuite comparés.
+"""
+import hashlib
+import re
+
+from boilerplate import boilerplate_lines
+from extraction import DEFAULT_MODE, extract_page_text
+from spool import open_pdf, release_pdf_memory, window_pages
+from storage import CompressedText, FilteredText
+
+# Taille maximale d'une section résumée séparément (caractères, pages entières)
+SECTION_CHARS = 30000
+
+# Début de page (caractères) dont l'empreinte place les limites de sections
+SECTION_ANCHOR_CHARS = 200
+
+# Part minimale de pages communes pour considérer deux documents comme deux versions
+REVISION_MIN_SHARED = 0.5
+
+PAGE_MARKER_RE = re.compile(r"=== \[PAGE (\d+)\] ===")
+_SECTION_SPLIT_RE = re.compile(r"(?=\n\n=== \[PAGE \d+\] ===\n)")
+# Références de pages dans des notes : « Page 12 », « pages 3 à 5 », « [PAGE 7] », « p. 4 »
+_PAGE_REFERENCE_RE = re.compile(r"\b(pages?|p\.)(\s*)(\d+(?:\s*(?:à|-|–|,|et)\s*\d+)*)", re.IGNORECASE)
+
+
+def _digest(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def page_fingerprint(pdf, page):
+    """Empreinte du contenu brut d'une page, calculée sans extraire le texte.
+
+    Couvre le flux de contenu, les formulaires et images référencés et les
+    polices utilisées : une page identique d'une version à l'autre n'a pas
+    besoin d'être ré-extraite.
+    """
+    digest = hashlib.sha256(page.read_contents())
+    for xref, *_ in page.get_xobjects():
+        digest.update(pdf.xref_stream_raw(xref) or b"")
+    digest.update(repr(sorted(font[1:] for font in page.get_fonts())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def clean_page_text(text):
+    # Même nettoyage que le texte complet : espaces de début et de fin de ligne
+    return "\n".join(line.strip() for line in text.strip().splitlines())
+
+
+def _page_blocks(text):
+    """Blocs du texte balisé, un par page : [(numéro, bloc, contenu sans le repère)]."""
+    blocks = []
+    for block in _SECTION_SPLIT_RE.split(text):
+        if not block:
+            continue
+        marker = PAGE_MARKER_RE.search(block)
+        blocks.append((int(marker.group(1)) if marker else None, block, block[marker.end():] if marker else block))
+    return blocks
+
+
+def _page_sections(text, max_chars):
+    """Comme `split_sections` ; chaque page d'une section est décrite par (numéro, bloc, empreinte du contenu)."""
+    pages = []
+    for number, block, content in _page_blocks(text):
+        # Tirage fixé par le début de la page : une modification plus bas dans la page ne déplace aucune limite
+        draw = _digest(content.strip()[:SECTION_ANCHOR_CHARS])
+        pages.append((number, block, _digest(content), draw))
+    sections, pending = [], [pages] if pages else []
+    while pending:
+        run = pending.pop()
+        if len(run) == 1 or sum(len(page[1]) for page in run) <= max_chars:
+            sections.append([page[:3] for page in run])
+            continue
+        # Trop long : coupé après la page de plus petit tirage, puis chaque moitié à son tour
+        cut = min(range(len(run) - 1), key=lambda index: run[index][3]) + 1
+        pending += [run[cut:], run[:cut]]
+    return sections
+
+
+def split_sections(text, max_chars=SECTION_CHARS):
+    """Découpe le texte balisé en sections de pages entières, d'au plus `max_chars` (sauf page plus longue).
+
+    Tant qu'une section est trop longue, elle est coupée après la page dont
+    le début a la plus petite empreinte. Les limites ne dépendent donc que du
+    contenu des pages et non de leur position : une page modifiée, insérée
+    ou retirée ne change que la section qui la contient (ou la scinde).
+    """
+    return ["".join(block for _, block, _ in section) for section in _page_sections(text, max_chars)]
+
+
+def shift_page_references(note, first, last, offset):
+    """Décale de `offset` les numéros des pages `first` à `last` cités dans `note`."""
+    if not offset:
+        return note
+
+    def shift(match):
+        numbers = re.sub(
+            r"\d+", lambda n: str(int(n.group()) + offset) if first <= int(n.group()) <= last else n.group(),
+            match.group(3),
+        )
+        return match.group(1) + match.group(2) + numbers
+
+    return _PAGE_REFERENCE_RE.sub(shift, note)
+
+
+def section_label(section):
+    """Intervalle de pages couvert par une section, ex. « pages 12 à 18 »."""
+    pages = [int(n) for n in PAGE_MARKER_RE.findall(section)]
+    if not pages:
+        return "section"
+    if pages[0] == pages[-1]:
+        return f"page {pages[0]}"
+    return f"pages {pages[0]} à {pages[-1]}"
+
+
+def parse_kpi_table(markdown):
+    """Lit le tableau « Chiffres clés » d'un résumé : {indicateur: {valeur, période, page}}."""
+    kpis = {}
+    columns = None
+    for line in (markdown or "").splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            columns = None
+            continue
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        lowered = [c.lower() for c in cells]
+        if columns is None:
+            if "indicateur" in lowered and "valeur" in lowered:
+                columns = lowered
+            continue
+        if all(re.fullmatch(r":?-+:?", c) for c in cells if c):
+            continue
+        row = dict(zip(columns, cells))
+        name = row.get("indicateur", "").strip("* ")
+        if name:
+            kpis[name] = {
+                "value": row.get("valeur", ""),
+                "period": row.get("période", ""),
+                "page": row.get("page", ""),
+            }
+    return kpis
+
+
+def _normalize(value):
+    return re.sub(r"[\s*]", "", value or "").lower()
+
+
+def diff_kpis(old, new):
+    """Indicateurs ajoutés, supprimés ou dont la valeur a changé."""
+    changes = []
+    for name, entry in new.items():
+        before = old.get(name)
+        if before is None:
+            changes.append({"indicator": name, "before": "", "after": entry["value"], "status": "ajouté"})
+        elif _normalize(before["value"]) != _normalize(entry["value"]):
+            changes.append({"indicator": name, "before": before["value"], "after": entry["value"], "status": "modifié"})
+    for name, entry in old.items():
+        if name not in new:
+            changes.append({"indicator": name, "before": entry["value"], "after": "", "status": "supprimé"})
+    return changes
+
+
+class _PageTexts:
+    """Textes des pages, décompressés un à un à la lecture (jamais tous en mémoire à la fois)."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __iter__(self):
+        return (page["text"].get() for page in self.pages)
+
+
+class DocumentAnalysis:
+    """Pages, empreintes, notes de sections et résumé d'une version d'un document."""
+
+    def __init__(self, pages, previous=None, mode=None):
+        # pages : [{"number", "fingerprint", "text_hash", "text", "reused"}] ; "text" est une
+        # chaîne ou un `CompressedText` (page extraite, ou reprise de la version précédente)
+        self.pages = pages
+        self.previous = previous
+        self.mode = mode          # mode d'extraction des pages (None : inconnu, ex. analyse archivée)
+        # Pages conservées compressées, le texte envoyé au modèle n'en est qu'une vue : seules
+        # les pages lues récemment restent décompressées (cache partagé du processus)
+        for page in pages:
+            if not isinstance(page["text"], CompressedText):
+                page["text"] = CompressedText(page["text"])
+        texts = _PageTexts(pages)
+        # Texte envoyé au modèle : lignes répétées de page en page retirées
+        dropped, self.boilerplate_bytes = boilerplate_lines(texts)
+        for page, lines in zip(pages, dropped):
+            page["prompt_text"] = FilteredText(page["text"], lines) if lines else page["text"]
+        self.text_bytes = sum(len(text.encode("utf-8")) for text in texts)
+        self.stored_bytes = sum(len(page["text"].blob) for page in pages)
+        self.section_notes = {}   # empreinte de section -> {"first", "last" (pages), "note"}
+        self.summary_key = None   # empreinte de l'entrée du résumé final
+        self.summary = None
+        self.stats = {"sections": 0, "reused_sections": 0, "llm_calls": 0}
+
+    @classmethod
+    def from_pdf(cls, pdf_source, previous=None, metrics=None, mode=DEFAULT_MODE):
+        """Extrait les pages ; celles déjà vues dans `previous` ne sont pas ré-extraites.
+
+        `pdf_source` : octets du PDF, ou `SpooledPDF` pour un fichier volumineux
+        resté sur disque. Les pages sont extraites par fenêtres bornées en mémoire,
+        selon le mode d'extraction `mode` (voir `extraction.MODES`).
+        """
+        known = {}
+        if previous is not None:
+            # Le texte d'une page n'est repris que s'il a été extrait dans le même mode
+            if previous.mode == mode:
+                known = {page["fingerprint"]: page for page in previous.pages}
+            # Seule la version précédente est conservée, pas tout l'historique
+            previous.previous = None
+
+        with metrics.stage("extraction", mode=mode) as event:
+            pages = []
+            pdf = open_pdf(pdf_source)
+            try:
+                window = window_pages(len(pdf_source), pdf.page_count)
+                for number in range(1, pdf.page_count + 1):
+                    if number > 1 and (number - 1) % window == 0:
+                        # Fenêtre suivante : document rouvert, cache d'objets de MuPDF vidé
+                        pdf.close()
+                        release_pdf_memory()
+                        pdf = open_pdf(pdf_source)
+                    page = pdf[number - 1]
+                    fingerprint = page_fingerprint(pdf, page)
+                    seen = known.get(fingerprint)
+                    if seen is not None:
+                        # Texte compressé partagé avec la version précédente
+                        text, text_hash = seen["text"], seen["text_hash"]
+                    else:
+                        # Compressé dès l'extraction : le texte complet n'est jamais gardé en mémoire
+                        text = clean_page_text(extract_page_text(page, mode))
+                        text_hash = _digest(text)
+                        text = CompressedText(text)
+                    pages.append({
+                        "number": number,
+                        "fingerprint": fingerprint,
+                        "text_hash": text_hash,
+                        "text": text,
+                        "reused": seen is not None,
+                    })
+            finally:
+                pdf.close()
+            analysis = cls(pages, previous, mode)
+            event["pages"] = len(pages)
+            event["window_pages"] = window
+            event["reused_pages"] = sum(page["reused"] for page in pages)
+            event["chars"] = sum(len(page["prompt_text"]) for page in pages)
+            event["boilerplate_bytes"] = analysis.boilerplate_bytes
+            event["stored_bytes"] = analysis.stored_bytes
+
+        return analysis
+
+    def text(self, max_length=120000, dedupe=True):
+        """Texte balisé `=== [PAGE X] ===`, tronqué à `max_length` : (texte, tronqué).
+
+        Avec `dedupe`, les en-têtes et pieds de page répétés ne figurent
+        qu'une fois : le budget de caractères va au contenu utile.
+        """
+        parts = []
+        size = 0
+        for page in self.pages:
+            parts.append(f"\n\n=== [PAGE {page['number']}] ===\n{self.page_text(page['number'], dedupe)}")
+            size += len(parts[-1])
+            # Les pages au-delà de la limite ne sont pas décompressées
+            if size > max_length:
+                break
+        text = "".join(parts)
+        truncated = len(text) > max_length
+        if truncated:
+            text = text[:max_length]
+        return text, truncated
+
+    def page_text(self, number, dedupe=True):
+        """Texte d'une page (numérotée à partir de 1), sans les lignes répétées avec `dedupe`"""
+        return self.pages[number - 1]["prompt_text" if dedupe else "text"].get()
+
+    def is_revision_of(self, other):
+        """Vrai si `other` est une version antérieure du même document."""
+        if other is None or not other.pages:
+            return False
+        previous_hashes = {page["text_hash"] for page in other.pages}
+        shared = sum(page["text_hash"] in previous_hashes for page in self.pages)
+        return shared / max(len(self.pages), len(other.pages)) >= REVISION_MIN_SHARED
+
+    def changed_pages(self):
+        """Numéros des pages dont le texte ne figure pas dans la version précédente."""
+        if self.previous is None:
+            return [page["number"] for page in self.pages]
+        previous_hashes = {page["text_hash"] for page in self.previous.pages}
+        return [page["number"] for page in self.pages if page["text_hash"] not in previous_hashes]
+
+    def summarize(self, text, summarize_section, summarize_document, variant=""):
+        """Résume `text` par sections en réutilisant le travail de la version précédente.
+
+        `summarize_section(section)` retourne des notes de lecture et
+        `summarize_document(contenu)` le résumé final. Un texte tenant en une
+        section est résumé directement, comme auparavant. Si l'entrée du
+        résumé final est inchangée, le résumé précédent est repris tel quel.
+        `variant` (modèle, paramètres du prompt) fait partie des clés : rien
+        n'est réutilisé d'un modèle à l'autre.
+
+        La clé des notes d'une section est faite des empreintes de ses pages,
+        sans leurs numéros : après une page insérée ou retirée plus haut, les
+        notes sont reprises et les numéros de page qu'elles citent décalés.
+        """
+        previous = self.previous
+        sections = _page_sections(text, SECTION_CHARS)
+        self.stats = {"sections": len(sections), "reused_sections": 0, "llm_calls": 0}
+
+        if len(sections) > 1:
+            notes = []
+            for section in sections:
+                section_text = "".join(block for _, block, _ in section)
+                numbers = [number for number, _, _ in section if number is not None] or [None]
+                key = _digest("\0".join([variant, *(digest for _, _, digest in section)]))
+                entry = previous.section_notes.get(key) if previous is not None else None
+                if entry is None:
+                    note = summarize_section(section_text)
+                    self.stats["llm_calls"] += 1
+                else:
+                    offset = numbers[0] - entry["first"] if None not in (numbers[0], entry["first"]) else 0
+                    note = shift_page_references(entry["note"], entry["first"], entry["last"], offset)
+                    self.stats["reused_sections"] += 1
+                self.section_notes[key] = {"first": numbers[0], "last": numbers[-1], "note": note}
+                notes.append(f"--- Notes de lecture ({section_label(section_text)}) ---\n{note}")
+            content = "\n\n".join(notes)
+        else:
+            content = text
+
+        self.summary_key = _digest(f"{variant}\0{content}")
+        if previous is not None and previous.summary and previous.summary_key == self.summary_key:
+            self.summary = previous.summary
+            if len(sections) <= 1:
+                # Texte résumé directement : sa seule section est reprise avec le résumé
+                self.stats["reused_sections"] = len(sections)
+        else:
+            self.summary = summarize_document(content)
+            self.stats["llm_calls"] += 1
+        return self.summary
+
+    def revision_report(self):
+        """Bilan de la réanalyse par rapport à la version précédente (None si nouveau document)."""
+        previous = self.previous
+        if previous is None or not previous.summary or not self.is_revision_of(previous):
+            return None
+        return {
+            "pages": len(self.pages),
+            "changed_pages": self.changed_pages(),
+            "removed_pages": max(0, len(previous.pages) - len(self.pages)),
+            "reextracted_pages": sum(not page["reused"] for page in self.pages),
+            **self.stats,
+            "kpi_changes": diff_kpis(parse_kpi_table(previous.summary), parse_kpi_table(self.summary)),
+        }
+
+
+def render_revision_report(report):
+    """Affiche le bilan d'une réanalyse incrémentale et l'écart des chiffres clés."""
+    import streamlit as st
+
+    changed = report["changed_pages"]
+    pages = ", ".join(str(n) for n in changed[:20]) + (" …" if len(changed) > 20 else "")
+    st.info(
+        f"🔄 Nouvelle version détectée : {len(changed)} page(s) modifiée(s) sur {report['pages']}"
+        + (f" ({pages})" if changed else "")
+        + (f", {report['removed_pages']} page(s) supprimée(s)" if report["removed_pages"] else "")
+        + f". {report['reextracted_pages']} page(s) ré-extraite(s), "
+        f"{report['reused_sections']}/{report['sections']} section(s) réutilisée(s), "
+        f"{report['llm_calls']} appel(s) au modèle."
+    )
+    if report["kpi_changes"]:
+        st.markdown("**Évolution des chiffres clés par rapport à la version précédente**")
+        st.table([
+            {"Indicateur": c["indicator"], "Avant": c["before"], "Après": c["after"], "Statut": c["status"]}
+            for c in report["kpi_changes"]
+        ])
+    else:
+        st.caption("Aucun chiffre clé modifié par rapport à la version précédente.")
@@ -0,0 +1,225 @@
+"""Routage adaptatif des requêtes entre les modèles OpenRouter.
+
+Pour chaque modèle, une fenêtre glissante des derniers appels conserve la
+latence (normalisée par le nombre de tokens traités) et le succès. À chaque
+requête, le routeur :
+
+1. écarte les modèles dont la fenêtre de contexte ne contient pas le prompt
+   et la réponse attendue ;
+2. écarte les modèles dont le taux d'erreur récent est trop élevé, ou dont
+   les derniers appels ont tous échoué (ils sont réessayés quand leurs
+   erreurs sortent de la fenêtre) ;
+3. classe les autres du plus rapide au plus lent, la latence étant majorée
+   par le taux d'erreur (coût attendu des bascules) ; un modèle encore
+   jamais appelé passe en premier pour être évalué, un modèle dont tous les
+   appels récents ont échoué passe en dernier.
+
+En cas d'erreur ou de délai dépassé, l'appel bascule sur le candidat
+suivant. Seule la requête HTTP est chronométrée (ni l'attente dans la file
+de l'ordonnanceur, ni celle d'un appel identique déjà en cours), et les
+refus de quota ou de budget, qui ne disent rien du modèle, ne sont pas
+comptés comme des échecs. Le routeur est partagé par toutes les sessions du processus : les
+mesures de l'une profitent aux autres.
+"""
+import math
+import statistics
+import threading
+import time
+from collections import deque
+
+from ratelimit import BudgetExceeded, QuotaExceeded
+
+# Modèles proposés et taille de leur fenêtre de contexte (tokens)
+MODELS = {
+    "mistralai/mistral-7b-instruct": 32768,
+    "meta-llama/llama-3.1-8b-instruct": 131072,
+    "anthropic/claude-3-haiku": 200000,
+}
+
+# Valeur du sélecteur de modèle qui active le routage
+AUTO_MODEL = "auto"
+
+# Fenêtre glissante : nombre d'appels et ancienneté maximale (s) par modèle
+WINDOW_CALLS = 20
+WINDOW_S = 600
+
+# Modèle écarté au-delà de ce taux d'erreur (sur au moins MIN_SAMPLES appels récents),
+# ou quand ses MIN_SAMPLES derniers appels ont tous échoué
+MAX_ERROR_RATE = 0.5
+MIN_SAMPLES = 2
+
+# Délai maximal d'un appel routé, de la connexion à la fin de la réponse, avant bascule
+# sur le modèle suivant (s)
+REQUEST_TIMEOUT_S = 90
+
+# Estimation prudente pour un texte financier français (chiffres, ponctuation)
+CHARS_PER_TOKEN = 3.5
+
+# Réponse réservée dans la fenêtre de contexte quand max_tokens n'est pas précisé
+DEFAULT_COMPLETION_TOKENS = 2000
+
+
+class NoModelAvailable(RuntimeError):
+    """Aucun modèle ne peut traiter la requête (document trop long)."""
+
+
+def estimate_tokens(messages):
+    return int(sum(len(m["content"]) for m in messages) / CHARS_PER_TOKEN)
+
+
+class ModelStats:
+    """Fenêtre glissante des appels récents d'un modèle."""
+
+    def __init__(self):
+        self.calls = deque(maxlen=WINDOW_CALLS)   # (horodatage, s / 1000 tokens ou None, succès)
+
+    def record(self, duration_s, tokens, ok):
+        rate = duration_s / max(tokens, 1) * 1000 if ok else None
+        self.calls.append((time.time(), rate, ok))
+
+    def recent(self):
+        horizon = time.time() - WINDOW_S
+        return [call for call in self.calls if call[0] >= horizon]
+
+    def error_rate(self):
+        recent = self.recent()
+        return sum(not ok for _, _, ok in recent) / len(recent) if recent else 0.0
+
+    def latency(self):
+        """Médiane des secondes par 1000 tokens des appels réussis (None si jamais mesuré)"""
+        rates = [rate for _, rate, ok in self.recent() if ok]
+        return statistics.median(rates) if rates else None
+
+    def expected_latency(self):
+        """Latence majorée par les bascules probables.
+
+        0 si le modèle n'a pas d'appel récent (à évaluer en priorité), l'infini
+        s'il n'a que des échecs récents (tenté après tous les autres).
+        """
+        latency = self.latency()
+        if latency is None:
+            return math.inf if self.recent() else 0.0
+        return latency / max(1.0 - self.error_rate(), 0.1)
+
+    def healthy(self):
+        recent = self.recent()
+        if len(recent) < MIN_SAMPLES:
+            return True
+        if not any(ok for _, _, ok in recent[-MIN_SAMPLES:]):
+            return False
+        return self.error_rate() <= MAX_ERROR_RATE
+
+
+class ModelRouter:
+    """Choix du modèle par requête et bascule en cas d'échec."""
+
+    def __init__(self, models=MODELS):
+        self.models = dict(models)
+        self._stats = {model: ModelStats() for model in self.models}
+        self._lock = threading.Lock()
+
+    def candidates(self, prompt_tokens, completion_tokens=DEFAULT_COMPLETION_TOKENS):
+        """Modèles utilisables pour cette requête, du plus rapide au plus lent.
+
+        Retourne (candidats, écartés) ; `écartés` associe chaque modèle
+        exclu à la raison de son exclusion.
+        """
+        needed = prompt_tokens + completion_tokens
+        excluded = {}
+        fitting = []
+        with self._lock:
+            for model, context in self.models.items():
+                if context < needed:
+                    excluded[model] = f"contexte {context} < {needed} tokens"
+                else:
+                    fitting.append(model)
+            if not fitting:
+                raise NoModelAvailable(
+                    f"Document trop long pour les modèles disponibles ({needed} tokens estimés) : "
+                    "réduisez la longueur maximale du texte"
+                )
+            healthy = [m for m in fitting if self._stats[m].healthy()]
+            for model in fitting:
+                if model not in healthy:
+                    excluded[model] = f"taux d'erreur {self._stats[model].error_rate():.0%} (échecs récents)"
+            # Tous en erreur : les moins défaillants sont tentés malgré tout
+            ranked = healthy or sorted(fitting, key=lambda m: self._stats[m].error_rate())
+            ranked = sorted(ranked, key=lambda m: self._stats[m].expected_latency())
+        return ranked, excluded
+
+    def record(self, model, duration_s, tokens, ok):
+        with self._lock:
+            self._stats[model].record(duration_s, tokens, ok)
+
+    def call(self, messages, send, completion_tokens=None, metrics=None, call=None):
+        """Envoie la requête au meilleur modèle, avec bascule en cas d'échec.
+
+        `send(model, attempt)` effectue l'appel et retourne la réponse ; il
+        renseigne `attempt["http_s"]`, durée de la requête HTTP elle-même,
+        s'il l'a envoyée (un appel fusionné avec un appel identique en cours
+        n'est pas mesuré : celui qui envoie la requête l'est). Retourne le
+        couple (réponse, modèle utilisé) ; la dernière erreur est relevée
+        si tous les candidats échouent. Les dépassements de quota ou de
+        budget sont relevés tels quels, sans bascule.
+        """
+        prompt_tokens = estimate_tokens(messages)
+        tokens = prompt_tokens + (completion_tokens or DEFAULT_COMPLETION_TOKENS)
+        with metrics.stage("routage", call=call) as event:
+            ranked, excluded = self.candidates(prompt_tokens, completion_tokens or DEFAULT_COMPLETION_TOKENS)
+            event.update(prompt_tokens_estimate=prompt_tokens, candidates=ranked, excluded=excluded, failover=[])
+            error = None
+            for model in ranked:
+                attempt = {}
+                try:
+                    content = send(model, attempt)
+                except (BudgetExceeded, QuotaExceeded):
+                    raise
+                except Exception as e:
+                    if "http_s" in attempt:
+                        self.record(model, attempt["http_s"], tokens, ok=False)
+                    event["failover"].append({"model": model, "error": f"{type(e).__name__}: {e}"[:200]})
+                    error = e
+                    continue
+                if "http_s" in attempt:
+                    self.record(model, attempt["http_s"], tokens, ok=True)
+                event["model"] = model
+                return content, model
+            raise error
+
+    def snapshot(self):
+        """État de chaque modèle (affichage)"""
+        with self._lock:
+            rows = []
+            for model, context in self.models.items():
+                stats = self._stats[model]
+                latency = stats.latency()
+                rows.append({
+                    "Modèle": model,
+                    "Contexte": context,
+                    "Appels récents": len(stats.recent()),
+                    "s / 1k tokens": round(latency, 3) if latency is not None else None,
+                    "Erreurs": f"{stats.error_rate():.0%}",
+                    "État": "actif" if stats.healthy() else "écarté",
+                })
+            return rows
+
+
+def last_routed_model(metrics):
+    """Modèle retenu par le dernier appel routé de la session (None si aucun)"""
+    events = metrics.events.copy()
+    return next((e["model"] for e in reversed(events) if e["stage"] == "routage" and e.get("model")), None)
+
+
+# Routeur unique pour le processus (mesures partagées entre sessions)
+ROUTER = ModelRouter()
+
+
+def render_router_status(router=ROUTER):
+    """Tableau de l'état du routeur (latence, erreurs, contexte par modèle)"""
+    import streamlit as st
+
+    st.dataframe(router.snapshot(), hide_index=True, use_container_width=True)
+    st.caption(
+        f"Fenêtre glissante : {WINDOW_CALLS} derniers appels, {WINDOW_S // 60} min. "
+        f"Modèle écarté au-delà de {MAX_ERROR_RATE:.0%} d'erreurs ou après {MIN_SAMPLES} échecs consécutifs."
+    )
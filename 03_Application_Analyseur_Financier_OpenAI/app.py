@@ -1,10 +1,20 @@
 import streamlit as st
 import os
-import fitz  # PyMuPDF
-from dotenv import load_dotenv, find_dotenv
-from openai import OpenAI
-import tempfile
-import pathlib
+from contextlib import nullcontext
+import pipeline
+from preview import document_info, render_citation_links, render_page_viewer
+from revisions import render_revision_report
+from boilerplate import format_savings
+from batch import parse_checklist, render_batch_answers
+from compare import MAX_DOCUMENTS, ComparisonSet, document_labels, merge_kpis, pages_caption, render_kpi_comparison
+from prefetch import SUGGESTED_QUESTIONS, Prefetcher, render_prefetch_status
+from ratelimit import render_scheduler_status
+from instrumentation import PipelineMetrics, render_metrics_panel
+from storage import CompressedText, render_session_memory
+from archive import ARCHIVE, render_archive_search, render_archived_answers
+from spool import pdf_digest, read_upload
+from extraction import DEFAULT_MODE, MODES
+from profiling import DEFAULT_PROFILER, PROFILERS, ProfileRun, render_profile_panel
 
 # Configuration de la page
 st.set_page_config(
@@ -14,20 +24,32 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Instrumentation du pipeline (une instance par session)
+if 'metrics' not in st.session_state:
+    st.session_state.metrics = PipelineMetrics(backend="openai")
+metrics = st.session_state.metrics
+
 # Titre principal
 st.title("📊 Analyse Automatique de Documents Financiers")
 st.markdown("Transformez vos rapports financiers en résumés structurés grâce à l'IA générative")
 
+# Chargement des variables d'environnement (une seule fois par processus, pas à chaque rerun)
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """Cherche et charge le .env (remonte les dossiers si besoin)"""
+    from dotenv import find_dotenv, load_dotenv
+    
+    env_path = find_dotenv(filename=".env", usecwd=True)
+    load_dotenv(dotenv_path=env_path, override=True)
+    return env_path
+
 # Sidebar pour la configuration
 with st.sidebar:
     st.header("⚙️ Configuration")
 
 
     # Chargement des variables d'environnement
-    # Chercher et charger le .env (remonte les dossiers si besoin)
-    from dotenv import find_dotenv
-    env_path = find_dotenv(filename=".env", usecwd=True)
-    load_dotenv(dotenv_path=env_path, override=True)
+    load_environment()
     
     # Interface pour configurer la clé API
     st.subheader("🔑 Configuration API OpenAI")
@@ -65,6 +87,8 @@ with st.sidebar:
         ["gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo"],
         index=0
     )
+    with st.expander("🚦 Quotas et budget"):
+        render_scheduler_status()
     
     # Limite de longueur du texte
     max_length = st.slider(
@@ -75,6 +99,56 @@ with st.sidebar:
         step=10000
     )
     
+    # Mode d'extraction : vitesse ou fidélité à la mise en page
+    extraction_mode = st.selectbox(
+        "🧾 Mode d'extraction du texte",
+        list(MODES),
+        index=list(MODES).index(DEFAULT_MODE),
+        format_func=MODES.get,
+        help="Texte brut : le plus rapide. Blocs triés : haut de page vers le bas. Mise en page : colonnes lues l'une après l'autre et lignes de tableau réassemblées (plus lent). Chiffres uniquement : lignes contenant des nombres, pour les pages de chiffres clés (beaucoup moins de tokens)."
+    )
+    
+    # Préchargement spéculatif des questions suggérées
+    prefetch_enabled = st.checkbox(
+        "⚡ Précharger les questions suggérées",
+        value=False,
+        help="Après le résumé, répond en arrière-plan aux questions suggérées "
+             "(budget de questions et de tokens borné) : leurs boutons répondent ensuite instantanément."
+    )
+    
+    # Comparaison de plusieurs documents (onglet supplémentaire)
+    comparison_mode = st.checkbox(
+        "🔀 Mode comparaison",
+        value=False,
+        help=f"Compare 2 à {MAX_DOCUMENTS} rapports (exercices successifs, concurrents) : chiffres clés "
+             "alignés avec leurs écarts et questions portant sur tous les documents."
+    )
+    
+    # Archive locale des analyses (onglet de recherche)
+    archive_enabled = st.checkbox(
+        "🗄️ Archiver les analyses",
+        value=False,
+        help="Conserve les pages, le résumé, les chiffres clés et les réponses dans une archive locale "
+             "(SQLite) : recherche plein texte et réouverture sans nouvel appel au modèle. "
+             "L'archive est partagée par tous les utilisateurs de cette instance."
+    )
+    
+    # Profilage à la demande (fichiers téléchargeables dans la sidebar)
+    profile_enabled = st.checkbox(
+        "🔬 Profiler l'analyse",
+        value=DEFAULT_PROFILER is not None,
+        help="Profile la prochaine analyse (extraction, construction du prompt, appel à OpenAI) : "
+             "statistiques pstats et piles repliées pour flamegraph."
+    )
+    if profile_enabled:
+        profile_mode = st.radio(
+            "Profileur",
+            list(PROFILERS),
+            index=list(PROFILERS).index(DEFAULT_PROFILER or "cprofile"),
+            format_func=PROFILERS.get,
+            horizontal=True
+        )
+    
     st.markdown("---")
     st.markdown("**Instructions :**")
     st.markdown("1. Uploadez votre PDF financier")
@@ -82,43 +156,29 @@ with st.sidebar:
     st.markdown("3. Posez des questions spécifiques")
 
 # Fonction pour extraire le texte du PDF
-def extract_pdf_text(pdf_file, max_length=120000):
-    """Extrait le texte d'un PDF avec repères de pages"""
+def extract_pdf_text(pdf_source, max_length=120000, previous=None, mode=DEFAULT_MODE):
+    """Extrait le texte d'un PDF avec repères de pages.
+    
+    Retourne (analyse, texte, longueur) ; les pages inchangées depuis
+    l'analyse précédente ne sont pas ré-extraites.
+    """
     try:
-        # Créer un fichier temporaire
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_path = tmp_file.name
-        
-        # Ouvrir le PDF avec PyMuPDF
-        pdf = fitz.open(tmp_path)
-        
-        # Extraire le texte page par page
-        text = ""
-        for i, page in enumerate(pdf, start=1):
-            page_text = page.get_text()
-            text += f"\n\n=== [PAGE {i}] ===\n" + page_text.strip()
-        
-        # Nettoyer le texte
-        text = "\n".join(line.strip() for line in text.splitlines())
+        analysis = pipeline.load_document(pdf_source, previous, metrics=metrics, mode=mode)
+        text, truncated = analysis.text(max_length)
         
         # Limiter la longueur si nécessaire
-        if len(text) > max_length:
-            text = text[:max_length]
+        if truncated:
             st.warning(f"⚠️ Le texte a été tronqué à {max_length} caractères pour éviter les dépassements d'API")
         
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
-        
-        return text, len(text)
+        return analysis, text, len(text)
         
     except Exception as e:
         st.error(f"❌ Erreur lors de la lecture du PDF: {str(e)}")
-        return None, 0
+        return None, None, 0
 
 # Fonction pour générer le résumé
-def generate_summary(text, model="gpt-4o-mini"):
-    """Génère un résumé financier structuré"""
+def generate_summary(analysis, text, model="gpt-4o-mini"):
+    """Génère un résumé financier structuré (seules les sections modifiées sont résumées à nouveau)"""
     
     # Récupérer la clé API depuis la session
     api_key = st.session_state.get('openai_api_key')
@@ -126,45 +186,8 @@ def generate_summary(text, model="gpt-4o-mini"):
         st.error("❌ Clé API non configurée")
         return None
     
-    # Consignes pour le modèle
-    instructions = (
-        "Tu es analyste financier. On te fournit le texte d'un document financier "
-        "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
-        "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
-        "- **Société / Période / Devise** : (si repérable)\n"
-        "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
-        "- **Chiffres clés** (tableau) :\n"
-        " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
-        " |---|---:|---|---|---:|\n"
-        " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX, "
-        "Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
-        "- **Analyse** :\n"
-        " - Performance (croissance, marges, cash)\n"
-        " - Structure financière (dette, liquidité)\n"
-        " - Risques & incertitudes (marché, réglementation, change)\n"
-        " - Outlook / Guidance (si communiqué)\n"
-        "- **Références internes** : pages/sections à relire\n\n"
-        "Exigences :\n"
-        "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
-        "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
-        "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
-        "- Reste concis : 200–350 mots hors tableau."
-    )
-    
     try:
-        client = OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": instructions},
-                {"role": "user", "content": text}
-            ],
-            max_tokens=2000,
-            temperature=0.1
-        )
-        
-        return response.choices[0].message.content
+        return pipeline.generate_document_summary(analysis, text, api_key, model, metrics=metrics)
         
     except Exception as e:
         st.error(f"❌ Erreur lors de la génération du résumé: {str(e)}")
@@ -180,36 +203,219 @@ def answer_question(text, question, model="gpt-4o"):
         st.error("❌ Clé API non configurée")
         return None
     
-    instructions = (
-        "Tu es analyste financier. On te donne un extrait de rapport financier. "
-        "Réponds uniquement à la question posée, sans inventer de données. "
-        "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
-        "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
-    )
+    try:
+        return pipeline.answer_question(text, question, api_key, model, metrics=metrics)
+        
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la réponse à la question: {str(e)}")
+        return None
+
+# Contexte dans lequel une réponse préchargée reste valable
+def prefetch_key(text, model):
+    return (hash(text), model)
+
+# Fonction pour précharger les réponses aux questions suggérées
+def start_prefetch(stored_text, model):
+    """Lance le préchargement en arrière-plan (le précédent est annulé).
+    
+    Le texte reste compressé pendant le préchargement ; il n'est décompressé qu'au moment de chaque appel.
+    """
+    previous = st.session_state.get('prefetch')
+    if previous is not None:
+        previous.cancel()
+    
+    api_key = st.session_state.get('openai_api_key')
+    st.session_state['prefetch'] = Prefetcher(
+        prefetch_key(stored_text.get(), model),
+        lambda question: pipeline.answer_question(
+            stored_text.get(), question, api_key, model, metrics=metrics, call="prefetch"
+        ),
+        stored_text
+    ).start()
+
+# Fonction pour répondre à une question suggérée (réponse préchargée si disponible)
+def answer_suggested_question(text, question, model):
+    """Retourne (réponse, préchargée)"""
+    prefetcher = st.session_state.get('prefetch')
+    if prefetcher is not None and prefetcher.key != prefetch_key(text, model):
+        prefetcher = None
+    
+    if prefetcher is not None and prefetcher.get(question):
+        return prefetcher.get(question), True
+    
+    answer = answer_question(text, question, model)
+    if answer and prefetcher is not None:
+        prefetcher.store(question, answer)
+    return answer, False
+
+# Fonction pour répondre à une série de questions en un seul appel
+def answer_questions(text, questions, model="gpt-4o"):
+    """Répond à plusieurs questions avec une seule copie du document"""
+    
+    # Récupérer la clé API depuis la session
+    api_key = st.session_state.get('openai_api_key')
+    if not api_key:
+        st.error("❌ Clé API non configurée")
+        return None
     
     try:
-        client = OpenAI(api_key=api_key)
+        return pipeline.answer_questions(text, questions, api_key, model, metrics=metrics)
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": instructions},
-                {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
-            ],
-            max_tokens=1000,
-            temperature=0.1
-        )
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la réponse aux questions: {str(e)}")
+        return None
+
+# Fonction pour comparer les chiffres clés de plusieurs documents
+def compare_kpis(documents, model="gpt-4o-mini"):
+    """Tableau comparatif des chiffres clés (extraits une fois par document et par modèle)"""
+    api_key = st.session_state.get('openai_api_key')
+    try:
+        tables = [pipeline.extract_kpis(document, api_key, model, metrics=metrics) for document in documents]
+        return merge_kpis(documents, tables)
         
-        return response.choices[0].message.content
+    except Exception as e:
+        st.error(f"❌ Erreur lors de l'extraction des chiffres clés: {str(e)}")
+        return None
+
+# Fonction pour répondre à une question portant sur plusieurs documents
+def answer_comparison(question, documents, model="gpt-4o", max_chars=120000):
+    """Retourne (réponse, pages retenues par document)"""
+    api_key = st.session_state.get('openai_api_key')
+    try:
+        return pipeline.answer_comparison(question, documents, api_key, model, max_chars, metrics=metrics)
         
     except Exception as e:
-        st.error(f"❌ Erreur lors de la réponse à la question: {str(e)}")
+        st.error(f"❌ Erreur lors de la comparaison: {str(e)}")
         return None
 
+# Onglet de comparaison : chaque document est extrait et indexé une seule fois par session
+def render_comparison(model, max_length):
+    st.header("🔀 Comparaison de Documents")
+    uploaded_files = st.file_uploader(
+        f"Choisissez de 2 à {MAX_DOCUMENTS} documents financiers (PDF)",
+        type=['pdf'],
+        accept_multiple_files=True,
+        help="Par exemple les rapports annuels de plusieurs exercices, ou ceux de sociétés comparables"
+    ) or []
+    if len(uploaded_files) > MAX_DOCUMENTS:
+        st.warning(f"⚠️ Seuls les {MAX_DOCUMENTS} premiers documents sont comparés.")
+    
+    comparison = st.session_state.setdefault('comparison', ComparisonSet())
+    selected = []
+    for uploaded in uploaded_files[:MAX_DOCUMENTS]:
+        try:
+            with st.spinner(f"📖 Extraction de {uploaded.name}..."):
+                document = comparison.add_upload(
+                    uploaded, lambda pdf_source: pipeline.load_document(pdf_source, metrics=metrics)
+                )
+            selected.append(document.doc_hash)
+        except Exception as e:
+            st.error(f"❌ Erreur lors de la lecture de {uploaded.name}: {str(e)}")
+    comparison.retain(selected)
+    documents = comparison.documents()
+    
+    if len(documents) < 2:
+        st.info("📂 Uploadez au moins deux documents pour les comparer.")
+        return
+    
+    st.caption(" · ".join(
+        f"**{label}** : {document.name} ({len(document.analysis.pages)} pages)"
+        for label, document in zip(document_labels(documents), documents)
+    ))
+    selection_key = (tuple(document.doc_hash for document in documents), model)
+    
+    st.subheader("📈 Chiffres clés comparés")
+    if st.button("📊 Comparer les chiffres clés", type="primary"):
+        with st.spinner("🤖 Extraction des chiffres clés de chaque document..."):
+            rows = compare_kpis(documents, model)
+        if rows is not None:
+            st.session_state['comparison_kpis'] = (selection_key, rows)
+    if st.session_state.get('comparison_kpis', (None,))[0] == selection_key:
+        render_kpi_comparison(st.session_state['comparison_kpis'][1], key="comparison_kpis")
+    
+    st.subheader("❓ Question sur l'ensemble des documents")
+    comparison_question = st.text_area(
+        "Votre question :",
+        placeholder="Ex: Comment la marge opérationnelle a-t-elle évolué d'un exercice à l'autre ?",
+        height=100,
+        key="comparison_question"
+    )
+    if st.button("🔍 Comparer", key="comparison_ask") and comparison_question.strip():
+        with st.spinner("🤔 Recherche des pages pertinentes et analyse..."):
+            result = answer_comparison(comparison_question, documents, model, max_length)
+        if result is not None:
+            answer, pages = result
+            st.session_state['comparison_answer'] = (selection_key, answer, pages_caption(documents, pages))
+    if st.session_state.get('comparison_answer', (None,))[0] == selection_key:
+        _, answer, caption = st.session_state['comparison_answer']
+        st.markdown(answer)
+        st.caption(f"📄 Pages consultées : {caption}")
+
+# Fonction pour archiver un document analysé
+def archive_analysis(doc_hash, filename, analysis, pdf_source, summary, model):
+    """Archive un document analysé (pages, résumé, chiffres clés) ; un échec n'interrompt pas l'analyse"""
+    try:
+        with metrics.stage("archive", call="save"):
+            ARCHIVE.save_document(doc_hash, filename, analysis, pdf_source)
+            ARCHIVE.save_summary(doc_hash, model, summary, analysis)
+    except Exception as e:
+        st.warning(f"⚠️ Archivage impossible : {str(e)}")
+
+# Fonction pour archiver un échange question-réponse
+def archive_answer(question, answer, model):
+    """Archive un échange question-réponse sur le document courant"""
+    try:
+        ARCHIVE.save_answer(st.session_state['pdf_hash'], question, answer, model)
+    except Exception as e:
+        st.warning(f"⚠️ Archivage de la réponse impossible : {str(e)}")
+
+# Fonction pour rouvrir un document archivé
+def open_archived_document(doc_hash, max_length):
+    """Restaure un document depuis l'archive, sans extraction ni appel au modèle"""
+    try:
+        with metrics.stage("archive", call="open"):
+            archived = ARCHIVE.load(doc_hash)
+    except Exception as e:
+        st.error(f"❌ Erreur lors de la lecture de l'archive : {str(e)}")
+        return False
+    if archived is None or archived.summary is None:
+        st.error("❌ Document introuvable dans l'archive")
+        return False
+    
+    st.session_state['pdf_text'] = CompressedText(archived.analysis.text(max_length)[0])
+    st.session_state['summary'] = archived.summary
+    st.session_state['analysis'] = archived.analysis
+    st.session_state['revision'] = None
+    st.session_state['pdf_name'] = archived.filename
+    st.session_state['pdf_hash'] = doc_hash
+    st.session_state['page_count'] = len(archived.analysis.pages)
+    # Sans PDF archivé, la visionneuse de pages est indisponible
+    if archived.pdf_source:
+        st.session_state['pdf_bytes'] = archived.pdf_source
+    else:
+        st.session_state.pop('pdf_bytes', None)
+    st.session_state['archived_answers'] = archived.answers
+    st.session_state.pop('last_answer', None)
+    st.session_state.pop('batch_answers', None)
+    if 'prefetch' in st.session_state:
+        st.session_state.pop('prefetch').cancel()
+    return True
+
 # Interface principale
 def main():
     # Onglets pour organiser l'interface
-    tab1, tab2 = st.tabs(["📄 Upload & Analyse", "❓ Questions"])
+    if comparison_mode:
+        tab1, tab2, tab3, tab4 = st.tabs(["📄 Upload & Analyse", "❓ Questions", "🔀 Comparaison", "🗄️ Archive"])
+        with tab3:
+            render_comparison(model, max_length)
+    else:
+        tab1, tab2, tab4 = st.tabs(["📄 Upload & Analyse", "❓ Questions", "🗄️ Archive"])
+    
+    with tab4:
+        st.header("🗄️ Analyses archivées")
+        archived_hash = render_archive_search(ARCHIVE, metrics, key="archive")
+        if archived_hash and open_archived_document(archived_hash, max_length):
+            st.rerun()
     
     with tab1:
         st.header("📄 Upload et Analyse du PDF")
@@ -232,42 +438,78 @@ def main():
             
             # Bouton pour analyser
             if st.button("🚀 Analyser le document", type="primary"):
-                with st.spinner("📖 Extraction du texte en cours..."):
-                    text, text_length = extract_pdf_text(uploaded_file, max_length)
+                # Octets en mémoire, ou fichier temporaire sur disque pour un gros document
+                pdf_source = read_upload(uploaded_file)
+                # Profil de l'analyse complète (extraction et résumé)
+                profile = nullcontext()
+                if profile_enabled:
+                    profile = st.session_state['profile'] = ProfileRun(profile_mode, "openai", pdf_digest(pdf_source))
+                with profile, st.spinner("📖 Extraction du texte en cours..."):
+                    analysis, text, text_length = extract_pdf_text(
+                        pdf_source, max_length, previous=st.session_state.get('analysis'), mode=extraction_mode
+                    )
                 
                 if text:
                     st.success(f"✅ Texte extrait : {text_length} caractères")
+                    if analysis.boilerplate_bytes:
+                        st.caption(format_savings(analysis.boilerplate_bytes, analysis.text_bytes))
                     
                     # Aperçu du texte
                     with st.expander("👁️ Aperçu du texte extrait"):
                         st.text(text[:1000] + "..." if len(text) > 1000 else text)
                     
                     # Génération du résumé
-                    with st.spinner("🤖 Génération du résumé en cours..."):
-                        summary = generate_summary(text, model)
+                    with profile, st.spinner("🤖 Génération du résumé en cours..."):
+                        summary = generate_summary(analysis, text, model)
                     
                     if summary:
                         st.success("✅ Résumé généré avec succès !")
                         
-                        # Affichage du résumé
-                        st.subheader("📊 Résumé Financier")
-                        st.markdown(summary)
-                        
-                        # Stockage en session pour les questions
-                        st.session_state['pdf_text'] = text
+                        # Stockage en session pour les questions et la vérification des pages (texte compressé)
+                        st.session_state['pdf_text'] = CompressedText(text)
                         st.session_state['summary'] = summary
-                        
-                        # Téléchargement du résumé
-                        st.download_button(
-                            label="💾 Télécharger le résumé (Markdown)",
-                            data=summary,
-                            file_name=f"resume_{uploaded_file.name.replace('.pdf', '')}.md",
-                            mime="text/markdown"
+                        st.session_state['analysis'] = analysis
+                        st.session_state['revision'] = analysis.revision_report()
+                        st.session_state['pdf_name'] = uploaded_file.name
+                        st.session_state['pdf_bytes'] = pdf_source
+                        st.session_state['pdf_hash'], st.session_state['page_count'] = document_info(
+                            st.session_state['pdf_bytes']
                         )
+                        st.session_state.pop('last_answer', None)
+                        st.session_state.pop('batch_answers', None)
+                        st.session_state.pop('archived_answers', None)
+                        if archive_enabled:
+                            archive_analysis(
+                                st.session_state['pdf_hash'], uploaded_file.name, analysis,
+                                st.session_state['pdf_bytes'], summary, model
+                            )
+                        
+                        # Réponses spéculatives aux questions suggérées, sur la capacité libre du backend
+                        if prefetch_enabled:
+                            start_prefetch(st.session_state['pdf_text'], model)
+                        elif 'prefetch' in st.session_state:
+                            st.session_state.pop('prefetch').cancel()
                     else:
                         st.error("❌ Échec de la génération du résumé")
                 else:
                     st.error("❌ Échec de l'extraction du texte")
+        
+        # Affichage du résumé (conservé entre les reruns pour naviguer vers les pages citées)
+        if 'summary' in st.session_state:
+            st.subheader("📊 Résumé Financier")
+            if st.session_state.get('revision'):
+                render_revision_report(st.session_state['revision'])
+            with metrics.stage("rendu", call="summary"):
+                st.markdown(st.session_state['summary'])
+            render_citation_links(st.session_state['summary'], st.session_state['page_count'], key="summary")
+            
+            # Téléchargement du résumé
+            st.download_button(
+                label="💾 Télécharger le résumé (Markdown)",
+                data=st.session_state['summary'],
+                file_name=f"resume_{st.session_state['pdf_name'].replace('.pdf', '')}.md",
+                mime="text/markdown"
+            )
     
     with tab2:
         st.header("❓ Questions sur le Document")
@@ -275,8 +517,14 @@ def main():
         if 'pdf_text' not in st.session_state:
             st.info("ℹ️ Veuillez d'abord analyser un document dans l'onglet 'Upload & Analyse'")
         else:
+            # Texte décompressé une fois par exécution (le plus souvent lu dans le cache partagé)
+            pdf_text = st.session_state['pdf_text'].get()
             st.success("✅ Document chargé et prêt pour les questions")
             
+            # Réponses des sessions précédentes, pour un document rouvert depuis l'archive
+            if st.session_state.get('archived_answers'):
+                render_archived_answers(st.session_state['archived_answers'], st.session_state['page_count'], key="archived")
+            
             # Interface de questions
             question = st.text_input(
                 "Posez votre question sur le document :",
@@ -286,38 +534,105 @@ def main():
             if question:
                 if st.button("🔍 Rechercher la réponse", type="primary"):
                     with st.spinner("🤖 Recherche en cours..."):
-                        answer = answer_question(st.session_state['pdf_text'], question, model)
+                        answer = answer_question(pdf_text, question, model)
                     
                     if answer:
-                        st.success("✅ Réponse trouvée !")
-                        st.markdown("**Question :** " + question)
-                        st.markdown("**Réponse :**")
-                        st.markdown(answer)
+                        st.session_state['last_answer'] = {"question": question, "answer": answer}
+                        if archive_enabled:
+                            archive_answer(question, answer, model)
                     else:
                         st.error("❌ Échec de la recherche de réponse")
             
-            # Questions suggérées
+            # Emplacement de la dernière réponse (rempli après les questions suggérées)
+            answer_area = st.container()
+            
+            # Questions suggérées (⚡ : réponse déjà préchargée)
             st.subheader("💡 Questions suggérées")
-            suggested_questions = [
-                "Quel est le chiffre d'affaires ?",
-                "Quelle est la marge nette ?",
-                "Quels sont les principaux risques identifiés ?",
-                "Quelle est la dette nette ?",
-                "Quel est le cash flow opérationnel ?"
-            ]
+            suggested_questions = SUGGESTED_QUESTIONS
+            
+            prefetcher = st.session_state.get('prefetch')
+            if prefetcher is not None:
+                if prefetcher.key != prefetch_key(pdf_text, model):
+                    # Modèle changé : les réponses préchargées ne correspondent plus
+                    prefetcher.cancel()
+                    st.session_state.pop('prefetch')
+                    prefetcher = None
+                else:
+                    render_prefetch_status(prefetcher, key="prefetch")
             
             for i, suggested_q in enumerate(suggested_questions):
-                if st.button(f"❓ {suggested_q}", key=f"suggested_{i}"):
+                ready = prefetcher is not None and prefetcher.get(suggested_q)
+                if st.button(f"{'⚡' if ready else '❓'} {suggested_q}", key=f"suggested_{i}"):
                     with st.spinner("🤖 Recherche en cours..."):
-                        answer = answer_question(st.session_state['pdf_text'], suggested_q, model)
+                        answer, prefetched = answer_suggested_question(pdf_text, suggested_q, model)
                     
                     if answer:
-                        st.success("✅ Réponse trouvée !")
-                        st.markdown("**Question :** " + suggested_q)
-                        st.markdown("**Réponse :**")
-                        st.markdown(answer)
+                        st.session_state['last_answer'] = {"question": suggested_q, "answer": answer, "prefetched": prefetched}
+                        if archive_enabled:
+                            archive_answer(suggested_q, answer, model)
                     else:
                         st.error("❌ Échec de la recherche de réponse")
+            
+            # Toutes les questions suggérées, ou une checklist, en un seul appel
+            batch_questions = None
+            if st.button("⚡ Répondre à toutes les questions suggérées (1 appel)", key="suggested_all"):
+                batch_questions = suggested_questions
+            
+            with st.expander("📋 Checklist personnalisée"):
+                checklist = st.text_area(
+                    "Une question par ligne :",
+                    placeholder="Quel est l'EBITDA ?\nQuel est le montant des CAPEX ?\nLa guidance est-elle confirmée ?",
+                    key="checklist"
+                )
+                if st.button("⚡ Répondre à la checklist (1 appel)", key="checklist_run"):
+                    batch_questions = parse_checklist(checklist)
+                    if not batch_questions:
+                        st.warning("⚠️ La checklist ne contient aucune question")
+            
+            if batch_questions:
+                with st.spinner(f"🤖 Réponse à {len(batch_questions)} questions en cours..."):
+                    results = answer_questions(pdf_text, batch_questions, model)
+                
+                if results:
+                    st.session_state['batch_answers'] = results
+                    if archive_enabled:
+                        for result in results:
+                            archive_answer(result["question"], result["answer"], model)
+                else:
+                    st.error("❌ Échec de la recherche de réponses")
+            
+            # Réponses de la dernière série, conservées entre les reruns
+            if 'batch_answers' in st.session_state:
+                st.subheader("📋 Réponses groupées")
+                render_batch_answers(st.session_state['batch_answers'], st.session_state['page_count'], key="batch")
+            
+            # Dernière réponse, conservée entre les reruns avec ses pages citées
+            if 'last_answer' in st.session_state:
+                with answer_area:
+                    last = st.session_state['last_answer']
+                    st.success("✅ Réponse trouvée !")
+                    if last.get("prefetched"):
+                        st.caption("⚡ Réponse préchargée")
+                    st.markdown("**Question :** " + last["question"])
+                    st.markdown("**Réponse :**")
+                    st.markdown(last["answer"])
+                    render_citation_links(last["answer"], st.session_state['page_count'], key="answer")
+    
+    # Visionneuse des pages (sidebar : visible depuis les deux onglets)
+    if 'pdf_bytes' in st.session_state:
+        with st.sidebar.expander("📄 Vérification des pages", expanded=True):
+            with metrics.stage("rendu", call="page_viewer"):
+                render_page_viewer(
+                    st.session_state['pdf_bytes'],
+                    st.session_state['pdf_hash'],
+                    st.session_state['page_count']
+                )
+    
+    # Panneau d'instrumentation (rendu en fin d'exécution pour refléter les mesures courantes)
+    render_metrics_panel(metrics)
+    if 'profile' in st.session_state:
+        render_profile_panel(st.session_state['profile'], key="profile")
+    render_session_memory(st.session_state)
 
 # Footer
 st.markdown("---")
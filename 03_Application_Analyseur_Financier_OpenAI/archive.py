@@ -0,0 +1,442 @@
+"""Archive locale des analyses, consultable par recherche plein texte.
+
+À la fin d'une session, le texte extrait, le résumé et les réponses sont
+perdus. Chaque document analysé est donc conservé dans une base SQLite
+locale : pages, résumé, chiffres clés et questions-réponses.
+
+- Les pages sont stockées compressées et indexées (FTS5, insensible à la
+  casse et aux accents) une seule fois par empreinte de contenu : une page
+  commune à plusieurs versions d'un rapport n'occupe qu'une entrée.
+- La recherche ne consulte que l'index (seule la meilleure page de chaque
+  document est relue, pour l'extrait) : quelques millisecondes sur des
+  milliers de rapports.
+- Un document archivé se rouvre sans nouvelle extraction ni appel au modèle.
+- Supprimer un document retire aussi de la base et de l'index les pages
+  qu'aucun autre document ne référence.
+
+L'archivage est désactivé par défaut (case de la sidebar) : la base est
+partagée par tous les utilisateurs de l'instance, qui peuvent y rechercher.
+
+Emplacement de la base : `ANALYSIS_ARCHIVE_PATH` (défaut : `archive.sqlite3`
+à côté de l'application). Avec `ANALYSIS_ARCHIVE_PDF=0`, les PDF ne sont pas
+conservés et la visionneuse de pages est indisponible pour les documents
+rouverts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+
+from revisions import DocumentAnalysis, parse_kpi_table
+from spool import CHUNK_BYTES, SPOOL_THRESHOLD, SpooledPDF
+from storage import CODEC, CompressedText, decompress, format_size
+
+ARCHIVE_PATH = os.getenv("ANALYSIS_ARCHIVE_PATH", str(Path(__file__).with_name("archive.sqlite3")))
+STORE_PDF = os.getenv("ANALYSIS_ARCHIVE_PDF", "1") != "0"
+
+# Pages les mieux classées lues par recherche, et documents affichés
+SEARCH_PAGES = 200
+SEARCH_RESULTS = 20
+
+# Longueur de l'extrait affiché pour chaque document trouvé (caractères)
+SNIPPET_CHARS = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    archived_at REAL NOT NULL,
+    pdf BLOB
+);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,
+    text_hash TEXT NOT NULL UNIQUE,
+    codec TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    blob BLOB NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(
+    body, content='', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS pages (
+    doc_hash TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    text_id INTEGER NOT NULL,
+    PRIMARY KEY (doc_hash, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pages_by_text ON pages (text_id);
+CREATE TABLE IF NOT EXISTS summaries (
+    doc_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    summary_key TEXT,
+    section_notes TEXT NOT NULL,
+    kpis TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (doc_hash, model)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    doc_hash TEXT NOT NULL,
+    answer_hash TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (doc_hash, answer_hash)
+);
+"""
+
+_WORD_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+# Minuscules sans accents, caractère pour caractère : les positions restent celles du texte d'origine
+_FOLD = {
+    i: folded
+    for i in range(0x250)
+    if (folded := unicodedata.normalize("NFD", chr(i))[0].lower()[:1]) != chr(i)
+}
+
+
+def fts_query(query):
+    """Requête FTS5 à partir de la saisie : tous les mots requis, "expressions exactes" entre guillemets.
+
+    Les opérateurs FTS5 ne sont pas interprétés : chaque terme est cité.
+    """
+    parts = []
+    for phrase, word in _QUERY_RE.findall(query):
+        tokens = _WORD_RE.findall(phrase or word)
+        if tokens:
+            parts.append('"' + " ".join(tokens) + '"')
+    return " ".join(parts)
+
+
+def make_snippet(text, query, width=SNIPPET_CHARS):
+    """Extrait de `text` autour de la première occurrence d'un des termes de `query`."""
+    folded = text.translate(_FOLD)
+    # Expressions exactes et mots significatifs (les mots courts comme « de » sont partout)
+    terms = [" ".join(_WORD_RE.findall(phrase)) for phrase, _ in _QUERY_RE.findall(query) if phrase]
+    terms += [word for word in _WORD_RE.findall(query) if len(word) > 2]
+    positions = [folded.find(term.translate(_FOLD)) for term in terms if term]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 4) if positions else 0
+    excerpt = " ".join(text[start:start + width].split())
+    return ("… " if start else "") + excerpt + (" …" if start + width < len(text) else "")
+
+
+def _answer_hash(question, answer):
+    return hashlib.sha256(f"{question}\0{answer}".encode("utf-8")).hexdigest()
+
+
+class ArchivedDocument:
+    """Document relu depuis l'archive, prêt à être rouvert dans l'application."""
+
+    def __init__(self, doc_hash, filename, analysis, summary, model, kpis, answers, pdf_source):
+        self.doc_hash = doc_hash
+        self.filename = filename
+        self.analysis = analysis
+        self.summary = summary      # résumé le plus récent (None si aucun)
+        self.model = model
+        self.kpis = kpis            # {indicateur: {valeur, période, page}}
+        self.answers = answers      # [{question, answer, model}], du plus ancien au plus récent
+        self.pdf_source = pdf_source  # octets, `SpooledPDF` si volumineux, None si les PDF ne sont pas archivés
+
+
+class AnalysisArchive:
+    """Base SQLite des analyses ; une connexion par thread, créée au premier accès."""
+
+    def __init__(self, path=ARCHIVE_PATH, store_pdf=STORE_PDF):
+        self.path = path
+        self.store_pdf = store_pdf
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def exists(self):
+        # La base n'est créée qu'au premier document archivé
+        return os.path.exists(self.path)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            # Lectures concurrentes pendant qu'une autre session archive
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._ready:
+                    db.executescript(SCHEMA)
+                    self._ready = True
+            self._local.db = db
+        return db
+
+    def save_document(self, doc_hash, filename, analysis, pdf_source=None):
+        """Archive les pages d'un document ; seules les pages encore inconnues sont stockées et indexées.
+
+        `pdf_source` (octets ou `SpooledPDF`) est conservé pour la visionneuse ;
+        un fichier resté sur disque est recopié par blocs.
+        """
+        pdf = pdf_source if self.store_pdf else None
+        spooled = isinstance(pdf, SpooledPDF)
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT INTO documents (doc_hash, filename, pages, archived_at, pdf) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (doc_hash) DO UPDATE SET filename = excluded.filename, "
+                "archived_at = excluded.archived_at, pdf = COALESCE(excluded.pdf, documents.pdf)",
+                (doc_hash, filename, len(analysis.pages), time.time(), None if spooled else pdf),
+            )
+            if spooled:
+                self._write_spooled_pdf(db, doc_hash, pdf)
+            rows = []
+            for page in analysis.pages:
+                stored = page["text"]
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO texts (text_hash, codec, length, blob) VALUES (?, ?, ?, ?)",
+                    (page["text_hash"], CODEC, len(stored), stored.blob),
+                )
+                if cursor.rowcount:
+                    text_id = cursor.lastrowid
+                    db.execute("INSERT INTO texts_fts (rowid, body) VALUES (?, ?)", (text_id, stored.get()))
+                else:
+                    text_id = db.execute("SELECT id FROM texts WHERE text_hash = ?", (page["text_hash"],)).fetchone()[0]
+                rows.append((doc_hash, page["number"], page["fingerprint"], text_id))
+            db.execute("DELETE FROM pages WHERE doc_hash = ?", (doc_hash,))
+            db.executemany("INSERT INTO pages (doc_hash, number, fingerprint, text_id) VALUES (?, ?, ?, ?)", rows)
+            # Pages d'une version précédente extraite autrement (autre mode d'extraction)
+            self._collect_orphan_texts(db)
+
+    @staticmethod
+    def _write_spooled_pdf(db, doc_hash, pdf):
+        # Écriture par blocs (`blobopen`, Python 3.11+) ; sinon le fichier est relu en une fois
+        if not hasattr(db, "blobopen"):
+            with open(pdf.path, "rb") as source:
+                db.execute("UPDATE documents SET pdf = ? WHERE doc_hash = ?", (source.read(), doc_hash))
+            return
+        db.execute("UPDATE documents SET pdf = zeroblob(?) WHERE doc_hash = ?", (pdf.size, doc_hash))
+        rowid = db.execute("SELECT rowid FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()[0]
+        with db.blobopen("documents", "pdf", rowid) as blob:
+            for chunk in pdf.chunks():
+                blob.write(chunk)
+
+    def delete_document(self, doc_hash):
+        """Supprime un document, son résumé, ses réponses et les pages que plus aucun document ne référence."""
+        if not self.exists():
+            return False
+        db = self._db()
+        with db:
+            deleted = db.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,)).rowcount
+            for table in ("pages", "summaries", "answers"):
+                db.execute(f"DELETE FROM {table} WHERE doc_hash = ?", (doc_hash,))
+            self._collect_orphan_texts(db)
+        return bool(deleted)
+
+    @staticmethod
+    def _collect_orphan_texts(db):
+        """Retire les textes orphelins et leurs entrées d'index (dans la transaction en cours)."""
+        orphans = db.execute(
+            "SELECT id, codec, blob FROM texts WHERE NOT EXISTS (SELECT 1 FROM pages WHERE pages.text_id = texts.id)"
+        ).fetchall()
+        for text_id, codec, blob in orphans:
+            # Index sans contenu (content='') : la suppression exige le texte indexé
+            db.execute(
+                "INSERT INTO texts_fts (texts_fts, rowid, body) VALUES ('delete', ?, ?)",
+                (text_id, decompress(blob, codec)),
+            )
+        db.executemany("DELETE FROM texts WHERE id = ?", [(text_id,) for text_id, _, _ in orphans])
+        return len(orphans)
+
+    def save_summary(self, doc_hash, model, summary, analysis=None):
+        """Archive le résumé d'un modèle, ses chiffres clés et les notes de sections (réanalyse incrémentale)."""
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO summaries "
+                "(doc_hash, model, summary, summary_key, section_notes, kpis, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    doc_hash, model, summary,
+                    analysis.summary_key if analysis is not None else None,
+                    json.dumps(analysis.section_notes if analysis is not None else {}, ensure_ascii=False),
+                    json.dumps(parse_kpi_table(summary), ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+
+    def save_answer(self, doc_hash, question, answer, model):
+        """Archive un échange question-réponse (une seule fois s'il se répète)."""
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR IGNORE INTO answers (doc_hash, answer_hash, question, answer, model, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_hash, _answer_hash(question, answer), question, answer, model, time.time()),
+            )
+
+    def search(self, query, limit=SEARCH_RESULTS):
+        """Documents dont les pages contiennent tous les mots de `query`, du plus pertinent au moins pertinent.
+
+        Chaque résultat : {doc_hash, filename, archived_at, pages, snippet} ;
+        `pages` liste les pages trouvées, l'extrait vient de la meilleure.
+        """
+        match = fts_query(query)
+        if not match or not self.exists():
+            return []
+        db = self._db()
+        rows = db.execute(
+            "WITH hits AS (SELECT rowid AS text_id, rank FROM texts_fts WHERE texts_fts MATCH ? ORDER BY rank LIMIT ?) "
+            "SELECT p.doc_hash, d.filename, d.archived_at, p.number, h.text_id FROM hits h "
+            "JOIN pages p ON p.text_id = h.text_id JOIN documents d ON d.doc_hash = p.doc_hash "
+            "ORDER BY h.rank, d.archived_at DESC, p.number",
+            (match, SEARCH_PAGES),
+        ).fetchall()
+
+        results = {}
+        for doc_hash, filename, archived_at, number, text_id in rows:
+            hit = results.get(doc_hash)
+            if hit is None:
+                if len(results) >= limit:
+                    continue
+                hit = results[doc_hash] = {
+                    "doc_hash": doc_hash, "filename": filename, "archived_at": archived_at,
+                    "pages": [], "text_id": text_id,
+                }
+            hit["pages"].append(number)
+        for hit in results.values():
+            hit["pages"].sort()
+            codec, blob = db.execute("SELECT codec, blob FROM texts WHERE id = ?", (hit.pop("text_id"),)).fetchone()
+            hit["snippet"] = make_snippet(decompress(blob, codec), query)
+        return list(results.values())
+
+    def load(self, doc_hash):
+        """Relit un document archivé (pages compressées telles quelles) ; None s'il est inconnu."""
+        if not self.exists():
+            return None
+        db = self._db()
+        document = db.execute(
+            "SELECT rowid, filename, length(pdf) FROM documents WHERE doc_hash = ?", (doc_hash,)
+        ).fetchone()
+        if document is None:
+            return None
+        rowid, filename, pdf_size = document
+        if pdf_size is None:
+            pdf_source = None
+        elif pdf_size > SPOOL_THRESHOLD:
+            # PDF volumineux : recopié par blocs sur disque, comme à l'import
+            offsets = range(1, pdf_size + 1, CHUNK_BYTES)
+            pdf_source = SpooledPDF.from_chunks(
+                (db.execute("SELECT substr(pdf, ?, ?) FROM documents WHERE rowid = ?",
+                            (offset, CHUNK_BYTES, rowid)).fetchone()[0] for offset in offsets),
+                filename,
+            )
+        else:
+            pdf_source = db.execute("SELECT pdf FROM documents WHERE rowid = ?", (rowid,)).fetchone()[0]
+
+        pages = []
+        for number, fingerprint, text_hash, codec, length, blob in db.execute(
+            "SELECT p.number, p.fingerprint, t.text_hash, t.codec, t.length, t.blob FROM pages p "
+            "JOIN texts t ON t.id = p.text_id WHERE p.doc_hash = ? ORDER BY p.number",
+            (doc_hash,),
+        ):
+            if codec == CODEC:
+                text = CompressedText.from_blob(blob, length)
+            else:
+                # Archive écrite avec un autre codec (zstandard installé ou non)
+                text = CompressedText(decompress(blob, codec))
+            pages.append({
+                "number": number, "fingerprint": fingerprint, "text_hash": text_hash,
+                "text": text, "reused": False,
+            })
+        analysis = DocumentAnalysis(pages)
+
+        summary = model = None
+        kpis = {}
+        row = db.execute(
+            "SELECT model, summary, summary_key, section_notes, kpis FROM summaries "
+            "WHERE doc_hash = ? ORDER BY created DESC LIMIT 1",
+            (doc_hash,),
+        ).fetchone()
+        if row is not None:
+            model, summary, analysis.summary_key, section_notes, kpis = row
+            # Une nouvelle version importée ensuite réutilisera les sections inchangées
+            analysis.summary = summary
+            analysis.section_notes = json.loads(section_notes)
+            kpis = json.loads(kpis)
+
+        answers = [
+            {"question": question, "answer": answer, "model": answer_model}
+            for question, answer, answer_model in db.execute(
+                "SELECT question, answer, model FROM answers WHERE doc_hash = ? ORDER BY created",
+                (doc_hash,),
+            )
+        ]
+        return ArchivedDocument(doc_hash, filename, analysis, summary, model, kpis, answers, pdf_source)
+
+    def stats(self):
+        if not self.exists():
+            return {"documents": 0, "pages": 0, "bytes": 0}
+        db = self._db()
+        documents, = db.execute("SELECT COUNT(*) FROM documents").fetchone()
+        texts, = db.execute("SELECT COUNT(*) FROM texts").fetchone()
+        size = sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+        return {"documents": documents, "pages": texts, "bytes": size}
+
+
+# Archive unique pour le processus (partagée entre sessions Streamlit)
+ARCHIVE = AnalysisArchive()
+
+
+def render_archive_search(archive, metrics, key):
+    """Recherche plein texte dans l'archive ; retourne l'empreinte du document à rouvrir (ou None)."""
+    import streamlit as st
+
+    stats = archive.stats()
+    st.caption(
+        f"{stats['documents']} document(s) archivé(s), {stats['pages']} page(s) distincte(s), "
+        f"{format_size(stats['bytes'])}"
+    )
+    query = st.text_input(
+        "Rechercher dans les analyses archivées",
+        placeholder='Ex : covenant, "rupture de covenant", dépréciation goodwill',
+        key=f"{key}_query",
+    )
+    if not query.strip():
+        return None
+
+    with metrics.stage("archive", call="search") as event:
+        hits = archive.search(query)
+        event["results"] = len(hits)
+    st.caption(f"{len(hits)} document(s) trouvé(s) en {event['duration_s'] * 1000:.1f} ms")
+
+    selected = None
+    for hit in hits:
+        pages = ", ".join(str(n) for n in hit["pages"][:10]) + (" …" if len(hit["pages"]) > 10 else "")
+        archived = datetime.fromtimestamp(hit["archived_at"]).strftime("%d/%m/%Y")
+        st.markdown(f"**{hit['filename']}** · archivé le {archived} · page(s) {pages}")
+        st.caption(hit["snippet"])
+        open_col, delete_col = st.columns(2)
+        if open_col.button("📂 Rouvrir", key=f"{key}_open_{hit['doc_hash'][:16]}"):
+            selected = hit["doc_hash"]
+        if delete_col.button("🗑️ Supprimer de l'archive", key=f"{key}_delete_{hit['doc_hash'][:16]}"):
+            archive.delete_document(hit["doc_hash"])
+            st.rerun()
+    return selected
+
+
+def render_archived_answers(answers, page_count, key):
+    """Affiche les questions-réponses archivées d'un document rouvert, avec leurs pages citées."""
+    import streamlit as st
+
+    from preview import render_citation_links
+
+    with st.expander(f"🗄️ {len(answers)} réponse(s) archivée(s)"):
+        for i, entry in enumerate(answers):
+            st.markdown(f"**{i + 1}. {entry['question']}**")
+            st.markdown(entry["answer"])
+            render_citation_links(entry["answer"], page_count, key=f"{key}_{i}")
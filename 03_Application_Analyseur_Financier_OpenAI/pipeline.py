@@ -0,0 +1,322 @@
+"""Pipeline d'analyse indépendant de l'interface Streamlit.
+
+Extraction du texte PDF, construction des prompts et appels à l'API OpenAI.
+Les fonctions lèvent des exceptions au lieu d'afficher des messages : c'est
+`app.py` qui les présente à l'utilisateur. Ce module est aussi utilisé tel
+quel par les scripts de `benchmarks/` (le client OpenAI respecte la
+variable `OPENAI_BASE_URL` pour pointer vers un serveur local).
+
+Le SDK OpenAI et PyMuPDF ne sont importés qu'au premier appel ; un client
+est conservé par clé API pour réutiliser ses connexions. Les appels passent
+par l'ordonnanceur de `ratelimit.py` (quotas par minute, priorités, reprise
+après 429, budget quotidien) : les reprises automatiques du SDK sont
+désactivées pour que les 429 ne soient pas réessayés en dehors de la file ;
+les erreurs passagères (5xx, connexion) sont reprises par l'ordonnanceur.
+"""
+from functools import lru_cache
+
+from instrumentation import PipelineMetrics, openai_usage
+from batch import batch_max_tokens, build_batch_messages, parse_batch_answers
+from extraction import DEFAULT_MODE
+from compare import COMPARISON_CHARS, build_comparison_messages, build_kpi_messages, kpi_context, select_pages
+from ratelimit import SCHEDULER, RateLimited, Unavailable, call_with_retries, key_fingerprint, retry_after
+from revisions import DocumentAnalysis, parse_kpi_table
+from singleflight import INFLIGHT, request_key
+from spool import read_pdf
+
+BACKEND = "openai"
+
+
+def _metrics_or_discard(metrics):
+    # Sans collecteur fourni, les mesures sont simplement ignorées
+    return metrics if metrics is not None else PipelineMetrics(BACKEND, max_events=0)
+
+
+@lru_cache(maxsize=8)
+def _client(api_key):
+    """Client OpenAI créé au premier appel, puis réutilisé pour cette clé"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+def _rate_limited(error):
+    """Convertit un 429 du SDK en `RateLimited` (sauf quota de facturation épuisé : inutile de réessayer)"""
+    if getattr(error, "code", None) == "insufficient_quota":
+        return RuntimeError(f"OpenAI : crédit épuisé ({error})")
+    return RateLimited(f"OpenAI : quota dépassé (429) : {error}", retry_after(error.response.headers))
+
+
+def _create(client, **params):
+    """Requête brute au SDK ; 429 et erreurs passagères converties pour l'ordonnanceur"""
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    try:
+        return client.chat.completions.with_raw_response.create(**params)
+    except RateLimitError as e:
+        raise _rate_limited(e) from e
+    except (APIConnectionError, InternalServerError) as e:
+        # APIConnectionError couvre aussi les délais dépassés (APITimeoutError)
+        raise Unavailable(f"OpenAI : service momentanément indisponible : {e}") from e
+
+
+# Fonction pour extraire les pages du PDF (réutilise les pages inchangées de `previous`)
+def load_document(pdf_source, previous=None, metrics=None, mode=DEFAULT_MODE):
+    """Extrait les pages d'un PDF (octets, ou `SpooledPDF` pour un fichier volumineux) avec leurs empreintes.
+
+    Retourne une `DocumentAnalysis` ; les pages déjà présentes dans la
+    version précédente `previous` ne sont pas ré-extraites. `mode` : mode
+    d'extraction du texte (voir `extraction.MODES`).
+    """
+    return DocumentAnalysis.from_pdf(pdf_source, previous, metrics=_metrics_or_discard(metrics), mode=mode)
+
+
+# Fonction pour extraire le texte du PDF
+def extract_pdf_text(pdf_file, max_length=120000, metrics=None):
+    """Extrait le texte d'un fichier PDF avec repères de pages.
+
+    Retourne le couple (texte, tronqué).
+    """
+    # Au-delà du seuil, le fichier est recopié par blocs sur disque plutôt que lu en mémoire
+    return load_document(read_pdf(pdf_file), metrics=metrics).text(max_length)
+
+
+# Construction des messages pour le résumé
+def build_summary_messages(text):
+    """Assemble les consignes d'analyste et le texte du document"""
+    # Consignes pour le modèle
+    instructions = (
+        "Tu es analyste financier. On te fournit le texte d'un document financier "
+        "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
+        "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
+        "- **Société / Période / Devise** : (si repérable)\n"
+        "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
+        "- **Chiffres clés** (tableau) :\n"
+        " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
+        " |---|---:|---|---|---:|\n"
+        " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX, "
+        "Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
+        "- **Analyse** :\n"
+        " - Performance (croissance, marges, cash)\n"
+        " - Structure financière (dette, liquidité)\n"
+        " - Risques & incertitudes (marché, réglementation, change)\n"
+        " - Outlook / Guidance (si communiqué)\n"
+        "- **Références internes** : pages/sections à relire\n\n"
+        "Exigences :\n"
+        "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
+        "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
+        "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
+        "- Reste concis : 200–350 mots hors tableau."
+    )
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour les notes d'une section
+def build_section_messages(text):
+    """Assemble les consignes de prise de notes et le texte d'une section"""
+    instructions = (
+        "Tu es analyste financier. On te fournit une section (quelques pages) d'un document financier.\n"
+        "Relève en Markdown, sous forme de liste concise :\n"
+        "- les indicateurs chiffrés (indicateur, valeur, période, page) ;\n"
+        "- les faits marquants, risques et perspectives mentionnés.\n\n"
+        "Exigences :\n"
+        "- **N'invente aucun chiffre** et n'ajoute rien qui ne figure pas dans la section.\n"
+        "- Cite la **Page** d'origine (repère `=== [PAGE X] ===`).\n"
+        "- 200 mots maximum hors chiffres."
+    )
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": text}
+    ]
+
+
+# Construction des messages pour une question
+def build_question_messages(question, text):
+    """Assemble les consignes, la question et le texte du document"""
+    instructions = (
+        "Tu es analyste financier. On te donne un extrait de rapport financier. "
+        "Réponds uniquement à la question posée, sans inventer de données. "
+        "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
+        "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
+    )
+
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
+    ]
+
+
+# Appel instrumenté à OpenAI
+def chat(api_key, model, messages, max_tokens, call, metrics=None, json_output=False):
+    """Envoie les messages à OpenAI et retourne le contenu de la réponse"""
+    metrics = _metrics_or_discard(metrics)
+    client = _client(api_key)
+    # Mode JSON : la réponse est garantie être un objet JSON valide
+    extra = {"response_format": {"type": "json_object"}} if json_output else {}
+
+    # Appel à son tour dans la file ; les appels identiques simultanés partagent une seule requête
+    with metrics.stage("llm", call=call, model=model) as event:
+        def send():
+            raw = _create(
+                client,
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.1,
+                **extra
+            )
+            response = raw.parse()
+            return response.choices[0].message.content, openai_usage(response.usage), raw.headers
+
+        def request():
+            content, info = SCHEDULER.run(api_key, model, messages, send, call, max_tokens)
+            event.update(info)
+            return content
+
+        # Une requête par clé API : chaque clé paie et consomme son propre quota
+        key = request_key(BACKEND, model, messages, key=key_fingerprint(api_key), max_tokens=max_tokens,
+                          json_output=json_output)
+        content, event["coalesced"] = INFLIGHT.do(key, request)
+    return content
+
+
+# Appel instrumenté à OpenAI, réponse produite au fil de la génération
+def chat_stream(api_key, model, messages, max_tokens, call, metrics=None):
+    """Comme `chat`, mais produit les fragments de texte dès leur génération"""
+    metrics = _metrics_or_discard(metrics)
+    client = _client(api_key)
+
+    with metrics.stage("llm", call=call, model=model, stream=True) as event, \
+            SCHEDULER.reserve(api_key, model, messages, call, max_tokens) as reservation:
+        event["queue_s"] = round(reservation.queue_s, 4)
+        # Seule l'ouverture du flux est reprise : une fois commencé, il n'est pas rejoué
+        raw = call_with_retries(lambda: _create(
+            client,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.1,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        for chunk in raw.parse():
+            if chunk.usage:
+                usage = openai_usage(chunk.usage)
+                event.update(usage)
+                reservation.record(usage, raw.headers)
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    yield choice.delta.content
+
+
+# Fonction pour générer le résumé
+def generate_summary(text, api_key, model="gpt-4o-mini", metrics=None):
+    """Génère un résumé financier structuré"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="summary"):
+        messages = build_summary_messages(text)
+
+    return chat(api_key, model, messages, max_tokens=2000, call="summary", metrics=metrics)
+
+
+# Fonction pour produire les notes de lecture d'une section
+def summarize_section(text, api_key, model="gpt-4o-mini", metrics=None):
+    """Retourne les notes de lecture d'une section du document"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="section"):
+        messages = build_section_messages(text)
+
+    return chat(api_key, model, messages, max_tokens=800, call="section", metrics=metrics)
+
+
+# Fonction pour résumer un document par sections (réanalyse incrémentale)
+def generate_document_summary(analysis, text, api_key, model="gpt-4o-mini", metrics=None):
+    """Résume `text` par sections ; sur une nouvelle version, seules les sections modifiées repassent par le modèle"""
+    return analysis.summarize(
+        text,
+        summarize_section=lambda section: summarize_section(section, api_key, model, metrics=metrics),
+        summarize_document=lambda content: generate_summary(content, api_key, model, metrics=metrics),
+        variant=f"{BACKEND}|{model}",
+    )
+
+
+# Fonction pour répondre aux questions
+def answer_question(text, question, api_key, model="gpt-4o", metrics=None, call="question"):
+    """Répond à une question spécifique sur le contenu du PDF.
+
+    `call` étiquette l'appel dans l'instrumentation (« prefetch » pour le préchargement).
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call=call):
+        messages = build_question_messages(question, text)
+
+    return chat(api_key, model, messages, max_tokens=1000, call=call, metrics=metrics)
+
+
+# Fonction pour répondre aux questions, au fil de la génération
+def stream_answer(text, question, api_key, model="gpt-4o", metrics=None):
+    """Comme `answer_question`, en produisant la réponse par fragments"""
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="question"):
+        messages = build_question_messages(question, text)
+
+    yield from chat_stream(api_key, model, messages, max_tokens=1000, call="question", metrics=metrics)
+
+
+# Fonction pour répondre à plusieurs questions en un seul appel
+def answer_questions(text, questions, api_key, model="gpt-4o", metrics=None):
+    """Répond à une liste de questions avec une seule copie du document.
+
+    Retourne une liste de dictionnaires {question, answer, batched} ; les
+    questions restées sans réponse exploitable sont reposées une à une.
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="batch"):
+        messages = build_batch_messages(questions, text)
+
+    raw = chat(api_key, model, messages, max_tokens=batch_max_tokens(len(questions)),
+               call="batch", metrics=metrics, json_output=True)
+
+    results = []
+    for question, answer in zip(questions, parse_batch_answers(raw, len(questions))):
+        batched = answer is not None
+        if not batched:
+            answer = answer_question(text, question, api_key, model, metrics=metrics)
+        results.append({"question": question, "answer": answer, "batched": batched})
+    return results
+
+
+# Fonction pour extraire les chiffres clés d'un document du mode comparaison
+def extract_kpis(document, api_key, model="gpt-4o-mini", metrics=None):
+    """Chiffres clés d'un `ComparedDocument` ({indicateur: {value, period, page}}), extraits une fois par modèle"""
+    variant = f"{BACKEND}|{model}"
+    if variant not in document.kpis:
+        metrics = _metrics_or_discard(metrics)
+        with metrics.stage("prompt", call="kpis"):
+            messages = build_kpi_messages(kpi_context(document))
+
+        raw = chat(api_key, model, messages, max_tokens=800, call="kpis", metrics=metrics)
+        document.kpis[variant] = parse_kpi_table(raw)
+    return document.kpis[variant]
+
+
+# Fonction pour répondre à une question portant sur plusieurs documents
+def answer_comparison(question, documents, api_key, model="gpt-4o", max_chars=COMPARISON_CHARS, metrics=None):
+    """Répond à partir des pages de chaque document les plus pertinentes pour la question.
+
+    Les documents se partagent un budget commun de `max_chars` caractères.
+    Retourne le couple (réponse, numéros des pages retenues par document).
+    """
+    metrics = _metrics_or_discard(metrics)
+    with metrics.stage("prompt", call="comparison") as event:
+        selection = select_pages(documents, question, max_chars)
+        messages = build_comparison_messages(question, documents, selection)
+        event["pages"] = sum(len(numbers) for numbers in selection)
+
+    answer = chat(api_key, model, messages, max_tokens=1500, call="comparison", metrics=metrics)
+    return answer, selection
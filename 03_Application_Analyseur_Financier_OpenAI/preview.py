@@ -0,0 +1,158 @@
+"""Aperçu paresseux des pages du PDF et navigation depuis les citations.
+
+Seule la page affichée est rendue en PNG (`page.get_pixmap` à faible
+résolution). Les images sont conservées dans un cache LRU partagé par tout
+le processus, indexé par (empreinte du document, page, zoom) : revenir sur
+une page déjà vue, ou ouvrir le même rapport dans une autre session, ne
+coûte aucun rendu.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from spool import open_pdf, pdf_digest
+
+# Résolutions proposées (1.0 = 72 DPI)
+ZOOM_LEVELS = {"Vignette": 0.5, "Lecture": 1.0, "Détail": 1.5}
+
+# Clé de session de la page affichée par la visionneuse
+VIEWER_STATE_KEY = "viewer_page"
+
+# Références de page dans les réponses : "Page 12", "p. 12", "[PAGE 12]", "pages 3-5"
+PAGE_REF_RE = re.compile(
+    r"\b(?:pages?|p\.)\s*(\d{1,4})(?:\s*(?:-|–|à|et|,)\s*(\d{1,4}))?",
+    re.IGNORECASE,
+)
+
+
+def document_info(pdf_source):
+    """Retourne (empreinte stable du contenu, nombre de pages) d'un PDF en mémoire ou sur disque."""
+    with open_pdf(pdf_source) as pdf:
+        page_count = pdf.page_count
+    return pdf_digest(pdf_source), page_count
+
+
+class ThumbnailCache:
+    """Cache LRU des pages rendues, borné en octets."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            if key in self._items:
+                self._size -= len(self._items.pop(key))
+            self._items[key] = png
+            self._size += len(png)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"pages": len(self._items), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+# Cache unique pour le processus (partagé entre sessions Streamlit)
+THUMBNAILS = ThumbnailCache()
+
+
+def render_page_png(pdf_source, doc_hash, page_number, zoom=ZOOM_LEVELS["Lecture"], cache=THUMBNAILS):
+    """Retourne le PNG d'une page (numérotée à partir de 1), rendu à la demande."""
+    key = (doc_hash, page_number, zoom)
+    png = cache.get(key)
+    if png is None:
+        import fitz  # PyMuPDF
+
+        with open_pdf(pdf_source) as pdf:
+            page = pdf[page_number - 1]
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            png = pix.tobytes("png")
+        cache.put(key, png)
+    return png
+
+
+def cited_pages(markdown, page_count):
+    """Pages citées dans un texte (références explicites et colonne « Page » des tableaux)."""
+    pages = set()
+    for match in PAGE_REF_RE.finditer(markdown or ""):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if last < first or last - first > 20:
+            last = first
+        pages.update(range(first, last + 1))
+
+    # Tableaux Markdown dont une colonne s'intitule « Page »
+    page_column = None
+    for line in (markdown or "").splitlines():
+        cells = [c.strip() for c in line.strip().strip("|").split("|")]
+        if len(cells) < 2:
+            page_column = None
+            continue
+        lowered = [c.lower() for c in cells]
+        if "page" in lowered:
+            page_column = lowered.index("page")
+        elif page_column is not None and page_column < len(cells):
+            pages.update(int(n) for n in re.findall(r"\d{1,4}", cells[page_column]))
+
+    return sorted(p for p in pages if 1 <= p <= page_count)
+
+
+def render_citation_links(markdown, page_count, key, label="📎 Pages citées :"):
+    """Boutons « p. X » qui positionnent la visionneuse sur la page citée."""
+    import streamlit as st
+
+    pages = cited_pages(markdown, page_count)
+    if not pages:
+        return
+
+    def jump(page):
+        st.session_state[VIEWER_STATE_KEY] = page
+
+    st.caption(label)
+    columns = st.columns(min(len(pages), 8))
+    for i, page in enumerate(pages):
+        with columns[i % len(columns)]:
+            st.button(f"p. {page}", key=f"{key}_cite_{page}", on_click=jump, args=(page,))
+
+
+def render_page_viewer(pdf_source, doc_hash, page_count):
+    """Visionneuse d'une page à la fois, positionnable depuis les citations."""
+    import streamlit as st
+
+    if st.session_state.get(VIEWER_STATE_KEY, 1) > page_count:
+        st.session_state[VIEWER_STATE_KEY] = 1
+
+    def step(delta):
+        current = st.session_state.get(VIEWER_STATE_KEY, 1)
+        st.session_state[VIEWER_STATE_KEY] = min(max(1, current + delta), page_count)
+
+    col_prev, col_page, col_next, col_zoom = st.columns([1, 2, 1, 2])
+    with col_prev:
+        st.button("◀", key="viewer_prev", on_click=step, args=(-1,))
+    with col_page:
+        page_number = st.number_input(
+            f"Page (sur {page_count})", min_value=1, max_value=page_count, step=1, key=VIEWER_STATE_KEY
+        )
+    with col_next:
+        st.button("▶", key="viewer_next", on_click=step, args=(1,))
+    with col_zoom:
+        zoom_label = st.selectbox("Résolution", list(ZOOM_LEVELS), index=1, key="viewer_zoom")
+
+    png = render_page_png(pdf_source, doc_hash, int(page_number), ZOOM_LEVELS[zoom_label])
+    st.image(png, caption=f"Page {int(page_number)}")
@@ -0,0 +1,311 @@
+"""Profilage à la demande d'une analyse.
+
+Lorsqu'un rapport est anormalement lent à analyser, une exécution complète
+(extraction du PDF, construction du prompt, appel au client LLM) peut être
+profilée, au choix :
+
+- `cprofile` : profil déterministe de toutes les fonctions Python
+  (surcoût important sur le code pur Python, durées relatives fiables) ;
+- `sampling` : échantillonnage de la pile du thread de l'analyse toutes les
+  `SAMPLE_INTERVAL_S` secondes (surcoût négligeable ; le temps passé dans du
+  code natif qui garde le GIL est attribué à l'appel Python qui l'a lancé).
+  Faute de GIL, l'échantillonneur se réveille souvent bien plus tard que
+  prévu : chaque pile relevée est créditée du temps réellement écoulé
+  depuis le relevé précédent, pas de l'intervalle théorique.
+
+Le profil produit deux fichiers, nommés d'après le backend et l'empreinte du
+document : statistiques `pstats` (`python -m pstats`, snakeviz…) et piles
+repliées (`flamegraph.pl`, speedscope…). Dans l'interface, le profilage est
+activé depuis la sidebar ; pour les exécutions sans interface (service),
+`ANALYSIS_PROFILE=cprofile|sampling` profile chaque appel et écrit les fichiers
+dans `ANALYSIS_PROFILE_DIR`.
+"""
+import cProfile
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILERS = {"cprofile": "cProfile (déterministe)", "sampling": "Échantillonnage"}
+
+# Profileur des exécutions sans interface (et choix par défaut de la sidebar)
+DEFAULT_PROFILER = os.getenv("ANALYSIS_PROFILE", "").strip().lower() or None
+if DEFAULT_PROFILER not in PROFILERS:
+    DEFAULT_PROFILER = None
+
+PROFILE_DIR = os.getenv("ANALYSIS_PROFILE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+SAMPLE_INTERVAL_S = 0.005
+
+# Branches de moins de 0,1 % du temps total omises des piles reconstruites depuis cProfile
+MIN_BRANCH_FRACTION = 0.001
+
+# cProfile ne peut être actif que dans un thread à la fois (Python 3.12+) :
+# une analyse profilée en parallèle bascule sur l'échantillonnage
+_cprofile_lock = threading.Lock()
+_DISABLE = ("~", 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # fonction native, ex. "<method 'read' of '_io.BufferedReader' objects>"
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class _Sampler:
+    """Relève périodiquement la pile d'un thread."""
+
+    def __init__(self, thread_id, base_frame, interval=SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id
+        self.base_frame = base_frame     # cadre du bloc profilé : les cadres appelants ne sont pas relevés
+        self.interval = interval
+        self.samples = Counter()         # pile (racine -> feuille) -> nombre d'échantillons
+        self.seconds = Counter()         # pile -> temps écoulé crédité (s)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analysis-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                if frame is self.base_frame:
+                    break
+                frame = frame.f_back
+            del frame
+            if stack and not self._stop.is_set():
+                stack = tuple(reversed(stack))
+                self.samples[stack] += 1
+                self.seconds[stack] += elapsed
+
+
+class ProfileRun:
+    """Profil d'une analyse, à utiliser comme gestionnaire de contexte.
+
+    Le même profil peut couvrir plusieurs blocs successifs (extraction à
+    l'import, résumé au clic suivant) : les mesures s'additionnent. Les
+    exports (statistiques, piles repliées, aperçu) sont calculés une fois
+    par état du profil, pas à chaque réaffichage.
+    """
+
+    def __init__(self, mode, backend, doc_hash=""):
+        if mode not in PROFILERS:
+            raise ValueError(f"Profileur inconnu : {mode}")
+        self.mode = mode
+        self.backend = backend
+        self.doc_hash = doc_hash
+        self.started = time.time()
+        self.duration_s = 0.0
+        self._profiler = None
+        self._samples = Counter()
+        self._seconds = Counter()
+        self._cache = {}          # exports calculés depuis la fin du dernier bloc profilé
+        self._sampler = None
+        self._profiling = False
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            if _cprofile_lock.acquire(blocking=False):
+                self._profiler = self._profiler or cProfile.Profile()
+                self._profiler.enable()
+                self._profiling = True
+                return self
+            if self._profiler is not None:
+                return self   # bloc non profilé : cProfile déjà actif ailleurs
+            self.mode = "sampling"
+        self._sampler = _Sampler(threading.get_ident(), sys._getframe(1))
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._samples.update(self._sampler.samples)
+            self._seconds.update(self._sampler.seconds)
+            self._sampler = None
+        elif self._profiling:
+            self._profiler.disable()
+            self._profiling = False
+            _cprofile_lock.release()
+        self.duration_s += time.perf_counter() - self._start
+        self._cache.clear()
+        return False
+
+    def _cached(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def name(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started)) + f"-{int(self.started * 1000) % 1000:03d}"
+        return f"profil_{self.backend}_{(self.doc_hash or 'document')[:12]}_{stamp}"
+
+    def stats(self):
+        """Statistiques au format `pstats` : {fonction: (appels primitifs, appels, temps propre, temps cumulé, appelants)}."""
+        return self._cached("stats", self._compute_stats)
+
+    def _compute_stats(self):
+        if self._profiler is not None:
+            self._profiler.create_stats()
+            # Sans les appels du profileur lui-même (sortie du bloc, arrêt de cProfile)
+            return {func: entry for func, entry in self._profiler.stats.items()
+                    if func[0] != __file__ and func != _DISABLE}
+        # Échantillonnage : les « appels » sont des nombres d'échantillons
+        stats = {}
+        for stack, count in self._samples.items():
+            elapsed = self._seconds[stack]
+            seen = set()
+            for depth, func in enumerate(stack):
+                cc, nc, tt, ct, callers = stats.get(func, (0, 0, 0.0, 0.0, {}))
+                leaf = depth == len(stack) - 1
+                if func not in seen:
+                    cc, nc, ct = cc + count, nc + count, ct + elapsed
+                    if depth:
+                        ecc, enc, ett, ect = callers.get(stack[depth - 1], (0, 0, 0.0, 0.0))
+                        callers[stack[depth - 1]] = (ecc + count, enc + count,
+                                                     ett + (elapsed if leaf else 0.0), ect + elapsed)
+                    seen.add(func)
+                stats[func] = (cc, nc, tt + (elapsed if leaf else 0.0), ct, callers)
+        return stats
+
+    def pstats_bytes(self):
+        """Contenu d'un fichier `.pstats`, lisible par `pstats.Stats(chemin)`."""
+        return self._cached("pstats", lambda: marshal.dumps(self.stats()))
+
+    def collapsed(self):
+        """Piles repliées (`racine;…;feuille valeur`), pour flamegraph.pl ou speedscope.
+
+        Valeurs en microsecondes : temps écoulé crédité à chaque pile pour
+        l'échantillonnage ; pour cProfile, piles reconstruites depuis le
+        graphe d'appels, le temps de chaque fonction étant réparti entre ses
+        appelants au prorata.
+        """
+        return self._cached("collapsed", self._compute_collapsed)
+
+    def _compute_collapsed(self):
+        if self._profiler is None:
+            lines = (";".join(_label(f) for f in stack) + f" {round(seconds * 1e6)}"
+                     for stack, seconds in self._seconds.items() if round(seconds * 1e6))
+            return "\n".join(sorted(lines)) + "\n"
+        return _collapse_call_graph(self.stats())
+
+    def top(self, limit=15):
+        """Fonctions les plus coûteuses (temps cumulé), pour un aperçu dans l'interface."""
+        return self._cached(("top", limit), lambda: self._compute_top(limit))
+
+    def _compute_top(self, limit):
+        stats = self.stats()
+        ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [
+            {"Fonction": _label(func), "Appels": nc, "Temps propre (s)": round(tt, 4), "Temps cumulé (s)": round(ct, 4)}
+            for func, (cc, nc, tt, ct, callers) in ranked
+        ]
+
+    def metadata(self):
+        return {
+            "name": self.name, "mode": self.mode, "backend": self.backend, "doc_hash": self.doc_hash,
+            "started": self.started, "duration_s": self.duration_s,
+        }
+
+    def save(self, directory=PROFILE_DIR):
+        """Écrit le profil (`.pstats`, `.collapsed`, `.json`) dans `directory` ; retourne le chemin sans extension."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.name)
+        suffix = 1
+        while os.path.exists(base + ".pstats"):
+            suffix += 1
+            base = os.path.join(directory, f"{self.name}-{suffix}")
+        with open(base + ".pstats", "wb") as out:
+            out.write(self.pstats_bytes())
+        with open(base + ".collapsed", "w", encoding="utf-8") as out:
+            out.write(self.collapsed())
+        with open(base + ".json", "w", encoding="utf-8") as out:
+            json.dump(self.metadata(), out, indent=2)
+        return base
+
+
+def _collapse_call_graph(stats):
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, entry in stats.items() if not any(caller in stats for caller in entry[4])]
+    total = sum(stats[func][3] for func in roots) or 1.0
+    lines = Counter()
+
+    def walk(func, path, weight):
+        cc, nc, tt, ct, callers = stats[func]
+        scale = weight / ct if ct else 0.0
+        path = path + (func,)
+        if tt * scale:
+            lines[path] += tt * scale
+        for callee, edge_ct in callees.get(func, ()):
+            child = edge_ct * scale
+            if callee not in path and child >= total * MIN_BRANCH_FRACTION:
+                walk(callee, path, child)
+
+    for root in roots:
+        walk(root, (), stats[root][3])
+    return "".join(
+        ";".join(_label(f) for f in path) + f" {round(seconds * 1e6)}\n"
+        for path, seconds in sorted(lines.items()) if round(seconds * 1e6)
+    )
+
+
+def profiled(fn, backend, doc_hash="", mode=DEFAULT_PROFILER, directory=PROFILE_DIR):
+    """Enveloppe `fn` pour profiler chacun de ses appels (sans effet si `mode` est None)."""
+    if mode is None:
+        return fn
+
+    def run(*args, **kwargs):
+        profile = ProfileRun(mode, backend, doc_hash)
+        try:
+            with profile:
+                return fn(*args, **kwargs)
+        finally:
+            profile.save(directory)
+
+    return run
+
+
+def render_profile_panel(profile, key):
+    """Affiche l'aperçu du dernier profil et ses téléchargements dans la sidebar Streamlit."""
+    import streamlit as st
+
+    with st.sidebar.expander("🔬 Profil de la dernière analyse", expanded=False):
+        st.caption(f"{PROFILERS[profile.mode]} · {profile.backend} · document {profile.doc_hash[:12] or '—'} · "
+                   f"{profile.duration_s:.2f} s profilées")
+        st.dataframe(profile.top(), hide_index=True, use_container_width=True)
+        st.download_button(
+            "📥 Statistiques pstats",
+            data=profile.pstats_bytes(),
+            file_name=profile.name + ".pstats",
+            mime="application/octet-stream",
+            key=f"{key}_pstats",
+        )
+        st.download_button(
+            "📥 Piles repliées (flamegraph)",
+            data=profile.collapsed(),
+            file_name=profile.name + ".collapsed",
+            mime="text/plain",
+            key=f"{key}_collapsed",
+        )
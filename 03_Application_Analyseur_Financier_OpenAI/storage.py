@@ -0,0 +1,260 @@
+"""Stockage compressé des textes conservés en session.
+
+Chaque session garde le texte de son document (jusqu'à 200 000 caractères),
+ses pages, la version précédente et l'historique des échanges. Conservés en
+chaînes Python, ces textes font grimper la mémoire du serveur avec le nombre
+d'analystes connectés. Ils sont donc stockés compressés (zstd si le paquet
+`zstandard` est installé, zlib sinon) :
+
+- `CompressedText` conserve un texte compressé et ne le décompresse qu'à la
+  lecture ; `FilteredText` en dérive un texte privé de quelques lignes (en-têtes
+  et pieds de page) sans le stocker une seconde fois ;
+- les textes décompressés passent par un cache LRU commun au processus,
+  borné en octets : les pages et le texte d'un document en cours d'analyse
+  restent disponibles sans décompression à chaque prompt ;
+- `session_memory` mesure ce qu'occupe chaque entrée de l'état d'une session.
+"""
+import itertools
+import sys
+import threading
+import types
+import zlib
+from collections import OrderedDict, deque
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+CODEC = "zstd" if zstandard is not None else "zlib"
+
+# Niveaux de compression : bon ratio sur du texte, compression en quelques ms par document
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+
+# Mémoire maximale des textes décompressés gardés en cache (tout le processus)
+CACHE_BYTES = 32 * 1024 * 1024
+
+# Profondeur maximale du parcours des objets pour la mesure mémoire d'une session
+MAX_DEPTH = 12
+
+_ids = itertools.count()
+_local = threading.local()
+
+
+def _zstd():
+    # Les contextes zstd ne sont pas partageables entre threads
+    if not hasattr(_local, "zstd"):
+        _local.zstd = (zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor())
+    return _local.zstd
+
+
+def compress(text):
+    data = text.encode("utf-8")
+    if CODEC == "zstd":
+        return _zstd()[0].compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(blob, codec=CODEC):
+    # `codec` : format du blob lorsqu'il a été compressé ailleurs (archive)
+    data = _zstd()[1].decompress(blob) if codec == "zstd" else zlib.decompress(blob)
+    return data.decode("utf-8")
+
+
+class TextCache:
+    """Cache LRU des textes décompressés, borné en octets."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._items.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            if key in self._items:
+                self._size -= sys.getsizeof(self._items.pop(key))
+            self._items[key] = text
+            self._size += sys.getsizeof(text)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= sys.getsizeof(evicted)
+
+    def discard(self, key):
+        with self._lock:
+            text = self._items.pop(key, None)
+            if text is not None:
+                self._size -= sys.getsizeof(text)
+
+    def stats(self):
+        with self._lock:
+            return {"texts": len(self._items), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+# Cache unique pour le processus (partagé entre sessions Streamlit)
+TEXTS = TextCache()
+
+
+class CompressedText:
+    """Texte conservé compressé ; `get()` le restitue en passant par le cache."""
+
+    __slots__ = ("blob", "length", "_key", "_cache", "__weakref__")
+
+    def __init__(self, text, cache=TEXTS):
+        self.blob = compress(text)
+        self.length = len(text)
+        self._key = next(_ids)
+        self._cache = cache
+        # Le texte vient d'être produit : il sera probablement relu tout de suite
+        cache.put(self._key, text)
+
+    @classmethod
+    def from_blob(cls, blob, length, cache=TEXTS):
+        """Texte déjà compressé (archive) : rien n'est décompressé avant la première lecture."""
+        stored = cls.__new__(cls)
+        stored.blob = blob
+        stored.length = length
+        stored._key = next(_ids)
+        stored._cache = cache
+        return stored
+
+    def get(self):
+        text = self._cache.get(self._key)
+        if text is None:
+            text = decompress(self.blob)
+            self._cache.put(self._key, text)
+        return text
+
+    def __len__(self):
+        return self.length
+
+    def __del__(self):
+        # Ne pas garder en cache le texte d'un document oublié
+        try:
+            self._cache.discard(self._key)
+        except Exception:
+            pass
+
+
+class FilteredText:
+    """Texte d'un `CompressedText` privé de certaines lignes, recalculé à la lecture plutôt que stocké."""
+
+    __slots__ = ("source", "dropped", "length", "_key", "_cache", "__weakref__")
+
+    def __init__(self, source, dropped, cache=TEXTS):
+        # dropped : indices (dans `splitlines()`) des lignes retirées du texte source
+        self.source = source
+        self.dropped = tuple(dropped)
+        self._key = next(_ids)
+        self._cache = cache
+        self.length = len(self.get())
+
+    def get(self):
+        text = self._cache.get(self._key)
+        if text is None:
+            skip = set(self.dropped)
+            text = "\n".join(line for i, line in enumerate(self.source.get().splitlines()) if i not in skip)
+            self._cache.put(self._key, text)
+        return text
+
+    def __len__(self):
+        return self.length
+
+    def __del__(self):
+        try:
+            self._cache.discard(self._key)
+        except Exception:
+            pass
+
+
+# Code et classes : partagés par toutes les sessions, jamais comptés
+_SKIPPED = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+
+
+def deep_size(obj, seen=None, depth=0):
+    """Mémoire occupée par `obj` et les objets qu'il référence (octets, chaque objet compté une fois).
+
+    Les textes compressés sont comptés pour leur seule version compressée :
+    la version décompressée appartient au cache partagé.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > MAX_DEPTH or isinstance(obj, _SKIPPED):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, CompressedText):
+        return sys.getsizeof(obj) + sys.getsizeof(obj.blob)
+    if isinstance(obj, FilteredText):
+        return sys.getsizeof(obj) + sys.getsizeof(obj.dropped) + deep_size(obj.source, seen, depth + 1)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, memoryview, int, float)):
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen, depth + 1) + deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        for item in obj:
+            size += deep_size(item, seen, depth + 1)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen, depth + 1)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if slot != "__weakref__" and hasattr(obj, slot):
+            size += deep_size(getattr(obj, slot), seen, depth + 1)
+    return size
+
+
+def session_memory(state):
+    """Mémoire de chaque entrée de l'état de session, de la plus lourde à la plus légère.
+
+    Un objet partagé par plusieurs entrées n'est compté qu'une fois, pour la
+    première qui le référence.
+    """
+    seen = set()
+    rows = []
+    for key in sorted(state.keys(), key=str):
+        try:
+            value = state[key]
+        except KeyError:
+            continue
+        rows.append({"Entrée": str(key), "Type": type(value).__name__, "Octets": deep_size(value, seen)})
+    return sorted(rows, key=lambda row: -row["Octets"])
+
+
+def format_size(size):
+    if size >= 1024 ** 2:
+        return f"{size / 1024 ** 2:.1f} Mo"
+    return f"{size / 1024:.0f} Ko"
+
+
+def render_session_memory(state, cache=TEXTS):
+    """Affiche dans la sidebar la mémoire occupée par la session et l'état du cache des textes"""
+    import streamlit as st
+
+    rows = session_memory(state)
+    total = sum(row["Octets"] for row in rows)
+    with st.sidebar.expander(f"🧮 Mémoire de la session : {format_size(total)}"):
+        st.dataframe(
+            [{**row, "Octets": format_size(row["Octets"])} for row in rows if row["Octets"]],
+            hide_index=True,
+        )
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "-"
+        st.caption(
+            f"Textes stockés compressés ({CODEC}). Cache partagé des textes décompressés : "
+            f"{stats['texts']} texte(s), {format_size(stats['bytes'])} sur {format_size(cache.max_bytes)}, "
+            f"taux de succès {hit_rate}."
+        )
@@ -0,0 +1,447 @@
+"""Test de charge des applications Streamlit : analystes simultanés sur une instance.
+
+Chaque application est lancée avec `streamlit run` (un seul processus, comme
+en production) face au serveur LLM factice de `stub_llm.py`. Pour chaque
+niveau de `--users`, autant de sessions sans navigateur se connectent en même
+temps au websocket de Streamlit et rejouent le parcours d'un analyste :
+ouverture de la page, import d'un rapport PDF, analyse, puis `--questions`
+questions. Pour chaque niveau :
+
+- latences p50 / p95 / p99 de chaque étape (`ouverture`, `import`, `analyse`,
+  `saisie`, `question`), de l'envoi de l'interaction à la fin de l'exécution
+  du script (reruns déclenchés par `st.rerun` compris) ;
+- débit : interactions terminées par seconde ;
+- mémoire du processus Streamlit : RSS avant les sessions, pointe, après ;
+- erreurs (exceptions affichées par l'application, délais dépassés) et
+  appels reçus par le LLM factice.
+
+Chaque niveau démarre une instance neuve, préchauffée par une première
+session non mesurée.
+
+    python benchmarks/app_load_test.py --users 1 4 8 16
+    python benchmarks/app_load_test.py --backends ollama --users 1 8 32 --latency 1.5 --decode-tps 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from apps import APP_DIRS, STUB_API_KEY
+from run_benchmark import _git_commit
+from stub_llm import add_stub_arguments, config_from_args, start_stub_server, stub_environment
+from synthetic_pdf import ensure_reports
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# Parcours de chaque application : libellés des widgets à actionner
+SCENARIOS = {
+    "ollama": {
+        "upload": "Choisissez un fichier PDF financier",
+        "analyze": "🔍 Analyser le Document",
+        "question": ("text_input", "Posez votre question"),
+        "ask": "❓ Poser",
+    },
+    "openrouter": {
+        "upload": "Choisissez votre document PDF financier",
+        "analyze": "🚀 Générer le Résumé Financier",
+        "question": ("chat_input", "Posez votre question..."),
+        "ask": None,
+    },
+    "openai": {
+        "upload": "Choisissez votre document financier (PDF)",
+        "analyze": "🚀 Analyser le document",
+        "question": ("text_input", "Posez votre question sur le document :"),
+        "ask": "🔍 Rechercher la réponse",
+    },
+}
+
+STEPS = ["ouverture", "import", "analyse", "saisie", "question"]
+
+RSS_INTERVAL_S = 0.1
+
+
+class SessionError(Exception):
+    pass
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+    """Mémoire résidente d'un processus (Linux, /proc) ; None ailleurs."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RssSampler:
+    """Relève la mémoire résidente d'un processus pendant un niveau de charge."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_mb = _rss_mb(pid)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_INTERVAL_S):
+            rss = _rss_mb(self.pid)
+            if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+                self.peak_mb = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def start_app(backend, env, log_file):
+    """Lance `streamlit run` pour une application et attend qu'elle réponde."""
+    import httpx
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", "app.py",
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--server.enableXsrfProtection", "false",
+            "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false",
+        ],
+        cwd=APP_DIRS[backend], env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit run s'est arrêté (code {process.returncode}), voir {log_file.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).status_code == 200:
+                return process, port
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"streamlit run ne répond pas, voir {log_file.name}")
+
+
+class AppSession:
+    """Session sans navigateur parlant le protocole websocket de Streamlit (protobuf BackMsg / ForwardMsg)."""
+
+    def __init__(self, port, timeout):
+        self.port = port
+        self.timeout = timeout
+        self.session_id = None
+        self.widgets = {}        # (type, libellé) -> identifiant du widget, pour l'exécution en cours
+        self.exceptions = []
+        self._states = {}        # identifiant -> WidgetState renvoyé à chaque rerun (valeurs conservées)
+        self._ws = None
+
+    async def __aenter__(self):
+        import websockets
+
+        self._ws = await websockets.connect(
+            f"ws://127.0.0.1:{self.port}/_stcore/stream", subprotocols=["streamlit"], max_size=None
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._ws.close()
+        return False
+
+    async def _receive(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = ForwardMsg()
+        msg.ParseFromString(await self._ws.recv())
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            # Début d'une exécution du script : la page est reconstruite
+            self.session_id = msg.new_session.initialize.session_id or self.session_id
+            self.widgets = {}
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            element = msg.delta.new_element
+            element_type = element.WhichOneof("type")
+            proto = getattr(element, element_type)
+            if element_type == "exception":
+                self.exceptions.append(proto.message)
+            elif getattr(proto, "id", ""):
+                label = getattr(proto, "label", "") or getattr(proto, "placeholder", "")
+                self.widgets[(element_type, label)] = proto.id
+        return msg
+
+    async def _until(self, predicate):
+        """Traite les messages du serveur jusqu'au premier qui vérifie `predicate` (au plus `timeout` secondes)."""
+        async def wait():
+            while True:
+                msg = await self._receive()
+                if predicate(msg):
+                    return msg
+        return await asyncio.wait_for(wait(), self.timeout)
+
+    async def run(self, *triggers):
+        """Relance le script (valeurs des widgets + déclencheurs) et attend la fin de l'exécution ; retourne sa durée."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        back_msg = BackMsg()
+        back_msg.rerun_script.SetInParent()
+        for state in [*self._states.values(), *triggers]:
+            back_msg.rerun_script.widget_states.widgets.add().CopyFrom(state)
+        exceptions = len(self.exceptions)
+        start = time.perf_counter()
+        await self._ws.send(back_msg.SerializeToString())
+        await self._until(lambda msg: msg.WhichOneof("type") == "script_finished"
+                          and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN)
+        elapsed = time.perf_counter() - start
+        if len(self.exceptions) > exceptions:
+            raise SessionError(self.exceptions[-1].splitlines()[0] if self.exceptions[-1] else "exception")
+        return elapsed
+
+    def widget_id(self, element_type, label):
+        try:
+            return self.widgets[(element_type, label)]
+        except KeyError:
+            raise SessionError(f"widget absent : {element_type} « {label} »") from None
+
+    async def upload(self, label, filename, content):
+        """Envoie un fichier comme le navigateur (URL d'import, PUT multipart) et le sélectionne dans `label`."""
+        import httpx
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id = self.widget_id("file_uploader", label)
+        request = BackMsg()
+        request.file_urls_request.request_id = uuid.uuid4().hex
+        request.file_urls_request.session_id = self.session_id
+        request.file_urls_request.file_names.append(filename)
+        start = time.perf_counter()
+        await self._ws.send(request.SerializeToString())
+        msg = await self._until(lambda msg: msg.WhichOneof("type") == "file_urls_response")
+        if msg.file_urls_response.error_msg:
+            raise SessionError(msg.file_urls_response.error_msg)
+        urls = msg.file_urls_response.file_urls[0]
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.port}", timeout=self.timeout) as client:
+            response = await client.put(urls.upload_url, files={"file": (filename, content, "application/pdf")})
+            response.raise_for_status()
+
+        state = WidgetState(id=widget_id)
+        info = state.file_uploader_state_value.uploaded_file_info.add()
+        info.name, info.size, info.file_id = filename, len(content), urls.file_id
+        info.file_urls.CopyFrom(urls)
+        self._states[widget_id] = state
+        return time.perf_counter() - start + await self.run()
+
+    async def click(self, label):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        return await self.run(WidgetState(id=self.widget_id("button", label), trigger_value=True))
+
+    async def type_text(self, label, text):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id = self.widget_id("text_input", label)
+        self._states[widget_id] = WidgetState(id=widget_id, string_value=text)
+        return await self.run()
+
+    async def chat(self, label, text):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=self.widget_id("chat_input", label))
+        if "chat_input_value" in WidgetState.DESCRIPTOR.fields_by_name:
+            state.chat_input_value.data = text
+        else:  # Streamlit < 1.50
+            state.string_trigger_value.data = text
+        return await self.run(state)
+
+
+async def analyst(port, backend, user, document, args, timings, errors):
+    """Parcours complet d'un analyste ; chaque étape ajoute sa durée à `timings[étape]`."""
+    scenario = SCENARIOS[backend]
+    try:
+        async with AppSession(port, args.timeout) as session:
+            timings["ouverture"].append(await session.run())
+            timings["import"].append(await session.upload(scenario["upload"], f"rapport_{user}.pdf", document))
+            await asyncio.sleep(args.think_time)
+            timings["analyse"].append(await session.click(scenario["analyze"]))
+            for i in range(args.questions):
+                await asyncio.sleep(args.think_time)
+                question = f"Quel est l'indicateur n°{i} du rapport ?"
+                if not args.same_questions:
+                    question += f" (analyste {user})"
+                element_type, label = scenario["question"]
+                if element_type == "chat_input":
+                    timings["question"].append(await session.chat(label, question))
+                else:
+                    timings["saisie"].append(await session.type_text(label, question))
+                    timings["question"].append(await session.click(scenario["ask"]))
+    except (SessionError, asyncio.TimeoutError, OSError) as e:
+        errors.append(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+    except Exception as e:  # websocket fermé, réponse HTTP en erreur...
+        errors.append(f"{type(e).__name__}: {e}")
+
+
+async def run_level(port, backend, users, documents, args):
+    timings = {step: [] for step in STEPS}
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        analyst(port, backend, user, documents[user % len(documents)], args, timings, errors)
+        for user in range(users)
+    ))
+    return timings, errors, time.perf_counter() - start
+
+
+def measure(backend, users, documents, stub, env, args, log_dir):
+    """Un niveau de charge sur une instance neuve de l'application."""
+    with open(Path(log_dir) / f"{backend}_{users}u.log", "w") as log_file:
+        process, port = start_app(backend, env, log_file)
+        try:
+            # Session de préchauffage : imports et caches de l'application hors mesure
+            warmup = argparse.Namespace(**{**vars(args), "questions": 0})
+            _, warmup_errors, _ = asyncio.run(run_level(port, backend, 1, documents, warmup))
+            rss_before = _rss_mb(process.pid)
+            requests_before = stub.request_count
+            with RssSampler(process.pid) as sampler:
+                timings, errors, elapsed = asyncio.run(run_level(port, backend, users, documents, args))
+            rss_after = _rss_mb(process.pid)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    actions = sum(len(values) for values in timings.values())
+    return {
+        "backend": backend,
+        "users": users,
+        "duration_s": elapsed,
+        "actions": actions,
+        "actions_per_s": actions / elapsed if elapsed else None,
+        "steps": {
+            step: {
+                "count": len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": max(values),
+            }
+            for step, values in timings.items() if values
+        },
+        "rss_before_mb": rss_before,
+        "rss_peak_mb": sampler.peak_mb,
+        "rss_after_mb": rss_after,
+        "rss_per_user_mb": (sampler.peak_mb - rss_before) / users if sampler.peak_mb and rss_before else None,
+        "llm_calls": stub.request_count - requests_before,
+        "errors": errors,
+        "warmup_errors": warmup_errors,
+    }
+
+
+def print_level(entry):
+    print(f"  {entry['users']:>3} analystes  {entry['actions_per_s']:.2f} interactions/s  "
+          f"RSS {entry['rss_before_mb'] or 0:.0f} → {entry['rss_peak_mb'] or 0:.0f} Mo  "
+          f"{entry['llm_calls']} appels LLM  {len(entry['errors'])} erreurs")
+    for step in STEPS:
+        stats = entry["steps"].get(step)
+        if stats:
+            print(f"      {step:<10} p50 {stats['p50']:>7.3f} s  p95 {stats['p95']:>7.3f} s  p99 {stats['p99']:>7.3f} s")
+    for error in sorted(set(entry["warmup_errors"] + entry["errors"]))[:5]:
+        print(f"      ⚠ {error}")
+
+
+def run(args):
+    stub_config = config_from_args(args)
+    stub = start_stub_server(stub_config)
+    env = dict(os.environ, **stub_environment(stub.base_url))
+    env.setdefault("OPENROUTER_API_KEY", STUB_API_KEY)
+    env.setdefault("OPENAI_API_KEY", STUB_API_KEY)
+    # Rapports distincts (graines différentes), répartis entre les analystes
+    documents = [
+        ensure_reports(args.cache_dir, [args.pages], seed)[args.pages].read_bytes()
+        for seed in range(args.documents)
+    ]
+
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            for backend in args.backends:
+                print(f"▶ {backend}", flush=True)
+                for users in args.users:
+                    results[f"{backend}/{users}u"] = entry = measure(backend, users, documents, stub, env, args, log_dir)
+                    print_level(entry)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+    import streamlit
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "pages": args.pages,
+            "documents": args.documents,
+            "questions": args.questions,
+            "think_time_s": args.think_time,
+            "same_questions": args.same_questions,
+            "stub": stub_config.to_dict(),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge des applications Streamlit (analystes simultanés)")
+    parser.add_argument("--backends", nargs="+", choices=sorted(APP_DIRS), default=sorted(APP_DIRS))
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 8, 16], help="Niveaux de concurrence (sessions simultanées)")
+    parser.add_argument("--questions", type=int, default=3, help="Questions posées par analyste")
+    parser.add_argument("--same-questions", action="store_true", help="Tous les analystes posent les mêmes questions")
+    parser.add_argument("--pages", type=int, default=20, help="Taille des rapports synthétiques")
+    parser.add_argument("--documents", type=int, default=4, help="Nombre de rapports distincts répartis entre les analystes")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause entre deux interactions d'un analyste (s)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Délai maximal d'une interaction (s)")
+    parser.add_argument("--cache-dir", default=str(BENCH_DIR / ".cache"), help="Dossier des PDF générés")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "app_load_latest.json"),
+                        help="Fichier JSON des résultats")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    current = run(args)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\nRésultats écrits dans {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Accès sans interface au pipeline de chacune des trois applications.
+
+Les dossiers d'application contiennent des modules de même nom
+(`pipeline`, `instrumentation`, ...). `load_pipeline` les importe depuis le
+bon dossier en purgeant ceux d'une autre application déjà chargés.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+APP_DIRS = {
+    "ollama": ROOT / "01_Application_Analyseur_Financier_OpenSource_Ollama",
+    "openrouter": ROOT / "02_Application_Analyseur_Financier_OpenSource_OpenRouter",
+    "openai": ROOT / "03_Application_Analyseur_Financier_OpenAI",
+}
+
+# Modèle utilisé par défaut pour chaque backend face au serveur factice
+DEFAULT_MODELS = {
+    "ollama": "llama3.1:8b",
+    "openrouter": "mistralai/mistral-7b-instruct",
+    "openai": "gpt-4o-mini",
+}
+
+STUB_API_KEY = "sk-stub-benchmark-0000000000000000"
+
+
+def _purge_app_modules():
+    app_dirs = [str(d) for d in APP_DIRS.values()]
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if any(path.startswith(d) for d in app_dirs):
+            del sys.modules[name]
+
+
+def load_pipeline(backend):
+    """Importe et retourne le module `pipeline` de l'application `backend`."""
+    app_dir = str(APP_DIRS[backend])
+    _purge_app_modules()
+    sys.path.insert(0, app_dir)
+    try:
+        return importlib.import_module("pipeline")
+    finally:
+        sys.path.remove(app_dir)
+
+
+class Backend:
+    """Adapte les signatures (différentes d'une application à l'autre) du pipeline."""
+
+    def __init__(self, name, model=None):
+        self.name = name
+        self.model = model or DEFAULT_MODELS[name]
+        self.pipeline = load_pipeline(name)
+        self.instrumentation = sys.modules["instrumentation"]
+
+    def new_metrics(self):
+        return self.instrumentation.PipelineMetrics(backend=self.name)
+
+    def extract(self, path, max_length=120000, metrics=None):
+        with open(path, "rb") as pdf_file:
+            text, _ = self.pipeline.extract_pdf_text(pdf_file, max_length, metrics=metrics)
+        return text
+
+    def summary(self, text, metrics=None):
+        if self.name == "ollama":
+            return self.pipeline.generate_summary(text, self.model, metrics=metrics)
+        return self.pipeline.generate_summary(text, STUB_API_KEY, self.model, metrics=metrics)
+
+    def question(self, question, text, metrics=None):
+        if self.name == "ollama":
+            return self.pipeline.answer_question(question, text, self.model, metrics=metrics)
+        if self.name == "openrouter":
+            return self.pipeline.answer_question(question, text, STUB_API_KEY, self.model, metrics=metrics)
+        return self.pipeline.answer_question(text, question, STUB_API_KEY, self.model, metrics=metrics)
+
+    def questions(self, questions, text, metrics=None):
+        if self.name == "ollama":
+            return self.pipeline.answer_questions(questions, text, self.model, metrics=metrics)
+        if self.name == "openrouter":
+            return self.pipeline.answer_questions(questions, text, STUB_API_KEY, self.model, metrics=metrics)
+        return self.pipeline.answer_questions(text, questions, STUB_API_KEY, self.model, metrics=metrics)
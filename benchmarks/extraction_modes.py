@@ -0,0 +1,144 @@
+"""Vitesse et volume de texte de chaque mode d'extraction.
+
+Pour chaque mode (`text`, `blocks`, `layout`, `numbers`) et chaque rapport
+(synthétiques, ou vrais rapports passés avec `--pdf`), mesure :
+
+- `pages_per_s` : pages extraites par seconde (médiane des répétitions),
+  empreintes et compression des pages comprises ;
+- `chars`, `tokens` : taille du texte envoyé au modèle et tokens estimés
+  (~4 caractères par token, comme le serveur factice) ;
+- `numbers_kept` : nombres présents dans le texte, rapportés à ceux du mode
+  `text` (un mode qui perd des chiffres perd des KPI) ;
+- `text_sha1` : empreinte du texte produit, pour voir quels modes donnent le
+  même texte.
+
+Les rapports synthétiques suivent l'ordre de lecture dans leur flux de
+contenu : `text`, `blocks` et `layout` y donnent le même texte. Le rapport
+de mise en page (colonnes entrelacées, tableaux réglés écrits colonne par
+colonne) est donc toujours mesuré, et la mesure échoue si ces modes n'y
+divergent pas.
+
+    python benchmarks/extraction_modes.py
+    python benchmarks/extraction_modes.py --pdf rapports/*.pdf --repeat 5
+"""
+import argparse
+import hashlib
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from apps import load_pipeline
+from run_benchmark import _git_commit
+from stub_llm import estimate_tokens
+from synthetic_pdf import ensure_layout_report, ensure_reports
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+# Modes qui réordonnent le texte : ils doivent différer sur le rapport de mise en page
+ORDERING_MODES = ("text", "blocks", "layout")
+
+
+def measure_mode(pipeline, pdf_bytes, mode, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analysis = pipeline.load_document(pdf_bytes, mode=mode)
+        durations.append(time.perf_counter() - start)
+    text, _ = analysis.text(sys.maxsize)
+    pages = len(analysis.pages)
+    median = statistics.median(durations)
+    return {
+        "pages": pages,
+        "extraction_s": median,
+        "pages_per_s": pages / median if median else None,
+        "chars": len(text),
+        "tokens": estimate_tokens(text),
+        "numbers": len(_NUMBER_RE.findall(text)),
+        "text_sha1": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+    }
+
+
+def check_modes_diverge(entries):
+    """Vérifie que les modes de `ORDERING_MODES` mesurés produisent des textes différents."""
+    digests = {mode: entries[mode]["text_sha1"] for mode in ORDERING_MODES if mode in entries}
+    if len(set(digests.values())) < len(digests):
+        raise SystemExit(f"Modes d'extraction identiques sur le rapport de mise en page : {digests}")
+
+
+def run(args):
+    pipeline = load_pipeline("ollama")  # extraction identique dans les trois applications
+    modes = args.modes or list(sys.modules["extraction"].MODES)
+    documents = {path.name: path for path in ensure_reports(args.cache_dir, args.sizes, args.seed).values()}
+    layout_report = ensure_layout_report(args.cache_dir, args.seed)
+    documents[layout_report.name] = layout_report
+    documents.update({Path(path).name: Path(path) for path in args.pdf})
+
+    results = {}
+    for name, path in documents.items():
+        pdf_bytes = path.read_bytes()
+        pipeline.load_document(pdf_bytes)  # chargement de PyMuPDF hors mesure
+        print(f"▶ {name}", flush=True)
+        entries = {mode: measure_mode(pipeline, pdf_bytes, mode, args.repeat) for mode in modes}
+        reference = entries.get("text", {}).get("numbers")
+        for mode, entry in entries.items():
+            entry["numbers_kept"] = entry["numbers"] / reference if reference else None
+            results[f"{name}/{mode}"] = {"document": name, "mode": mode, **entry}
+        if path == layout_report:
+            check_modes_diverge(entries)
+
+    import fitz
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def print_table(current):
+    results = current["results"]
+    print(f"\n{'document':<34}{'mode':<10}{'pages/s':>10}{'tokens':>10}{'tokens/page':>13}{'chiffres':>10}"
+          f"{'texte':>10}")
+    for entry in results.values():
+        kept = f"{entry['numbers_kept']:.0%}" if entry["numbers_kept"] is not None else "—"
+        reference = results.get(f"{entry['document']}/text")
+        same = "—" if reference is None or entry["mode"] == "text" else (
+            "= text" if entry["text_sha1"] == reference["text_sha1"] else "différent")
+        print(f"{entry['document']:<34}{entry['mode']:<10}{entry['pages_per_s']:>10.1f}{entry['tokens']:>10}"
+              f"{entry['tokens'] / entry['pages']:>13.1f}{kept:>10}{same:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vitesse et volume de texte des modes d'extraction")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100], help="Tailles des rapports synthétiques (pages)")
+    parser.add_argument("--pdf", nargs="*", default=[], help="Rapports réels à mesurer en plus")
+    parser.add_argument("--modes", nargs="*", help="Modes mesurés (tous par défaut)")
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure")
+    parser.add_argument("--seed", type=int, default=0, help="Graine des rapports synthétiques")
+    parser.add_argument("--cache-dir", default=str(BENCH_DIR / ".cache"), help="Dossier des PDF générés")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "extraction_latest.json"),
+                        help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    current = run(args)
+    print_table(current)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\nRésultats écrits dans {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Benchmark reproductible du pipeline d'extraction et des appels LLM.
+
+Pour chaque backend (Ollama, OpenRouter, OpenAI) et chaque taille de
+rapport synthétique, mesure :
+
+- le temps d'extraction du texte et la mémoire de pointe (processus dédié) ;
+- la latence de bout en bout d'un résumé (extraction + prompt + LLM) ;
+- la latence des questions / réponses, posées une à une puis en un seul
+  appel groupé (avec les tokens de prompt consommés dans chaque cas).
+
+Les LLM sont remplacés par le serveur factice de `stub_llm.py` : aucun appel
+réseau externe, aucune clé API nécessaire. Les résultats sont écrits en JSON
+et peuvent être comparés à une référence :
+
+    python benchmarks/run_benchmark.py --output benchmarks/results/baseline.json
+    python benchmarks/run_benchmark.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from apps import APP_DIRS, ROOT, Backend
+from stub_llm import add_stub_arguments, config_from_args, start_stub_server, stub_environment
+from synthetic_pdf import ensure_reports
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+QUESTIONS = [
+    "Quel est le chiffre d'affaires ?",
+    "Quelle est la dette nette ?",
+    "Quels sont les principaux risques identifiés ?",
+]
+
+# Métriques comparées à la référence (plus petit = meilleur)
+COMPARED_METRICS = [
+    "extraction_s",
+    "extraction_peak_rss_mb",
+    "summary_e2e_s",
+    "question_s",
+    "batch_s",
+]
+
+
+def _maxrss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sur macOS, en kilo-octets ailleurs
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _distribution(values):
+    values = sorted(values)
+    return {
+        "median": statistics.median(values),
+        "min": values[0],
+        "max": values[-1],
+        "p95": values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+    }
+
+
+def _measure_extraction(backend, path, repeat, max_length, queue):
+    """Exécuté dans un processus neuf pour isoler la mémoire de pointe."""
+    runner = Backend(backend)
+    rss_before = _maxrss_mb()
+    tracemalloc.start()
+    durations = []
+    chars = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = runner.extract(path, max_length)
+        durations.append(time.perf_counter() - start)
+        chars = len(text)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put({
+        "durations": durations,
+        "chars": chars,
+        "peak_rss_mb": _maxrss_mb(),
+        "rss_growth_mb": _maxrss_mb() - rss_before,
+        "python_peak_mb": python_peak / (1024 * 1024),
+    })
+
+
+def measure_extraction(backend, path, repeat, max_length):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure_extraction, args=(backend, str(path), repeat, max_length, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def measure_llm(runner, path, repeat, max_length):
+    """Latence d'un résumé de bout en bout puis des questions, contre le serveur factice."""
+    metrics = runner.new_metrics()
+    summary_durations = []
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = runner.extract(path, max_length, metrics=metrics)
+        runner.summary(text, metrics=metrics)
+        summary_durations.append(time.perf_counter() - start)
+    question_durations = []
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            runner.question(question, text, metrics=metrics)
+            question_durations.append(time.perf_counter() - start)
+    # Mêmes questions en un seul appel : une seule copie du document dans le prompt
+    batch_metrics = runner.new_metrics()
+    batch_durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        runner.questions(QUESTIONS, text, metrics=batch_metrics)
+        batch_durations.append(time.perf_counter() - start)
+    stages = metrics.summary()
+    llm = stages.get("llm", {})
+    question_prompt_tokens = sum(
+        e.get("prompt_tokens", 0) for e in metrics.events if e["stage"] == "llm" and e.get("call") == "question"
+    )
+    return {
+        "summary_durations": summary_durations,
+        "question_durations": question_durations,
+        "batch_durations": batch_durations,
+        "question_prompt_tokens": question_prompt_tokens // repeat,
+        "batch_prompt_tokens": batch_metrics.summary().get("llm", {}).get("prompt_tokens", 0) // repeat,
+        "prompt_tokens": llm.get("prompt_tokens", 0),
+        "completion_tokens": llm.get("completion_tokens", 0),
+        "tokens_per_s": llm.get("tokens_per_s"),
+        "stages": {name: {"count": s["count"], "mean_s": s["mean_s"]} for name, s in stages.items()},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    reports = ensure_reports(args.cache_dir, args.sizes, args.seed)
+    stub_config = config_from_args(args)
+    server = start_stub_server(stub_config)
+    os.environ.update(stub_environment(server.base_url))
+
+    results = {}
+    try:
+        for backend in args.backends:
+            runner = Backend(backend)
+            for pages, path in reports.items():
+                key = f"{backend}/{pages}p"
+                print(f"▶ {key}", flush=True)
+                extraction = measure_extraction(backend, path, args.repeat, args.max_length)
+                llm = measure_llm(runner, path, args.repeat, args.max_length)
+                results[key] = {
+                    "backend": backend,
+                    "pages": pages,
+                    "chars": extraction["chars"],
+                    "extraction_s": _distribution(extraction["durations"]),
+                    "extraction_peak_rss_mb": extraction["peak_rss_mb"],
+                    "extraction_rss_growth_mb": extraction["rss_growth_mb"],
+                    "extraction_python_peak_mb": extraction["python_peak_mb"],
+                    "summary_e2e_s": _distribution(llm["summary_durations"]),
+                    "question_s": _distribution(llm["question_durations"]),
+                    "batch_s": _distribution(llm["batch_durations"]),
+                    "question_prompt_tokens": llm["question_prompt_tokens"],
+                    "batch_prompt_tokens": llm["batch_prompt_tokens"],
+                    "prompt_tokens": llm["prompt_tokens"],
+                    "completion_tokens": llm["completion_tokens"],
+                    "tokens_per_s": llm["tokens_per_s"],
+                    "stages": llm["stages"],
+                }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    import fitz
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "max_length": args.max_length,
+            "stub": stub_config.to_dict(),
+        },
+        "results": results,
+    }
+
+
+def _value(entry, metric):
+    value = entry.get(metric)
+    return value["median"] if isinstance(value, dict) else value
+
+
+def compare(current, baseline, tolerance):
+    """Affiche les écarts par rapport à la référence ; retourne les régressions."""
+    regressions = []
+    print(f"\n{'cas':<20}{'métrique':<26}{'référence':>12}{'actuel':>12}{'écart':>10}")
+    for key, entry in current["results"].items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = _value(reference, metric), _value(entry, metric)
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            flag = " ⚠" if delta > tolerance else ""
+            print(f"{key:<20}{metric:<26}{old:>12.4f}{new:>12.4f}{delta:>+9.1%}{flag}")
+            if delta > tolerance:
+                regressions.append((key, metric, delta))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline d'analyse financière")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Tailles des rapports (pages)")
+    parser.add_argument("--backends", nargs="+", choices=sorted(APP_DIRS), default=sorted(APP_DIRS))
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure")
+    parser.add_argument("--seed", type=int, default=0, help="Graine des rapports synthétiques")
+    parser.add_argument("--max-length", type=int, default=120000, help="Longueur maximale du texte envoyé au LLM")
+    parser.add_argument("--cache-dir", default=str(BENCH_DIR / ".cache"), help="Dossier des PDF générés")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "latest.json"))
+    parser.add_argument("--baseline", help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Code de sortie 1 en cas de régression")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    current = run(args)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\nRésultats écrits dans {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} régression(s) au-delà de {args.tolerance:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Profil de démarrage des trois applications Streamlit.
+
+Chaque application est exécutée dans un processus neuf lancé avec
+`python -X importtime`, via `streamlit.testing` (sans navigateur) et face au
+serveur factice de `stub_llm.py`. Pour chaque application :
+
+- `first_run_s` : première exécution du script, imports compris (premier affichage) ;
+- `rerun_s` : exécutions suivantes (chaque interaction utilisateur) ;
+- `imports_s` : temps passé dans les imports pendant la première exécution ;
+- `top_imports` : modules les plus coûteux importés pendant cette exécution ;
+- `heavy_loaded` : modules lourds déjà chargés avant tout import de PDF.
+
+    python benchmarks/startup_profile.py
+    python benchmarks/startup_profile.py --baseline benchmarks/results/startup_baseline.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from apps import APP_DIRS, STUB_API_KEY
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# Modules dont le chargement au démarrage retarde le premier affichage
+HEAVY_MODULES = ["fitz", "pymupdf", "ollama", "openai", "requests", "httpx", "pandas", "dotenv"]
+
+_MARK_START = "=== startup_profile: début ==="
+_MARK_END = "=== startup_profile: fin ==="
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Exécuté dans le processus mesuré (`python -X importtime -c ...`)
+_DRIVER = """
+import json, os, sys, time
+sys.path.insert(0, {bench_dir!r})
+from stub_llm import StubConfig, start_stub_server, stub_environment
+from streamlit.testing.v1 import AppTest
+
+server = start_stub_server(StubConfig(time_scale=0))
+os.environ.update(stub_environment(server.base_url))
+os.chdir({app_dir!r})
+sys.path.insert(0, {app_dir!r})
+at = AppTest.from_file(os.path.join({app_dir!r}, "app.py"), default_timeout=120)
+
+print({mark_start!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+at.run()
+first_run = time.perf_counter() - start
+print({mark_end!r}, file=sys.stderr, flush=True)
+
+heavy = [name for name in {heavy!r} if name in sys.modules]
+reruns = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - start)
+
+print(json.dumps({{
+    "first_run_s": first_run,
+    "reruns": reruns,
+    "heavy_loaded": heavy,
+    "exceptions": [str(e.value) for e in at.exception],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Imports réalisés entre les deux marqueurs : [(module, propre_s, cumulé_s, niveau)]."""
+    imports = []
+    inside = False
+    for line in stderr.splitlines():
+        if line.startswith(_MARK_START):
+            inside = True
+        elif line.startswith(_MARK_END):
+            break
+        elif inside:
+            match = _IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return imports
+
+
+def profile_app(backend, reruns):
+    app_dir = APP_DIRS[backend]
+    driver = _DRIVER.format(
+        bench_dir=str(BENCH_DIR),
+        app_dir=str(app_dir),
+        mark_start=_MARK_START,
+        mark_end=_MARK_END,
+        heavy=HEAVY_MODULES,
+        reruns=reruns,
+    )
+    env = dict(os.environ, OPENROUTER_API_KEY=STUB_API_KEY, OPENAI_API_KEY=STUB_API_KEY)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", driver],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    measures = json.loads(completed.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(completed.stderr)
+    top_level = [entry for entry in imports if entry[3] == min((e[3] for e in imports), default=0)]
+    return {
+        "first_run_s": measures["first_run_s"],
+        "rerun_s": statistics.median(measures["reruns"]) if measures["reruns"] else None,
+        "imports_s": sum(entry[2] for entry in top_level),
+        "top_imports": [
+            {"module": name, "cumulative_s": cumulative}
+            for name, _, cumulative, _ in sorted(top_level, key=lambda e: e[2], reverse=True)[:10]
+        ],
+        "heavy_loaded": measures["heavy_loaded"],
+        "exceptions": measures["exceptions"],
+    }
+
+
+def compare(current, baseline):
+    print(f"\n{'application':<14}{'métrique':<14}{'référence':>12}{'actuel':>12}{'écart':>10}")
+    for backend, entry in current.items():
+        reference = baseline.get(backend)
+        if reference is None:
+            continue
+        for metric in ("first_run_s", "rerun_s", "imports_s"):
+            old, new = reference.get(metric), entry.get(metric)
+            if not old or new is None:
+                continue
+            print(f"{backend:<14}{metric:<14}{old:>12.4f}{new:>12.4f}{(new - old) / old:>+9.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil de démarrage des applications Streamlit")
+    parser.add_argument("--backends", nargs="+", choices=sorted(APP_DIRS), default=sorted(APP_DIRS))
+    parser.add_argument("--reruns", type=int, default=5, help="Nombre d'exécutions après la première")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results" / "startup_latest.json"))
+    parser.add_argument("--baseline", help="Profil de référence à comparer")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in args.backends:
+        print(f"▶ {backend}", flush=True)
+        results[backend] = entry = profile_app(backend, args.reruns)
+        print(f"  premier affichage {entry['first_run_s']:.3f} s, rerun {entry['rerun_s']:.3f} s, "
+              f"imports {entry['imports_s']:.3f} s, modules lourds chargés : {', '.join(entry['heavy_loaded']) or 'aucun'}")
+        for item in entry["top_imports"][:5]:
+            print(f"    {item['cumulative_s']:.3f} s  {item['module']}")
+        if entry["exceptions"]:
+            print(f"  ⚠ exceptions : {entry['exceptions']}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\nRésultats écrits dans {output}")
+
+    if args.baseline:
+        compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
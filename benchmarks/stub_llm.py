@@ -0,0 +1,428 @@
+"""Serveur LLM factice, local et déterministe, pour les benchmarks.
+
+Un seul serveur HTTP imite les trois backends des applications :
+
+- Ollama : `POST /api/chat`, `POST /api/generate`, `GET /api/tags`, `GET /api/ps`
+- OpenAI : `POST /v1/chat/completions`
+- OpenRouter : `POST /api/v1/chat/completions`
+
+La latence simulée vaut `latency + tokens_prompt / prefill_tps +
+tokens_générés / decode_tps`, plus `load_time` quand un modèle Ollama n'est
+pas en mémoire (il y reste le temps indiqué par `keep_alive`). Le contenu des réponses dépend uniquement du
+prompt (empreinte SHA-256), si bien que deux exécutions identiques
+produisent les mêmes réponses et les mêmes compteurs de tokens.
+
+Utilisation autonome :
+
+    python benchmarks/stub_llm.py --port 11500 --latency 0.2 --decode-tps 40
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_MODELS = ["llama3.1:8b"]
+
+
+@dataclass
+class StubConfig:
+    """Paramètres de simulation du serveur factice."""
+    latency: float = 0.05          # surcoût fixe par requête (s)
+    prefill_tps: float = 20000.0   # tokens de prompt traités par seconde
+    decode_tps: float = 200.0      # tokens générés par seconde
+    completion_tokens: int = 120   # longueur des réponses (tokens)
+    time_scale: float = 1.0        # 0 pour ne jamais dormir (tests rapides)
+    model_latency: dict = field(default_factory=dict)   # surcoût supplémentaire par modèle (s)
+    failing_models: list = field(default_factory=list)  # modèles qui répondent 503 (OpenAI / OpenRouter)
+    rate_limit_rpm: int = 0        # requêtes admises par fenêtre (OpenAI / OpenRouter), 0 = illimité
+    rate_window_s: float = 60.0    # durée de la fenêtre du quota (s)
+    load_time: float = 0.0         # chargement d'un modèle Ollama absent de la mémoire (s)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def estimate_tokens(text):
+    """Approximation grossière mais stable : ~4 caractères par token."""
+    return max(1, len(text) // 4)
+
+
+def fake_completion(prompt, completion_tokens):
+    """Produit une réponse Markdown déterministe de `completion_tokens` tokens environ."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    head = (
+        f"Réponse simulée ({digest[:12]}).\n\n"
+        "| Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
+        "|---|---:|---|---|---:|\n"
+        f"| Chiffre d'affaires | {int(digest[:6], 16) % 90000 + 1000} M€ | non précisé | 2024 | "
+        f"{int(digest[6:8], 16) % 10 + 1} |\n\n"
+    )
+    words = []
+    target_chars = completion_tokens * 4
+    i = 0
+    while len(head) + sum(len(w) + 1 for w in words) < target_chars:
+        words.append(f"analyse{digest[i % 64]}")
+        i += 1
+    return head + " ".join(words)
+
+
+def fake_batch_completion(prompt, completion_tokens):
+    """Réponse JSON à une série de questions `[Q1] ...` : une entrée par question."""
+    ids = re.findall(r"^\[Q(\d+)\]", prompt, flags=re.MULTILINE)
+    return json.dumps({"answers": [
+        {"id": f"Q{i}", "answer": fake_completion(f"{prompt}\0Q{i}", completion_tokens)}
+        for i in ids
+    ]}, ensure_ascii=False)
+
+
+def _chunks(text, count):
+    size = max(1, len(text) // max(1, count))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # Silence des logs d'accès : les benchmarks mesurent, ils n'affichent pas
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _sleep(self, seconds):
+        if self.config.time_scale > 0:
+            time.sleep(seconds * self.config.time_scale)
+
+    def _simulate(self, prompt, json_mode=False):
+        """Calcule les tokens, dort le temps de prefill et retourne la réponse."""
+        prompt_tokens = estimate_tokens(prompt)
+        self.server.count_request()
+        if json_mode and re.search(r"^\[Q\d+\]", prompt, flags=re.MULTILINE):
+            content = fake_batch_completion(prompt, self.config.completion_tokens)
+        else:
+            content = fake_completion(prompt, self.config.completion_tokens)
+        completion_tokens = estimate_tokens(content)
+        self._sleep(self.config.latency + prompt_tokens / self.config.prefill_tps)
+        return content, prompt_tokens, completion_tokens
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            now = datetime.now(timezone.utc).isoformat()
+            self._send_json({"models": [
+                {"name": m, "model": m, "modified_at": now, "size": 4_920_000_000,
+                 "digest": hashlib.sha256(m.encode()).hexdigest(), "details": {}}
+                for m in STUB_MODELS
+            ]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [
+                {"name": m, "model": m, "size": 4_920_000_000, "size_vram": 4_920_000_000,
+                 "digest": hashlib.sha256(m.encode()).hexdigest(), "details": {},
+                 "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat()}
+                for m, expires in self.server.resident_models().items()
+            ]})
+        else:
+            self._send_json({"error": f"route inconnue: {self.path}"}, status=404)
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except json.JSONDecodeError:
+            self._send_json({"error": "JSON invalide"}, status=400)
+            return
+        if self.path == "/api/chat":
+            self._ollama_chat(payload)
+        elif self.path == "/api/generate":
+            self._ollama_generate(payload)
+        elif self.path in ("/v1/chat/completions", "/api/v1/chat/completions"):
+            self._openai_chat(payload)
+        else:
+            self._send_json({"error": f"route inconnue: {self.path}"}, status=404)
+
+    # --- Ollama -----------------------------------------------------------
+    def _ollama_chat(self, payload):
+        model = payload.get("model", STUB_MODELS[0])
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+        load_s = self.server.load_model(model, payload.get("keep_alive"))
+        self._sleep(load_s)
+        content, prompt_tokens, completion_tokens = self._simulate(prompt, payload.get("format") == "json")
+        eval_s = completion_tokens / self.config.decode_tps
+        final = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((self.config.latency + eval_s) * 1e9),
+            "load_duration": int(load_s * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_tokens / self.config.prefill_tps * 1e9),
+            "eval_count": completion_tokens,
+            "eval_duration": int(eval_s * 1e9),
+        }
+        if payload.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = _chunks(content, 20)
+            for piece in pieces:
+                self._sleep(eval_s / len(pieces))
+                self._write_chunk(json.dumps({
+                    "model": model, "created_at": final["created_at"], "done": False,
+                    "message": {"role": "assistant", "content": piece},
+                }) + "\n")
+            self._write_chunk(json.dumps({**final, "message": {"role": "assistant", "content": ""}}) + "\n")
+            self._write_chunk("")
+        else:
+            self._sleep(eval_s)
+            self._send_json({**final, "message": {"role": "assistant", "content": content}})
+
+    def _ollama_generate(self, payload):
+        # Utilisé pour le préchargement / déchargement de modèles (prompt vide)
+        model = payload.get("model", STUB_MODELS[0])
+        load_s = self.server.load_model(model, payload.get("keep_alive"))
+        self._sleep(load_s)
+        content = ""
+        prompt_tokens = completion_tokens = 0
+        if payload.get("prompt"):
+            content, prompt_tokens, completion_tokens = self._simulate(payload["prompt"])
+            self._sleep(completion_tokens / self.config.decode_tps)
+        self._send_json({
+            "model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": content, "done": True, "done_reason": "stop",
+            "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens,
+            "load_duration": int(load_s * 1e9),
+        })
+
+    # --- OpenAI / OpenRouter ----------------------------------------------
+    def _openai_chat(self, payload):
+        model = payload.get("model", "stub")
+        if model in self.config.failing_models:
+            self.server.count_request()
+            self._send_json({"error": {"code": 503, "message": f"{model} indisponible"}}, status=503)
+            return
+        admitted, quota_headers = self.server.admit()
+        if not admitted:
+            self.server.count_rejected()
+            self._send_json({"error": {"code": 429, "message": "Rate limit exceeded"}}, status=429,
+                            headers=quota_headers)
+            return
+        self._sleep(self.config.model_latency.get(model, 0.0))
+        prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        json_mode = (payload.get("response_format") or {}).get("type") == "json_object"
+        content, prompt_tokens, completion_tokens = self._simulate(prompt, json_mode)
+        eval_s = completion_tokens / self.config.decode_tps
+        created = int(time.time())
+        completion_id = "chatcmpl-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:24]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in quota_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            pieces = _chunks(content, 20)
+            for piece in pieces:
+                self._sleep(eval_s / len(pieces))
+                self._write_chunk("data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }) + "\n\n")
+            self._write_chunk("data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage,
+            }) + "\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+        else:
+            self._sleep(eval_s)
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }, headers=quota_headers)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _duration_s(value, default):
+    """Durée Ollama (nombre de secondes ou chaîne « 30s », « 5m », « 1h ») en secondes"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+    if not match:
+        return default
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.loaded_models = {}   # modèle -> expiration (horodatage)
+        self.request_count = 0
+        self.rejected_count = 0
+        self._admitted = deque()
+        self._count_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def resident_models(self):
+        now = time.time()
+        with self._count_lock:
+            for model in [m for m, expires in self.loaded_models.items() if expires <= now]:
+                del self.loaded_models[model]
+            return dict(self.loaded_models)
+
+    def load_model(self, model, keep_alive):
+        """Charge `model` s'il n'est pas en mémoire ; retourne la durée de chargement simulée.
+
+        `keep_alive` suit la convention d'Ollama : secondes ou durée (« 5m »),
+        0 pour décharger, négatif pour garder indéfiniment (5 min par défaut).
+        """
+        resident = model in self.resident_models()
+        keep_alive_s = _duration_s(keep_alive, default=300.0)
+        with self._count_lock:
+            if keep_alive_s == 0:
+                self.loaded_models.pop(model, None)
+                return 0.0
+            # Pas d'expiration : bien au-delà de toute exécution
+            self.loaded_models[model] = time.time() + (keep_alive_s if keep_alive_s > 0 else 10 * 365 * 86400)
+        return 0.0 if resident else self.config.load_time
+
+    def count_rejected(self):
+        with self._count_lock:
+            self.rejected_count += 1
+
+    def admit(self):
+        """Quota de requêtes par fenêtre glissante ; retourne (admise, en-têtes x-ratelimit / retry-after)"""
+        limit, window = self.config.rate_limit_rpm, self.config.rate_window_s
+        if not limit:
+            return True, {}
+        with self._count_lock:
+            now = time.monotonic()
+            while self._admitted and self._admitted[0] <= now - window:
+                self._admitted.popleft()
+            if len(self._admitted) >= limit:
+                wait = self._admitted[0] + window - now
+                return False, {"retry-after-ms": str(int(wait * 1000) + 1), "retry-after": str(int(wait) + 1)}
+            self._admitted.append(now)
+            # Limite annoncée par minute, comme chez OpenAI
+            return True, {"x-ratelimit-limit-requests": str(int(limit * 60 / window)),
+                          "x-ratelimit-remaining-requests": str(limit - len(self._admitted))}
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """Démarre le serveur dans un thread d'arrière-plan et le retourne."""
+    server = StubServer((host, port), config or StubConfig())
+    thread = threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True)
+    thread.start()
+    return server
+
+
+def stub_environment(base_url):
+    """Variables d'environnement qui redirigent les trois backends vers le serveur factice."""
+    return {
+        "OLLAMA_HOST": base_url,
+        "OPENROUTER_API_URL": f"{base_url}/api/v1/chat/completions",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+    }
+
+
+def add_stub_arguments(parser):
+    """Ajoute les options de simulation à un parseur argparse."""
+    defaults = StubConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Surcoût fixe par requête (s)")
+    parser.add_argument("--prefill-tps", type=float, default=defaults.prefill_tps, help="Tokens de prompt par seconde")
+    parser.add_argument("--decode-tps", type=float, default=defaults.decode_tps, help="Tokens générés par seconde")
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens, help="Longueur des réponses")
+    parser.add_argument("--time-scale", type=float, default=defaults.time_scale, help="Facteur appliqué aux attentes (0 = aucune)")
+    parser.add_argument("--model-latency", nargs=2, action="append", default=[], metavar=("MODELE", "SECONDES"),
+                        help="Surcoût supplémentaire pour un modèle (répétable)")
+    parser.add_argument("--failing-model", action="append", default=[], help="Modèle qui répond 503 (répétable)")
+    parser.add_argument("--load-time", type=float, default=defaults.load_time,
+                        help="Chargement simulé d'un modèle Ollama absent de la mémoire (s)")
+    parser.add_argument("--rate-limit-rpm", type=int, default=defaults.rate_limit_rpm,
+                        help="Requêtes admises par minute avant de répondre 429 (0 = illimité)")
+
+
+def config_from_args(args):
+    return StubConfig(
+        latency=args.latency,
+        prefill_tps=args.prefill_tps,
+        decode_tps=args.decode_tps,
+        completion_tokens=args.completion_tokens,
+        time_scale=args.time_scale,
+        model_latency={model: float(seconds) for model, seconds in args.model_latency},
+        failing_models=list(args.failing_model),
+        rate_limit_rpm=args.rate_limit_rpm,
+        load_time=args.load_time,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur LLM factice (Ollama / OpenAI / OpenRouter)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = StubServer((args.host, args.port), config_from_args(args))
+    print(f"Serveur factice sur {server.base_url}")
+    for name, value in stub_environment(server.base_url).items():
+        print(f"  export {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
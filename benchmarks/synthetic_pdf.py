@@ -0,0 +1,175 @@
+"""Génération de rapports financiers PDF synthétiques et déterministes.
+
+Les documents imitent un rapport annuel : en-têtes et pieds de page répétés,
+pages de texte, pages de chiffres clés et pages en deux colonnes. Une même
+graine produit toujours le même fichier, ce qui rend les mesures comparables
+d'une exécution à l'autre.
+
+Leur flux de contenu suit l'ordre de lecture : les modes d'extraction y
+produisent le même texte. `generate_layout_report` écrit au contraire des
+colonnes entrelacées ligne à ligne et des tableaux réglés remplis colonne par
+colonne, pour mesurer ce que `blocks` et `layout` changent au texte brut.
+"""
+import argparse
+import random
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+COMPANY = "Société Exemple SA"
+REPORT_TITLE = "Rapport financier annuel 2024"
+
+PARAGRAPHS = [
+    "Le chiffre d'affaires consolidé progresse sous l'effet des volumes et d'un effet prix favorable, "
+    "partiellement compensé par un effet de change défavorable sur les marchés émergents.",
+    "La marge opérationnelle courante s'améliore grâce au programme de réduction des coûts et à "
+    "l'optimisation des achats, malgré l'inflation des salaires.",
+    "Le flux de trésorerie disponible reste solide ; les investissements industriels sont concentrés "
+    "sur la modernisation des sites de production et la transformation numérique.",
+    "La dette nette diminue, portée par la génération de trésorerie et la cession d'actifs non "
+    "stratégiques. Le groupe respecte l'ensemble de ses covenants bancaires.",
+    "Les principaux risques identifiés concernent la volatilité des matières premières, l'évolution "
+    "de la réglementation environnementale et l'exposition aux variations de change.",
+    "Pour l'exercice à venir, la direction anticipe une croissance organique comprise entre 3 % et 5 % "
+    "et une marge opérationnelle stable.",
+]
+
+KPIS = [
+    "Chiffre d'affaires",
+    "EBITDA",
+    "Résultat opérationnel",
+    "Résultat net",
+    "Flux de trésorerie opérationnel",
+    "CAPEX",
+    "Dette nette",
+    "Trésorerie",
+]
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 en points
+
+
+def _header_footer(page, number, total):
+    # Éléments répétés sur chaque page, comme dans un vrai rapport
+    page.insert_text((50, 40), f"{COMPANY} — {REPORT_TITLE}", fontsize=8)
+    page.insert_text((50, 820), f"Page {number} / {total} — Document à usage informatif", fontsize=8)
+
+
+def _text_page(page, rng):
+    body = "\n\n".join(rng.choice(PARAGRAPHS) for _ in range(6))
+    page.insert_textbox(fitz.Rect(50, 70, PAGE_WIDTH - 50, PAGE_HEIGHT - 50), body, fontsize=10)
+
+
+def _kpi_page(page, rng, number):
+    lines = [f"Chiffres clés — section {number}", "", "Indicateur | 2024 | 2023 | Variation"]
+    for kpi in KPIS:
+        current = rng.randint(100, 50000)
+        previous = max(1, int(current * rng.uniform(0.8, 1.2)))
+        change = (current - previous) / previous * 100
+        lines.append(f"{kpi} | {current:,} M€ | {previous:,} M€ | {change:+.1f} %".replace(",", " "))
+    page.insert_textbox(fitz.Rect(50, 70, PAGE_WIDTH - 50, PAGE_HEIGHT - 50), "\n".join(lines), fontsize=10)
+
+
+def _two_column_page(page, rng):
+    middle = PAGE_WIDTH / 2
+    left = "\n\n".join(rng.choice(PARAGRAPHS) for _ in range(4))
+    right = "\n\n".join(rng.choice(PARAGRAPHS) for _ in range(4))
+    page.insert_textbox(fitz.Rect(50, 70, middle - 10, PAGE_HEIGHT - 50), left, fontsize=9)
+    page.insert_textbox(fitz.Rect(middle + 10, 70, PAGE_WIDTH - 50, PAGE_HEIGHT - 50), right, fontsize=9)
+
+
+def _interleaved_columns_page(page, rng):
+    # Une ligne de gauche puis une ligne de droite : le flux de contenu entremêle les colonnes
+    middle = PAGE_WIDTH / 2
+    for row in range(40):
+        y = 80 + row * 18
+        page.insert_text((50, y), f"{rng.choice(KPIS)} : {rng.uniform(-10, 10):+.1f} % sur l'exercice", fontsize=9)
+        page.insert_text((middle + 10, y), f"{rng.choice(KPIS)} : {rng.randint(10, 900)} M€ à fin 2024", fontsize=9)
+
+
+def _ruled_table_page(page, rng, number):
+    # Tableau réglé écrit colonne par colonne : le flux de contenu sépare libellés et valeurs
+    page.insert_text((50, 80), f"Chiffres clés — section {number}", fontsize=11)
+    header = ["Indicateur", "2024", "2023", "Variation"]
+    rows = []
+    for kpi in KPIS:
+        current = rng.randint(100, 50000)
+        previous = max(1, int(current * rng.uniform(0.8, 1.2)))
+        rows.append([kpi, f"{current:,} M€".replace(",", " "), f"{previous:,} M€".replace(",", " "),
+                     f"{(current - previous) / previous * 100:+.1f} %"])
+    edges, top, height = [50, 250, 350, 450, PAGE_WIDTH - 50], 100, 20
+    for column in range(len(header)):
+        for row, cells in enumerate([header] + rows):
+            page.insert_text((edges[column] + 4, top + row * height + 14), cells[column], fontsize=9)
+    bottom = top + (len(rows) + 1) * height
+    for row in range(len(rows) + 2):
+        page.draw_line((edges[0], top + row * height), (edges[-1], top + row * height))
+    for x in edges:
+        page.draw_line((x, top), (x, bottom))
+
+
+def generate_report(path, pages, seed=0):
+    """Écrit un rapport synthétique de `pages` pages dans `path`."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        _header_footer(page, number, pages)
+        kind = number % 5
+        if kind == 0:
+            _kpi_page(page, rng, number)
+        elif kind == 3:
+            _two_column_page(page, rng)
+        else:
+            _text_page(page, rng)
+    doc.save(str(path), garbage=3, deflate=True)
+    doc.close()
+    return Path(path)
+
+
+def generate_layout_report(path, pages=10, seed=0):
+    """Écrit dans `path` un rapport dont le flux de contenu ne suit pas l'ordre de lecture."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        _header_footer(page, number, pages)
+        if number % 2:
+            _interleaved_columns_page(page, rng)
+        else:
+            _ruled_table_page(page, rng, number)
+    doc.save(str(path), garbage=3, deflate=True)
+    doc.close()
+    return Path(path)
+
+
+def ensure_reports(cache_dir, sizes, seed=0):
+    """Retourne {nombre de pages: chemin}, en générant les fichiers manquants."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    reports = {}
+    for pages in sizes:
+        path = cache_dir / f"rapport_synthetique_{pages}p_s{seed}.pdf"
+        if not path.exists():
+            generate_report(path, pages, seed)
+        reports[pages] = path
+    return reports
+
+
+def ensure_layout_report(cache_dir, seed=0):
+    """Chemin du rapport de `generate_layout_report`, généré s'il manque."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"rapport_mise_en_page_s{seed}.pdf"
+    if not path.exists():
+        generate_layout_report(path, seed=seed)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des rapports financiers PDF synthétiques")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Nombres de pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=str(Path(__file__).parent / ".cache"))
+    args = parser.parse_args()
+    for pages, path in ensure_reports(args.output_dir, args.sizes, args.seed).items():
+        print(f"{pages:>5} pages -> {path}")
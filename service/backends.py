@@ -0,0 +1,92 @@
+"""Accès aux pipelines des trois applications depuis un même processus.
+
+Chaque `pipeline.py` est chargé sous un nom qui lui est propre
+(`pipeline_ollama`, ...). Les modules communs (`instrumentation`,
+`revisions`, `singleflight`...) sont des copies identiques d'un dossier
+d'application à l'autre : ils ne sont importés qu'une fois et partagés.
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+APP_DIRS = {
+    "ollama": ROOT / "01_Application_Analyseur_Financier_OpenSource_Ollama",
+    "openrouter": ROOT / "02_Application_Analyseur_Financier_OpenSource_OpenRouter",
+    "openai": ROOT / "03_Application_Analyseur_Financier_OpenAI",
+}
+
+# Modèle utilisé quand la requête n'en précise pas
+DEFAULT_MODELS = {
+    "ollama": os.getenv("SERVICE_OLLAMA_MODEL", "llama3.1:8b"),
+    "openrouter": os.getenv("SERVICE_OPENROUTER_MODEL", "mistralai/mistral-7b-instruct"),
+    "openai": os.getenv("SERVICE_OPENAI_MODEL", "gpt-4o-mini"),
+}
+
+# Variables d'environnement des clés API
+API_KEY_VARS = {"openrouter": "OPENROUTER_API_KEY", "openai": "OPENAI_API_KEY"}
+
+for _app_dir in APP_DIRS.values():
+    if str(_app_dir) not in sys.path:
+        sys.path.append(str(_app_dir))
+
+from extraction import DEFAULT_MODE  # noqa: E402
+
+
+def _load_pipeline(backend):
+    name = f"pipeline_{backend}"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, APP_DIRS[backend] / "pipeline.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+class Backend:
+    """Adapte les signatures (différentes d'une application à l'autre) du pipeline."""
+
+    def __init__(self, name):
+        self.name = name
+        self.pipeline = _load_pipeline(name)
+        self.metrics = sys.modules["instrumentation"].PipelineMetrics(backend=name, max_events=2000)
+
+    def _api_key(self):
+        var = API_KEY_VARS.get(self.name)
+        if var is None:
+            return None
+        api_key = os.getenv(var)
+        if not api_key:
+            raise RuntimeError(f"Variable d'environnement {var} absente")
+        return api_key
+
+    def load_document(self, pdf_source, previous=None, mode=DEFAULT_MODE):
+        return self.pipeline.load_document(pdf_source, previous, metrics=self.metrics, mode=mode)
+
+    def summary(self, analysis, text, model):
+        if self.name == "ollama":
+            return self.pipeline.generate_document_summary(analysis, text, model, metrics=self.metrics)
+        return self.pipeline.generate_document_summary(analysis, text, self._api_key(), model, metrics=self.metrics)
+
+    def answer(self, question, text, model):
+        if self.name == "ollama":
+            return self.pipeline.answer_question(question, text, model, metrics=self.metrics)
+        if self.name == "openrouter":
+            return self.pipeline.answer_question(question, text, self._api_key(), model, metrics=self.metrics)
+        return self.pipeline.answer_question(text, question, self._api_key(), model, metrics=self.metrics)
+
+    def answers(self, questions, text, model):
+        if self.name == "ollama":
+            return self.pipeline.answer_questions(questions, text, model, metrics=self.metrics)
+        if self.name == "openrouter":
+            return self.pipeline.answer_questions(questions, text, self._api_key(), model, metrics=self.metrics)
+        return self.pipeline.answer_questions(text, questions, self._api_key(), model, metrics=self.metrics)
+
+    def stream_answer(self, question, text, model):
+        if self.name == "ollama":
+            return self.pipeline.stream_answer(question, text, model, metrics=self.metrics)
+        if self.name == "openrouter":
+            return self.pipeline.stream_answer(question, text, self._api_key(), model, metrics=self.metrics)
+        return self.pipeline.stream_answer(text, question, self._api_key(), model, metrics=self.metrics)
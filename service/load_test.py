@@ -0,0 +1,147 @@
+"""Test de charge du service REST face au serveur LLM factice.
+
+Démarre `benchmarks/stub_llm.py` et le service (uvicorn) dans ce processus,
+importe un rapport PDF synthétique puis envoie `--requests` questions avec
+`--concurrency` clients simultanés. Affiche les percentiles de latence, le
+débit, les erreurs et le nombre d'appels réellement reçus par le LLM.
+
+    python service/load_test.py --backend ollama --requests 40 --concurrency 8
+    python service/load_test.py --backend openai --stream --time-scale 0.2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent
+BENCH_DIR = SERVICE_DIR.parent / "benchmarks"
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(SERVICE_DIR))
+
+from apps import STUB_API_KEY  # noqa: E402
+from stub_llm import add_stub_arguments, config_from_args, start_stub_server, stub_environment  # noqa: E402
+from synthetic_pdf import generate_report  # noqa: E402
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(port):
+    """Lance uvicorn dans un thread d'arrière-plan et attend qu'il réponde."""
+    import uvicorn
+    from server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="service", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def ask(client, doc_id, question, args):
+    payload = {"question": question, "backend": args.backend, "stream": args.stream}
+    start = time.perf_counter()
+    if not args.stream:
+        response = await client.post(f"/documents/{doc_id}/questions", json=payload)
+        return time.perf_counter() - start, None, response.status_code
+    first = None
+    async with client.stream("POST", f"/documents/{doc_id}/questions", json=payload) as response:
+        async for line in response.aiter_lines():
+            if first is None and line:
+                first = time.perf_counter() - start
+    return time.perf_counter() - start, first, response.status_code
+
+
+async def run_load(base_url, doc_id, args):
+    import httpx
+
+    # Questions distinctes, sauf si --duplicates : elles sont alors mutualisées
+    distinct = max(1, args.requests // args.duplicates)
+    questions = [f"Quel est l'indicateur n°{i % distinct} du rapport ?" for i in range(args.requests)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        async def worker(question):
+            async with semaphore:
+                try:
+                    results.append(await ask(client, doc_id, question, args))
+                except httpx.HTTPError as e:
+                    results.append((None, None, type(e).__name__))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(q) for q in questions))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du service REST")
+    parser.add_argument("--backend", choices=["ollama", "openrouter", "openai"], default="ollama")
+    parser.add_argument("--requests", type=int, default=40, help="Nombre total de questions")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients simultanés")
+    parser.add_argument("--duplicates", type=int, default=1, help="Nombre d'envois de chaque question")
+    parser.add_argument("--pages", type=int, default=20, help="Taille du rapport synthétique")
+    parser.add_argument("--stream", action="store_true", help="Réponses en flux NDJSON")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub = start_stub_server(config_from_args(args))
+    os.environ.update(stub_environment(stub.base_url))
+    os.environ.setdefault("OPENROUTER_API_KEY", STUB_API_KEY)
+    os.environ.setdefault("OPENAI_API_KEY", STUB_API_KEY)
+
+    port = _free_port()
+    service = start_service(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    import httpx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "rapport.pdf"
+        generate_report(pdf_path, args.pages)
+        with open(pdf_path, "rb") as pdf_file:
+            response = httpx.post(f"{base_url}/documents", files={"file": ("rapport.pdf", pdf_file, "application/pdf")}, timeout=600)
+    response.raise_for_status()
+    document = response.json()
+    print(f"Document {document['document_id']} : {document['pages']} pages, {document['chars']} caractères")
+
+    requests_before = stub.request_count
+    results, elapsed = asyncio.run(run_load(base_url, document["document_id"], args))
+    latencies = [latency for latency, _, status in results if status == 200]
+    first_deltas = [first for _, first, status in results if status == 200 and first is not None]
+    errors = [status for _, _, status in results if status != 200]
+
+    print(f"\n{args.backend} — {args.requests} questions, {args.concurrency} clients simultanés"
+          f"{', flux' if args.stream else ''}")
+    print(f"  durée totale      {elapsed:.2f} s")
+    print(f"  débit             {len(latencies) / elapsed:.2f} réponses/s")
+    if latencies:
+        print(f"  latence p50       {percentile(latencies, 0.50):.3f} s")
+        print(f"  latence p95       {percentile(latencies, 0.95):.3f} s")
+        print(f"  latence max       {max(latencies):.3f} s")
+    if first_deltas:
+        print(f"  premier fragment  {statistics.median(first_deltas):.3f} s (médiane)")
+    print(f"  erreurs           {len(errors)}{' ' + str(sorted(set(map(str, errors)))) if errors else ''}")
+    print(f"  appels LLM reçus  {stub.request_count - requests_before}")
+
+    service.should_exit = True
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
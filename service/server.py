@@ -0,0 +1,371 @@
+"""Service REST sans interface : extraction, résumé et questions / réponses.
+
+Expose les pipelines des trois applications (Ollama, OpenRouter, OpenAI) à
+d'autres systèmes :
+
+    POST   /documents                     import d'un PDF -> identifiant
+    GET    /documents/{id}                informations sur le document
+    DELETE /documents/{id}
+    POST   /documents/{id}/summary        résumé (mis en cache par backend et modèle)
+    GET    /documents/{id}/summary        résumé déjà produit
+    POST   /documents/{id}/questions      réponse, éventuellement en flux NDJSON
+    POST   /documents/{id}/questions/batch plusieurs questions en un seul appel LLM
+    GET    /health                        état, limites et charge par backend
+    GET    /metrics                       mesures au format Prometheus
+
+Les traitements bloquants (PyMuPDF, appels LLM) tournent dans un pool de
+threads borné ; un sémaphore par backend limite les appels simultanés vers
+chaque fournisseur. Lancement :
+
+    uvicorn server:app --app-dir service --port 8000
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from backends import APP_DIRS, DEFAULT_MODELS, Backend
+from batch import MAX_QUESTIONS
+from extraction import DEFAULT_MODE, MODES
+from profiling import DEFAULT_PROFILER, PROFILE_DIR, profiled
+from ratelimit import SCHEDULER, BudgetExceeded, QuotaExceeded
+from spool import SPOOL_THRESHOLD, read_pdf
+from storage import CODEC, TEXTS
+from store import Document, DocumentStore, document_id
+
+BackendName = Literal["ollama", "openrouter", "openai"]
+
+# Taille du pool de threads qui exécute extraction et appels LLM
+WORKERS = int(os.getenv("SERVICE_WORKERS", "16"))
+
+# Appels simultanés autorisés par backend (GPU partagé pour Ollama, quotas pour les API)
+CONCURRENCY = {
+    "ollama": int(os.getenv("SERVICE_CONCURRENCY_OLLAMA", "2")),
+    "openrouter": int(os.getenv("SERVICE_CONCURRENCY_OPENROUTER", "8")),
+    "openai": int(os.getenv("SERVICE_CONCURRENCY_OPENAI", "8")),
+}
+
+# Attente maximale d'une place libre avant de répondre 503
+QUEUE_TIMEOUT_S = float(os.getenv("SERVICE_QUEUE_TIMEOUT", "120"))
+
+# Extractions PDF simultanées (gourmandes en CPU et en mémoire)
+EXTRACTION_CONCURRENCY = int(os.getenv("SERVICE_CONCURRENCY_EXTRACTION", "4"))
+
+MAX_UPLOAD_BYTES = int(os.getenv("SERVICE_MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="analyseur")
+store = DocumentStore(max_documents=int(os.getenv("SERVICE_MAX_DOCUMENTS", "50")))
+backends = {name: Backend(name) for name in APP_DIRS}
+
+# Créés au démarrage, dans la boucle d'événements du serveur
+limits = {}
+_waiting = {name: 0 for name in list(CONCURRENCY) + ["extraction"]}
+_waiting_lock = threading.Lock()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    for name, size in CONCURRENCY.items():
+        limits[name] = asyncio.Semaphore(size)
+    limits["extraction"] = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Analyseur de Documents Financiers", version="1.0", lifespan=lifespan)
+
+
+class Slot:
+    """Place dans la limite de concurrence d'un backend (503 si l'attente est trop longue)."""
+
+    def __init__(self, name):
+        self.name = name
+
+    async def __aenter__(self):
+        with _waiting_lock:
+            _waiting[self.name] += 1
+        try:
+            await asyncio.wait_for(limits[self.name].acquire(), QUEUE_TIMEOUT_S)
+        except asyncio.TimeoutError as e:
+            raise HTTPException(503, f"Backend {self.name} saturé, réessayez plus tard") from e
+        finally:
+            with _waiting_lock:
+                _waiting[self.name] -= 1
+        return self
+
+    async def __aexit__(self, *exc):
+        limits[self.name].release()
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+def backend_error(name, error):
+    """Erreur HTTP correspondant à l'échec d'un appel au backend"""
+    if isinstance(error, QuotaExceeded):
+        return HTTPException(429, f"Quota du backend {name} atteint : {error}")
+    if isinstance(error, BudgetExceeded):
+        return HTTPException(402, str(error))
+    return HTTPException(502, f"Erreur du backend {name} : {error}")
+
+
+def _get_document(doc_id):
+    document = store.get(doc_id)
+    if document is None:
+        raise HTTPException(404, "Document inconnu (identifiant invalide ou document expiré)")
+    return document
+
+
+class SummaryRequest(BaseModel):
+    backend: BackendName = "ollama"
+    model: Optional[str] = None
+
+
+class QuestionRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=2000)
+    backend: BackendName = "ollama"
+    model: Optional[str] = None
+    stream: bool = False
+
+
+class BatchRequest(BaseModel):
+    questions: list[str] = Field(min_length=1, max_length=MAX_QUESTIONS)
+    backend: BackendName = "ollama"
+    model: Optional[str] = None
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "documents": len(store),
+        "workers": WORKERS,
+        "backends": {
+            name: {
+                "limit": CONCURRENCY[name],
+                "available": limits[name]._value if name in limits else CONCURRENCY[name],
+                "waiting": _waiting[name],
+                "default_model": DEFAULT_MODELS[name],
+            }
+            for name in CONCURRENCY
+        },
+        "quotas": SCHEDULER.snapshot(),
+        "budget": SCHEDULER.budget.snapshot(),
+        "text_cache": {"codec": CODEC, "max_bytes": TEXTS.max_bytes, **TEXTS.stats()},
+        "profiling": {"mode": DEFAULT_PROFILER, "directory": PROFILE_DIR} if DEFAULT_PROFILER else None,
+    }
+
+
+def merge_prometheus(exports):
+    """Regroupe les échantillons de plusieurs exports par famille (HELP/TYPE une seule fois)."""
+    families = {}
+    for export in exports:
+        family = None
+        for line in export.splitlines():
+            if line.startswith("# HELP "):
+                family = families.setdefault(line.split()[2], {"header": [], "samples": []})
+                if not family["header"]:
+                    family["header"].append(line)
+            elif line.startswith("# TYPE "):
+                if len(family["header"]) < 2:
+                    family["header"].append(line)
+            elif line:
+                family["samples"].append(line)
+    return "".join("\n".join(f["header"] + f["samples"]) + "\n" for f in families.values())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return merge_prometheus(backend.metrics.to_prometheus() for backend in backends.values())
+
+
+@app.post("/documents", status_code=201)
+async def upload_document(
+    file: UploadFile = File(...),
+    max_length: int = Form(120000, ge=1000, le=2_000_000),
+    previous_id: Optional[str] = Form(None),
+    mode: str = Form(DEFAULT_MODE),
+):
+    """Importe un PDF. `previous_id` : version antérieure dont les pages inchangées sont réutilisées ;
+    `mode` : mode d'extraction du texte (`text`, `blocks`, `layout`, `numbers`)."""
+    if mode not in MODES:
+        raise HTTPException(422, f"Mode d'extraction inconnu : {mode}")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, "Fichier trop volumineux")
+    # Au-delà du seuil, le fichier reçu est recopié par blocs vers un fichier que PyMuPDF ouvre par son chemin
+    pdf_source = await run_blocking(read_pdf, file.file, SPOOL_THRESHOLD, file.filename)
+    if not len(pdf_source):
+        raise HTTPException(400, "Fichier vide")
+    if len(pdf_source) > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, "Fichier trop volumineux")
+
+    doc_id = document_id(pdf_source)
+    existing = store.get(doc_id)
+    if existing is not None and existing.analysis.mode == mode:
+        if existing.max_length == max_length:
+            return existing.info()
+        # Même document, autre longueur maximale : pas de nouvelle extraction, même analyse et même verrou
+        document = Document(doc_id, file.filename, existing.analysis, max_length, existing.previous_id,
+                            lock=existing.lock)
+        store.put(document)
+        return document.info()
+
+    previous = _get_document(previous_id).analysis if previous_id else None
+    async with Slot("extraction"):
+        try:
+            # L'extraction ne dépend pas du backend : celui d'Ollama sert de point d'entrée
+            load = profiled(backends["ollama"].load_document, "extraction", doc_id)
+            analysis = await run_blocking(load, pdf_source, previous, mode)
+        except Exception as e:
+            raise HTTPException(422, f"PDF illisible : {e}") from e
+
+    document = Document(doc_id, file.filename, analysis, max_length, previous_id)
+    store.put(document)
+    return document.info()
+
+
+@app.get("/documents/{doc_id}")
+async def get_document(doc_id: str):
+    return _get_document(doc_id).info()
+
+
+@app.delete("/documents/{doc_id}", status_code=204)
+async def delete_document(doc_id: str):
+    if not store.delete(doc_id):
+        raise HTTPException(404, "Document inconnu")
+
+
+@app.post("/documents/{doc_id}/summary")
+async def create_summary(doc_id: str, request: SummaryRequest):
+    document = _get_document(doc_id)
+    backend = backends[request.backend]
+    model = request.model or DEFAULT_MODELS[request.backend]
+    key = (request.backend, model)
+    if key in document.summaries:
+        return {"document_id": doc_id, "backend": request.backend, "model": model,
+                "summary": document.summaries[key], "cached": True}
+
+    def summarize():
+        # Le résumé par sections modifie l'analyse : un seul résumé à la fois par analyse
+        with document.lock:
+            if key not in document.summaries:
+                document.summaries[key] = backend.summary(document.analysis, document.text, model)
+            return document.summaries[key], dict(document.analysis.stats)
+
+    async with Slot(request.backend):
+        try:
+            summary, stats = await run_blocking(profiled(summarize, request.backend, doc_id))
+        except Exception as e:
+            raise backend_error(request.backend, e) from e
+    return {"document_id": doc_id, "backend": request.backend, "model": model, "summary": summary,
+            "cached": False, "sections": stats}
+
+
+@app.get("/documents/{doc_id}/summary")
+async def get_summary(doc_id: str, backend: BackendName = "ollama", model: Optional[str] = None):
+    document = _get_document(doc_id)
+    model = model or DEFAULT_MODELS[backend]
+    summary = document.summaries.get((backend, model))
+    if summary is None:
+        raise HTTPException(404, "Aucun résumé pour ce backend et ce modèle ; utilisez POST")
+    return {"document_id": doc_id, "backend": backend, "model": model, "summary": summary}
+
+
+@app.post("/documents/{doc_id}/questions")
+async def ask_question(doc_id: str, request: QuestionRequest):
+    document = _get_document(doc_id)
+    backend = backends[request.backend]
+    model = request.model or DEFAULT_MODELS[request.backend]
+
+    if not request.stream:
+        async with Slot(request.backend):
+            try:
+                answer = await run_blocking(
+                    profiled(backend.answer, request.backend, doc_id), request.question, document.text, model
+                )
+            except Exception as e:
+                raise backend_error(request.backend, e) from e
+        return {"document_id": doc_id, "backend": request.backend, "model": model,
+                "question": request.question, "answer": answer}
+
+    # Flux NDJSON : {"delta": ...} au fil de la génération, puis {"done": true, "answer": ...}
+    return StreamingResponse(
+        _stream_answer(backend, request.question, document.text, model),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/documents/{doc_id}/questions/batch")
+async def ask_questions(doc_id: str, request: BatchRequest):
+    """Répond à toutes les questions avec une seule copie du document dans le prompt."""
+    document = _get_document(doc_id)
+    backend = backends[request.backend]
+    model = request.model or DEFAULT_MODELS[request.backend]
+    questions = [q.strip() for q in request.questions if q.strip()]
+    if not questions:
+        raise HTTPException(422, "Aucune question")
+
+    async with Slot(request.backend):
+        try:
+            results = await run_blocking(profiled(backend.answers, request.backend, doc_id), questions, document.text, model)
+        except Exception as e:
+            raise backend_error(request.backend, e) from e
+    return {"document_id": doc_id, "backend": request.backend, "model": model, "answers": results}
+
+
+async def _stream_answer(backend, question, text, model):
+    # La place est prise dans le générateur, au premier fragment demandé : un flux jamais
+    # lu (client parti avant le début de la réponse) n'en retient aucune
+    slot = Slot(backend.name)
+    try:
+        await slot.__aenter__()
+    except HTTPException as e:
+        # En-têtes déjà envoyés : la saturation est signalée dans le flux
+        yield json.dumps({"error": e.detail}, ensure_ascii=False) + "\n"
+        return
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def produce():
+        # Exécuté dans le pool : transmet chaque fragment à la boucle d'événements
+        try:
+            generator = backend.stream_answer(question, text, model)
+            try:
+                for delta in generator:
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, delta)
+            finally:
+                generator.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    future = loop.run_in_executor(executor, produce)
+    parts = []
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                yield json.dumps({"done": True, "answer": "".join(parts)}, ensure_ascii=False) + "\n"
+                break
+            if isinstance(item, Exception):
+                yield json.dumps({"error": f"Erreur du backend {backend.name} : {item}"}, ensure_ascii=False) + "\n"
+                break
+            parts.append(item)
+            yield json.dumps({"delta": item}, ensure_ascii=False) + "\n"
+    finally:
+        # Client déconnecté ou fin du flux : arrêter la génération et libérer la place
+        cancelled.set()
+        await future
+        await slot.__aexit__(None, None, None)
@@ -0,0 +1,85 @@
+"""Documents analysés par le service, conservés en mémoire.
+
+L'identifiant d'un document est l'empreinte de son contenu : importer deux
+fois le même PDF ne déclenche pas de nouvelle extraction. Les résumés sont
+conservés par (backend, modèle). Le nombre de documents est borné ; les
+moins récemment utilisés sont oubliés en premier.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from spool import pdf_digest
+from storage import CompressedText
+
+
+def document_id(pdf_source):
+    return pdf_digest(pdf_source)[:32]
+
+
+class Document:
+    def __init__(self, doc_id, filename, analysis, max_length, previous_id=None, lock=None):
+        self.id = doc_id
+        self.filename = filename
+        self.previous_id = previous_id
+        self.analysis = analysis
+        self.max_length = max_length
+        text, self.truncated = analysis.text(max_length)
+        self._text = CompressedText(text)
+        self.created = time.time()
+        self.summaries = {}   # (backend, modèle) -> résumé
+        # Verrou de l'analyse : partagé par les documents qui réutilisent la même
+        self.lock = lock or threading.Lock()
+
+    @property
+    def text(self):
+        return self._text.get()
+
+    def info(self):
+        pages = self.analysis.pages
+        return {
+            "document_id": self.id,
+            "filename": self.filename,
+            "pages": len(pages),
+            "chars": len(self._text),
+            "stored_bytes": self.analysis.stored_bytes + len(self._text.blob),
+            "truncated": self.truncated,
+            "max_length": self.max_length,
+            "extraction_mode": self.analysis.mode,
+            "boilerplate_bytes": self.analysis.boilerplate_bytes,
+            "reused_pages": sum(page["reused"] for page in pages),
+            "previous_id": self.previous_id,
+            "summaries": [{"backend": b, "model": m} for b, m in self.summaries],
+            "created": self.created,
+        }
+
+
+class DocumentStore:
+    """Dictionnaire LRU et thread-safe des documents."""
+
+    def __init__(self, max_documents=50):
+        self.max_documents = max_documents
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_id):
+        with self._lock:
+            document = self._documents.get(doc_id)
+            if document is not None:
+                self._documents.move_to_end(doc_id)
+            return document
+
+    def put(self, document):
+        with self._lock:
+            self._documents[document.id] = document
+            self._documents.move_to_end(document.id)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def delete(self, doc_id):
+        with self._lock:
+            return self._documents.pop(doc_id, None) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._documents)
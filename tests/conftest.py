@@ -0,0 +1,29 @@
+"""Les modules communs sont copiés dans chaque application : chaque test
+porte sur les trois copies, chargées depuis leur dossier."""
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIRS = sorted(ROOT.glob("0*_Application_*"))
+
+
+def load_module(app_dir, name):
+    """Charge `name`.py du dossier `app_dir` sous un nom propre à l'application."""
+    key = f"_app{app_dir.name[:2]}_{name}"
+    if key not in sys.modules:
+        if str(app_dir) not in sys.path:
+            sys.path.append(str(app_dir))  # imports entre modules voisins (copies identiques)
+        spec = importlib.util.spec_from_file_location(key, app_dir / f"{name}.py")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[key] = module
+        spec.loader.exec_module(module)
+    return sys.modules[key]
+
+
+@pytest.fixture(params=APP_DIRS, ids=lambda path: path.name[:2])
+def app_module(request):
+    """Fabrique : `app_module("boilerplate")` retourne la copie du module de l'application testée."""
+    return lambda name: load_module(request.param, name)
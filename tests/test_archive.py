@@ -0,0 +1,87 @@
+import hashlib
+import os
+
+import pytest
+
+
+def _analysis(app_module, texts):
+    revisions = app_module("revisions")
+    pages = [
+        {
+            "number": number, "fingerprint": f"f{number}",
+            "text_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(), "text": text, "reused": False,
+        }
+        for number, text in enumerate(texts, start=1)
+    ]
+    return revisions.DocumentAnalysis(pages)
+
+
+def _count(archive, table):
+    return archive._db().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_delete_document_collects_unshared_pages(app_module, tmp_path):
+    archive_module = app_module("archive")
+    archive = archive_module.AnalysisArchive(str(tmp_path / "archive.sqlite3"), store_pdf=False)
+    archive.save_document("a", "a.pdf", _analysis(app_module, ["Chiffre d'affaires consolidé", "Page commune"]))
+    archive.save_document("b", "b.pdf", _analysis(app_module, ["Endettement net du groupe", "Page commune"]))
+    archive.save_summary("a", "modele", "Résumé")
+    archive.save_answer("a", "Question ?", "Réponse.", "modele")
+
+    assert archive.delete_document("a")
+
+    assert archive.load("a") is None
+    assert _count(archive, "texts") == 2
+    assert _count(archive, "summaries") == 0
+    assert _count(archive, "answers") == 0
+    assert archive.search("affaires") == []
+    assert [hit["doc_hash"] for hit in archive.search("commune")] == ["b"]
+    assert not archive.delete_document("a")
+
+
+def test_resaving_a_document_collects_replaced_pages(app_module, tmp_path):
+    archive_module = app_module("archive")
+    archive = archive_module.AnalysisArchive(str(tmp_path / "archive.sqlite3"), store_pdf=False)
+    archive.save_document("a", "a.pdf", _analysis(app_module, ["Page extraite en mode texte"]))
+    archive.save_document("a", "a.pdf", _analysis(app_module, ["Page extraite en mode blocs"]))
+
+    assert _count(archive, "texts") == 1
+    assert archive.search("texte") == []
+    assert [hit["doc_hash"] for hit in archive.search("blocs")] == ["a"]
+
+
+class _ConnectionWithoutBlobs:
+    """Connexion SQLite de Python < 3.11 : pas d'accès incrémental aux blobs."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        if name == "blobopen":
+            raise AttributeError(name)
+        return getattr(self._db, name)
+
+    def __enter__(self):
+        return self._db.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._db.__exit__(*exc_info)
+
+
+@pytest.mark.parametrize("blobs", [True, False], ids=["blobopen", "sans_blobopen"])
+def test_spooled_pdf_round_trip(app_module, tmp_path, monkeypatch, blobs):
+    archive_module = app_module("archive")
+    monkeypatch.setattr(archive_module, "SPOOL_THRESHOLD", 1024)
+    monkeypatch.setattr(archive_module, "CHUNK_BYTES", 1000)
+    archive = archive_module.AnalysisArchive(str(tmp_path / "archive.sqlite3"), store_pdf=True)
+    if not blobs:
+        db = archive._db()
+        monkeypatch.setattr(archive, "_db", lambda: _ConnectionWithoutBlobs(db))
+    data = b"%PDF-1.4\n" + os.urandom(4500)
+    pdf = archive_module.SpooledPDF.from_chunks([data], "rapport.pdf")
+
+    archive.save_document(pdf.doc_hash, "rapport.pdf", _analysis(app_module, ["Page unique"]), pdf)
+    reopened = archive.load(pdf.doc_hash).pdf_source
+
+    assert isinstance(reopened, archive_module.SpooledPDF)
+    assert (reopened.doc_hash, b"".join(reopened.chunks())) == (pdf.doc_hash, data)
@@ -0,0 +1,26 @@
+def test_parse_checklist_strips_bullets_and_duplicates(app_module):
+    parse_checklist = app_module("batch").parse_checklist
+    text = "- Quel est le CA ?\n\n2) Quelle est la dette nette ?\n[x] Quel est le CA ?\n• Dividende proposé ?"
+
+    assert parse_checklist(text) == ["Quel est le CA ?", "Quelle est la dette nette ?", "Dividende proposé ?"]
+
+
+def test_parse_checklist_is_capped(app_module):
+    batch = app_module("batch")
+    text = "\n".join(f"Question {i} ?" for i in range(batch.MAX_QUESTIONS + 5))
+
+    assert len(batch.parse_checklist(text)) == batch.MAX_QUESTIONS
+
+
+def test_parse_batch_answers_maps_ids(app_module):
+    parse_batch_answers = app_module("batch").parse_batch_answers
+    raw = '```json\n{"answers": [{"id": "Q2", "answer": "84 M€ (Page 3)"}, {"id": "Q1", "answer": "1 037 M€"}]}\n```'
+
+    assert parse_batch_answers(raw, 3) == ["1 037 M€", "84 M€ (Page 3)", None]
+
+
+def test_parse_batch_answers_tolerates_invalid_output(app_module):
+    parse_batch_answers = app_module("batch").parse_batch_answers
+
+    assert parse_batch_answers("Je ne peux pas répondre.", 2) == [None, None]
+    assert parse_batch_answers('["Oui", ""]', 2) == ["Oui", None]
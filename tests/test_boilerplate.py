@@ -0,0 +1,67 @@
+def _report(pages, kpi):
+    """Pages d'un rapport : en-tête et pied de page répétés, une ligne de chiffres clés par page."""
+    return [
+        f"Groupe Exemple — Rapport annuel 2024\n{kpi(page)}\nCommentaire propre à la page {page}.\n"
+        f"Rapport annuel 2024 — page {page} / {pages}"
+        for page in range(1, pages + 1)
+    ]
+
+
+def test_dated_kpi_lines_survive(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = _report(8, lambda page: f"Solde au 31/12/2024 : {1000 + 37 * page} M€")
+
+    cleaned, _ = boilerplate.strip_boilerplate(pages)
+
+    for page, text in enumerate(cleaned, start=1):
+        assert f"Solde au 31/12/2024 : {1000 + 37 * page} M€" in text
+
+
+def test_dated_lines_differing_only_by_date_survive(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = _report(6, lambda page: f"Cours de clôture au {page:02d}/03/2024 : 42,10 €")
+
+    cleaned, _ = boilerplate.strip_boilerplate(pages)
+
+    for page, text in enumerate(cleaned, start=1):
+        assert f"Cours de clôture au {page:02d}/03/2024 : 42,10 €" in text
+
+
+def test_headers_and_pagination_removed_after_first_page(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = _report(8, lambda page: f"Solde au 31/12/2024 : {1000 + page} M€")
+
+    cleaned, saved = boilerplate.strip_boilerplate(pages)
+
+    assert cleaned[0] == pages[0]
+    for text in cleaned[1:]:
+        assert "Groupe Exemple — Rapport annuel 2024" not in text
+        assert "— page" not in text
+    assert saved > 0
+
+
+def test_standalone_page_numbers_removed(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = [f"Analyse du segment {page}\n12,5 %\n{page + 2}" for page in range(1, 7)]
+
+    cleaned, _ = boilerplate.strip_boilerplate(pages)
+
+    assert cleaned[0].splitlines()[-1] == "3"
+    assert all(len(text.splitlines()) == 2 for text in cleaned[1:])
+    assert all("12,5 %" in text for text in cleaned)
+
+
+def test_identical_kpi_line_kept_once(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = _report(6, lambda page: "Chiffre d'affaires 2024 : 1 037 M€")
+
+    cleaned, _ = boilerplate.strip_boilerplate(pages)
+
+    assert sum("Chiffre d'affaires 2024 : 1 037 M€" in text for text in cleaned) == 1
+
+
+def test_short_documents_untouched(app_module):
+    boilerplate = app_module("boilerplate")
+    pages = _report(3, lambda page: "Chiffre d'affaires 2024 : 1 037 M€")
+
+    assert boilerplate.strip_boilerplate(pages) == (pages, 0)
@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1 136,5 M€", (1136.5e6, "€")),
+    ("1.234 M€", (1234e6, "€")),
+    ("1.234.567 €", (1234567.0, "€")),
+    ("12.5 M€", (12.5e6, "€")),
+    ("1,234 Mds€", (1.234e9, "€")),
+    ("1,234,567 $", (1234567.0, "$")),
+    ("1.234,5 M€", (1234.5e6, "€")),
+    ("(84) M€", (-84e6, "€")),
+    ("12,5 %", (12.5, "%")),
+])
+def test_parse_amount(app_module, value, expected):
+    number, unit = app_module("compare").parse_amount(value)
+
+    assert (number, unit) == (pytest.approx(expected[0]), expected[1])
+
+
+def test_format_delta_with_thousands_separators(app_module):
+    format_delta = app_module("compare").format_delta
+
+    assert format_delta("1.000 M€", "1.100 M€") == "+10,0 %"
+    assert format_delta("12,5 %", "14 %") == "+1,5 pt"
+
+
+class _Upload:
+    """Fichier importé dans Streamlit (seuls les attributs utilisés)."""
+
+    def __init__(self, file_id, name, data):
+        self.file_id, self.name, self.size, self.data, self.reads = file_id, name, len(data), data, 0
+
+    def getvalue(self):
+        self.reads += 1
+        return self.data
+
+
+class _Analysis:
+    pages = []
+
+
+def test_known_upload_is_neither_read_nor_hashed_again(app_module):
+    compare = app_module("compare")
+    comparison = compare.ComparisonSet()
+    upload = _Upload("f1", "rapport_2024.pdf", b"%PDF-1.4 2024")
+    loads = []
+
+    def load(pdf_source):
+        loads.append(pdf_source)
+        return _Analysis()
+
+    first = comparison.add_upload(upload, load)
+    for _ in range(3):
+        assert comparison.add_upload(upload, load) is first
+
+    assert (upload.reads, len(loads)) == (1, 1)
+    # Même contenu importé une seconde fois : même document, pas de nouvelle extraction
+    assert comparison.add_upload(_Upload("f2", "copie.pdf", upload.data), load) is first
+    assert len(loads) == 1
+
+    comparison.retain([])
+    comparison.add_upload(upload, load)
+    assert (upload.reads, len(loads)) == (2, 2)
@@ -0,0 +1,93 @@
+"""Mémoire de conversation bornée de l'application Ollama (seule à en avoir une)."""
+import pytest
+
+from conftest import ROOT, load_module
+
+APP_DIR = next(ROOT.glob("01_Application_*"))
+
+
+@pytest.fixture
+def conversation():
+    return load_module(APP_DIR, "conversation")
+
+
+def _memory(conversation, turns, window_turns=2, compact_batch=2):
+    memory = conversation.ConversationMemory(window_turns=window_turns, compact_batch=compact_batch)
+    for number in range(1, turns + 1):
+        memory.add_turn(f"Question {number} ?", f"Réponse {number}.")
+    return memory
+
+
+def test_compaction_waits_for_a_full_batch(conversation):
+    memory = _memory(conversation, 3)
+
+    assert not memory.needs_compaction()
+    assert memory.compact(lambda previous, turns: pytest.fail("aucun résumé attendu")) is False
+
+    memory.add_turn("Question 4 ?", "Réponse 4.")
+    assert memory.needs_compaction()
+
+
+def test_compact_keeps_the_window_and_summarizes_the_oldest_turns(conversation):
+    memory = _memory(conversation, 4)
+    memory.summary = "Résumé précédent"
+    calls = []
+
+    def summarize(previous, turns):
+        calls.append((previous, [turn["question"] for turn in turns]))
+        return "Nouveau résumé"
+
+    assert memory.compact(summarize)
+
+    assert calls == [("Résumé précédent", ["Question 1 ?", "Question 2 ?"])]
+    assert memory.summary == "Nouveau résumé"
+    assert [turn["question"] for turn in memory.turns] == ["Question 3 ?", "Question 4 ?"]
+    assert len(memory) == 4
+    assert "Question 1 ?" in memory.archived_html()
+    assert "Question 1 ?" not in memory.recent_html()
+
+
+def test_failed_turns_are_neither_sent_nor_summarized(conversation):
+    memory = _memory(conversation, 1)
+    memory.add_turn("Question en erreur ?", "❌ Erreur : modèle indisponible", error=True)
+    memory.add_turn("Question 3 ?", "Réponse 3.")
+    memory.add_turn("Question 4 ?", "Réponse 4.")
+
+    assert [message["content"] for message in memory.history()] == [
+        "Question 1 ?", "Réponse 1.", "Question 3 ?", "Réponse 3.", "Question 4 ?", "Réponse 4.",
+    ]
+
+    summarized = []
+    memory.compact(lambda previous, turns: summarized.extend(turn["question"] for turn in turns) or "Résumé")
+    assert summarized == ["Question 1 ?"]
+    # L'échange en erreur reste affiché, mais n'est plus dans la fenêtre
+    assert "Question en erreur ?" in memory.archived_html()
+
+
+def test_failed_summary_leaves_memory_unchanged(conversation):
+    memory = _memory(conversation, 4)
+    memory.summary = "Résumé précédent"
+
+    def failing(previous, turns):
+        raise RuntimeError("Ollama indisponible")
+
+    with pytest.raises(RuntimeError):
+        memory.compact(failing)
+
+    assert memory.summary == "Résumé précédent"
+    assert len(memory.turns) == 4 and not memory.archived
+    # Condensés au tour suivant
+    assert memory.compact(lambda previous, turns: "Résumé")
+    assert (memory.summary, len(memory.turns)) == ("Résumé", 2)
+
+
+def test_restore_moves_older_turns_out_of_the_window(conversation):
+    memory = conversation.ConversationMemory(window_turns=2)
+
+    memory.restore([(f"Question {number} ?", f"Réponse {number}.") for number in range(1, 6)])
+
+    assert [turn["question"] for turn in memory.turns] == ["Question 4 ?", "Question 5 ?"]
+    assert len(memory.archived) == 3 and len(memory) == 5
+    assert "Question 1 ?" in memory.archived_html()
+    assert [message["content"] for message in memory.history()][0] == "Question 4 ?"
+    assert memory.summary == ""
@@ -0,0 +1,38 @@
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+fitz = pytest.importorskip("fitz")
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from synthetic_pdf import generate_layout_report  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def layout_report(tmp_path_factory):
+    path = generate_layout_report(tmp_path_factory.mktemp("pdf") / "mise_en_page.pdf", pages=2)
+    with fitz.open(path) as doc:
+        yield [doc[0], doc[1]]
+
+
+def _texts(extraction, page):
+    return {mode: extraction.extract_page_text(page, mode) for mode in ("text", "blocks", "layout")}
+
+
+def test_modes_diverge_on_interleaved_columns(app_module, layout_report):
+    texts = _texts(app_module("extraction"), layout_report[0])
+
+    assert len(set(texts.values())) == 3
+    # Colonne de gauche lue en entier avant celle de droite
+    lines = [line for line in texts["layout"].splitlines() if " : " in line]
+    right = [index for index, line in enumerate(lines) if "à fin 2024" in line]
+    assert right == list(range(right[0], len(lines)))
+
+
+def test_layout_rebuilds_ruled_table_rows(app_module, layout_report):
+    texts = _texts(app_module("extraction"), layout_report[1])
+
+    assert len(set(texts.values())) == 3
+    assert "Indicateur | 2024 | 2023 | Variation" in texts["layout"].splitlines()
+    assert "Indicateur\n2024\n" not in texts["text"]
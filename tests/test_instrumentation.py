@@ -0,0 +1,53 @@
+import re
+
+
+def _samples(exposition, name):
+    return {line.split(" ")[0]: float(line.split(" ")[1])
+            for line in exposition.splitlines() if re.match(rf"{name}[{{ ]", line)}
+
+
+def _record_call(metrics, prompt_tokens=100, completion_tokens=20, coalesced=False):
+    with metrics.stage("llm", call="question") as event:
+        event.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, coalesced=coalesced)
+
+
+def test_prometheus_counters_survive_window_overflow(app_module):
+    metrics = app_module("instrumentation").PipelineMetrics("ollama", max_events=2)
+    for _ in range(5):
+        _record_call(metrics)
+
+    exposition = metrics.to_prometheus()
+
+    assert len(metrics.events) == 2
+    assert _samples(exposition, "analyseur_stage_duration_seconds_count") == {
+        'analyseur_stage_duration_seconds_count{backend="ollama",stage="llm"}': 5.0}
+    assert _samples(exposition, "analyseur_llm_tokens_total")[
+        'analyseur_llm_tokens_total{backend="ollama",stage="llm",kind="prompt"}'] == 500.0
+
+
+def test_prometheus_counters_never_decrease_after_clear(app_module):
+    metrics = app_module("instrumentation").PipelineMetrics("openai")
+    _record_call(metrics, coalesced=True)
+    before = metrics.to_prometheus()
+
+    metrics.clear()
+    _record_call(metrics)
+    after = metrics.to_prometheus()
+
+    for name in ("analyseur_llm_tokens_total", "analyseur_llm_coalesced_total",
+                 "analyseur_stage_duration_seconds_count", "analyseur_stage_duration_seconds_sum"):
+        previous, current = _samples(before, name), _samples(after, name)
+        assert previous
+        assert all(current[series] >= value for series, value in previous.items())
+    assert metrics.summary()["llm"]["count"] == 1
+
+
+def test_summary_covers_the_event_window(app_module):
+    metrics = app_module("instrumentation").PipelineMetrics("openrouter")
+    _record_call(metrics, prompt_tokens=10, completion_tokens=4)
+    _record_call(metrics, prompt_tokens=30, completion_tokens=6)
+
+    summary = metrics.summary()["llm"]
+
+    assert (summary["count"], summary["prompt_tokens"], summary["completion_tokens"]) == (2, 40, 10)
+    assert summary["tokens_per_s"] > 0
@@ -0,0 +1,38 @@
+import time
+
+
+def _busy(seconds):
+    """Boucle Python pure : garde le GIL et retarde les réveils de l'échantillonneur."""
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(1000))
+    return total
+
+
+def test_sampling_reports_wall_clock_time(app_module):
+    profiling = app_module("profiling")
+    profile = profiling.ProfileRun("sampling", "ollama")
+
+    with profile:
+        _busy(0.4)
+
+    profiled_s = max(ct for _, _, _, ct, _ in profile.stats().values())
+    assert 0.6 * profile.duration_s <= profiled_s <= 1.1 * profile.duration_s
+    collapsed_us = sum(int(line.rsplit(" ", 1)[1]) for line in profile.collapsed().splitlines())
+    assert abs(collapsed_us / 1e6 - profiled_s) < 0.01
+
+
+def test_exports_are_computed_once_per_block(app_module):
+    profiling = app_module("profiling")
+    profile = profiling.ProfileRun("cprofile", "openai")
+    with profile:
+        _busy(0.02)
+
+    first = profile.pstats_bytes()
+    assert profile.pstats_bytes() is first
+    assert profile.top() is profile.top()
+
+    with profile:
+        _busy(0.02)
+    assert profile.pstats_bytes() is not first
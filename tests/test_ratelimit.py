@@ -0,0 +1,54 @@
+"""Ordonnanceur des applications cloud (OpenRouter, OpenAI)."""
+import pytest
+
+from conftest import APP_DIRS, load_module
+
+CLOUD_APPS = [app_dir for app_dir in APP_DIRS if (app_dir / "ratelimit.py").exists()]
+MESSAGES = [{"role": "user", "content": "Quel est le résultat net ?"}]
+
+
+@pytest.fixture(params=CLOUD_APPS, ids=lambda path: path.name[:2])
+def ratelimit(request, monkeypatch, tmp_path):
+    module = load_module(request.param, "ratelimit")
+    monkeypatch.setenv("LLM_BUDGET_PATH", str(tmp_path / "budget.sqlite3"))
+    monkeypatch.setattr(module, "TRANSIENT_BACKOFF_S", 0.0)
+    return module
+
+
+def test_daily_spending_survives_a_restart(ratelimit, monkeypatch):
+    monkeypatch.setenv("LLM_DAILY_BUDGET_USD", "2")
+    ratelimit.DailyBudget().settle(0.0, 1.5)
+
+    budget = ratelimit.DailyBudget()  # nouveau processus, même fichier
+
+    assert budget.snapshot()["spent_usd"] == 1.5
+    with pytest.raises(ratelimit.BudgetExceeded):
+        budget.reserve(1.0)
+    budget.reserve(0.4)
+
+
+def test_transient_errors_are_retried(ratelimit):
+    failures = []
+
+    def send():
+        if len(failures) < ratelimit.TRANSIENT_RETRIES:
+            failures.append(1)
+            raise ratelimit.Unavailable("HTTP 503")
+        return "réponse", {"prompt_tokens": 10, "completion_tokens": 5}, {}
+
+    content, info = ratelimit.Scheduler().run("sk-test", "gpt-4o-mini", MESSAGES, send, "question")
+
+    assert content == "réponse"
+    assert info["completion_tokens"] == 5
+
+
+def test_persistent_transient_error_is_raised(ratelimit):
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise ratelimit.Unavailable("HTTP 503")
+
+    with pytest.raises(ratelimit.Unavailable):
+        ratelimit.call_with_retries(send)
+    assert len(calls) == ratelimit.TRANSIENT_RETRIES + 1
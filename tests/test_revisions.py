@@ -0,0 +1,187 @@
+import hashlib
+import random
+
+import pytest
+
+SUMMARY = """## Chiffres clés
+| Indicateur | Valeur | Évolution/Contexte | Période | Page |
+|---|---:|---|---|---:|
+| **Chiffre d'affaires** | 1 037 M€ | +4 % | 2024 | 3 |
+| Résultat net | 84 M€ | stable | 2024 | 5 |
+
+Texte après le tableau | avec une barre
+"""
+
+
+def test_parse_kpi_table(app_module):
+    kpis = app_module("revisions").parse_kpi_table(SUMMARY)
+
+    assert kpis == {
+        "Chiffre d'affaires": {"value": "1 037 M€", "period": "2024", "page": "3"},
+        "Résultat net": {"value": "84 M€", "period": "2024", "page": "5"},
+    }
+
+
+def test_diff_kpis_ignores_formatting(app_module):
+    revisions = app_module("revisions")
+    old = revisions.parse_kpi_table(SUMMARY)
+    new = {
+        "Chiffre d'affaires": {"value": "1037 M€", "period": "2024", "page": "3"},
+        "Résultat net": {"value": "91 M€", "period": "2024", "page": "5"},
+        "Dette nette": {"value": "410 M€", "period": "2024", "page": "7"},
+    }
+
+    changes = {change["indicator"]: change["status"] for change in revisions.diff_kpis(old, new)}
+
+    assert changes == {"Résultat net": "modifié", "Dette nette": "ajouté"}
+
+
+WORDS = "chiffre affaires marge dette trésorerie résultat groupe exercice croissance risque".split()
+
+
+def _page(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _marked(texts, first=1):
+    return "".join(f"\n\n=== [PAGE {number}] ===\n{text}" for number, text in enumerate(texts, start=first))
+
+
+def test_split_sections_keeps_pages_whole(app_module):
+    revisions = app_module("revisions")
+    rng = random.Random(0)
+    text = _marked([_page(rng, rng.randint(20, 80)) for _ in range(30)])
+
+    sections = revisions.split_sections(text, max_chars=1500)
+
+    assert "".join(sections) == text
+    assert len(sections) > 1
+    assert all(len(section) <= 1500 for section in sections)
+    assert all(section.startswith("\n\n=== [PAGE ") for section in sections)
+
+
+def test_split_sections_ignores_page_numbers(app_module):
+    revisions = app_module("revisions")
+    rng = random.Random(1)
+    texts = [_page(rng, rng.randint(20, 80)) for _ in range(30)]
+
+    before = revisions.split_sections(_marked(texts), max_chars=1500)
+    after = revisions.split_sections(_marked([_page(rng, 50)] + texts), max_chars=1500)
+
+    # Une page insérée en tête : les sections suivantes ne changent que par leurs numéros de page
+    renumber = lambda section: revisions.PAGE_MARKER_RE.sub("", section)  # noqa: E731
+    assert {renumber(section) for section in before[1:]} <= {renumber(section) for section in after}
+
+
+def test_shift_page_references(app_module):
+    shift = app_module("revisions").shift_page_references
+    note = "- CA : 1 037 M€ (Page 12)\n- Dette : pages 12 à 14, voir aussi page 3 et [PAGE 13]"
+
+    assert shift(note, 12, 14, 2) == "- CA : 1 037 M€ (Page 14)\n- Dette : pages 14 à 16, voir aussi page 3 et [PAGE 15]"
+    assert shift(note, 12, 14, 0) == note
+
+
+class _Model:
+    """Modèle factice : compte les appels et cite la première page de chaque section."""
+
+    def __init__(self, revisions):
+        self.revisions = revisions
+        self.sections = []
+        self.documents = []
+
+    def section(self, text):
+        self.sections.append(text)
+        return f"- Fait marquant (Page {self.revisions.PAGE_MARKER_RE.findall(text)[0]}), {len(text)} caractères"
+
+    def document(self, content):
+        self.documents.append(content)
+        return ("| Indicateur | Valeur | Période | Page |\n|---|---|---|---|\n"
+                f"| Chiffre d'affaires | {len(self.documents)} M€ | 2024 | 1 |")
+
+
+def _pdf(texts):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+    return doc.tobytes()
+
+
+def _summarize(analysis, model, variant="modele"):
+    text, _ = analysis.text(10 ** 9)
+    return analysis.summarize(text, model.section, model.document, variant=variant)
+
+
+def test_new_version_reuses_unchanged_pages_and_sections(app_module, monkeypatch):
+    revisions = app_module("revisions")
+    metrics = app_module("instrumentation").PipelineMetrics("ollama")
+    monkeypatch.setattr(revisions, "SECTION_CHARS", 1200)
+    rng = random.Random(2)
+    texts = [f"Chapitre {number}\n{_page(rng, 60)}\nMontant {number} : {rng.randint(10, 99)} M€"
+             for number in range(1, 13)]
+    amended = list(texts)
+    amended[3] = amended[3].rsplit(":", 1)[0] + ": 1 234 M€"
+    model = _Model(revisions)
+
+    first = revisions.DocumentAnalysis.from_pdf(_pdf(texts), metrics=metrics, mode="text")
+    _summarize(first, model)
+    sections = first.stats["sections"]
+    assert sections > 2
+    assert first.stats == {"sections": sections, "reused_sections": 0, "llm_calls": sections + 1}
+    assert first.revision_report() is None
+
+    second = revisions.DocumentAnalysis.from_pdf(_pdf(amended), previous=first, metrics=metrics, mode="text")
+    assert [page["number"] for page in second.pages if not page["reused"]] == [4]
+    assert second.changed_pages() == [4]
+    model.sections.clear()
+    _summarize(second, model)
+
+    assert second.stats == {"sections": sections, "reused_sections": sections - 1, "llm_calls": 2}
+    assert len(model.sections) == 1 and "=== [PAGE 4] ===" in model.sections[0]
+    report = second.revision_report()
+    assert (report["changed_pages"], report["reextracted_pages"], report["removed_pages"]) == ([4], 1, 0)
+    assert [change["status"] for change in report["kpi_changes"]] == ["modifié"]
+
+    # Même version réimportée : ni extraction, ni appel au modèle
+    third = revisions.DocumentAnalysis.from_pdf(_pdf(amended), previous=second, metrics=metrics, mode="text")
+    calls = len(model.documents)
+    assert third.summary is None
+    _summarize(third, model)
+    assert third.stats == {"sections": sections, "reused_sections": sections, "llm_calls": 0}
+    assert (third.summary, len(model.documents)) == (second.summary, calls)
+
+    # Autre modèle : rien n'est réutilisé
+    fourth = revisions.DocumentAnalysis.from_pdf(_pdf(amended), previous=third, metrics=metrics, mode="text")
+    _summarize(fourth, model, variant="autre modele")
+    assert fourth.stats["llm_calls"] == sections + 1
+
+
+def _analysis(revisions, texts, previous=None):
+    pages = [
+        {"number": number, "fingerprint": str(number), "text_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+         "text": text, "reused": False}
+        for number, text in enumerate(texts, start=1)
+    ]
+    return revisions.DocumentAnalysis(pages, previous)
+
+
+def test_inserted_page_keeps_later_notes_with_shifted_pages(app_module, monkeypatch):
+    revisions = app_module("revisions")
+    monkeypatch.setattr(revisions, "SECTION_CHARS", 1500)
+    rng = random.Random(3)
+    texts = [_page(rng, rng.randint(20, 80)) for _ in range(30)]
+    model = _Model(revisions)
+    first = _analysis(revisions, texts)
+    _summarize(first, model)
+
+    second = _analysis(revisions, texts[:5] + [_page(rng, 40)] + texts[5:], previous=first)
+    model.sections.clear()
+    _summarize(second, model)
+
+    assert second.changed_pages() == [6]
+    assert second.stats["sections"] > 3
+    assert second.stats["llm_calls"] <= 3
+    assert second.stats["reused_sections"] >= second.stats["sections"] - 2
+    # Les notes reprises citent les nouveaux numéros de page
+    for entry in second.section_notes.values():
+        assert entry["note"].startswith(f"- Fait marquant (Page {entry['first']}),")
@@ -0,0 +1,100 @@
+"""Routeur adaptatif de l'application OpenRouter (seule à en avoir un)."""
+import time
+
+import pytest
+
+from conftest import ROOT, load_module
+
+APP_DIR = next(ROOT.glob("02_Application_*"))
+MESSAGES = [{"role": "user", "content": "Quel est le chiffre d'affaires ?"}]
+
+
+@pytest.fixture
+def routing():
+    return load_module(APP_DIR, "routing")
+
+
+@pytest.fixture
+def metrics():
+    return load_module(APP_DIR, "instrumentation").PipelineMetrics("openrouter")
+
+
+def _router(routing):
+    return routing.ModelRouter({"rapide": 100000, "lent": 100000, "neuf": 100000})
+
+
+def test_model_with_only_failures_ranks_last(routing):
+    router = _router(routing)
+    router.record("rapide", 1.0, 1000, ok=True)
+    router.record("lent", 5.0, 1000, ok=True)
+    router.record("neuf", 0.5, 1000, ok=False)
+
+    ranked, _ = router.candidates(100, 100)
+
+    assert ranked == ["rapide", "lent", "neuf"]
+
+
+def test_unmeasured_model_ranks_first(routing):
+    router = _router(routing)
+    router.record("rapide", 1.0, 1000, ok=True)
+    router.record("lent", 5.0, 1000, ok=True)
+
+    assert router.candidates(100, 100)[0][0] == "neuf"
+
+
+def test_only_http_time_is_recorded(routing, metrics):
+    router = _router(routing)
+
+    def send(model, attempt):
+        time.sleep(0.05)  # attente dans la file de l'ordonnanceur
+        attempt["http_s"] = 0.001
+        return "réponse"
+
+    router.call(MESSAGES, send, completion_tokens=1000, metrics=metrics)
+
+    used = metrics.events[-1]["model"]
+    assert router._stats[used].latency() < 0.01
+
+
+def test_coalesced_call_is_not_recorded(routing, metrics):
+    router = _router(routing)
+
+    content, model = router.call(MESSAGES, lambda model, attempt: "réponse", metrics=metrics)
+
+    assert content == "réponse"
+    assert router._stats[model].recent() == []
+
+
+@pytest.mark.parametrize("error_name", ["BudgetExceeded", "QuotaExceeded"])
+def test_quota_errors_are_raised_without_failover(routing, metrics, error_name):
+    router = _router(routing)
+    error = getattr(routing, error_name)
+    tried = []
+
+    def send(model, attempt):
+        tried.append(model)
+        attempt["http_s"] = 0.01
+        raise error("quota atteint")
+
+    with pytest.raises(error):
+        router.call(MESSAGES, send, metrics=metrics)
+
+    assert len(tried) == 1
+    assert all(not stats.recent() for stats in router._stats.values())
+
+
+def test_failover_records_the_failed_model(routing, metrics):
+    router = _router(routing)
+
+    def send(model, attempt):
+        attempt["http_s"] = 0.01
+        if model == "neuf":
+            raise RuntimeError("HTTP 502")
+        return "réponse"
+
+    router.record("rapide", 1.0, 1000, ok=True)
+    router.record("lent", 5.0, 1000, ok=True)
+    _, model = router.call(MESSAGES, send, metrics=metrics)
+
+    assert model == "rapide"
+    assert router._stats["neuf"].error_rate() == 1.0
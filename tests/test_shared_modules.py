@@ -0,0 +1,25 @@
+"""Les modules communs sont copiés à l'identique dans chaque application.
+
+Seuls `app.py` (interface) et `pipeline.py` (appels au fournisseur) sont
+propres à chaque application. Après modification d'un module commun,
+recopiez-le dans les autres dossiers :
+
+    for d in 02_* 03_*; do cp 01_*/instrumentation.py $d/; done
+"""
+from collections import defaultdict
+
+from conftest import APP_DIRS
+
+APP_SPECIFIC = {"app.py", "pipeline.py"}
+
+
+def test_shared_modules_are_identical_copies():
+    copies = defaultdict(dict)
+    for app_dir in APP_DIRS:
+        for path in app_dir.glob("*.py"):
+            if path.name not in APP_SPECIFIC:
+                copies[path.name][app_dir.name] = path.read_bytes()
+
+    diverged = sorted(name for name, contents in copies.items() if len(set(contents.values())) > 1)
+
+    assert not diverged, f"copies divergentes : {diverged}"
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from conftest import ROOT, load_module
+
+MESSAGES = [{"role": "user", "content": "Quel est le résultat net ?"}]
+
+
+def test_request_key_covers_model_prompt_and_parameters(app_module):
+    request_key = app_module("singleflight").request_key
+    key = request_key("openai", "gpt-4o", MESSAGES, max_tokens=1000)
+
+    assert key == request_key("openai", "gpt-4o", list(MESSAGES), max_tokens=1000)
+    assert key != request_key("openai", "gpt-4o-mini", MESSAGES, max_tokens=1000)
+    assert key != request_key("openai", "gpt-4o", MESSAGES, max_tokens=500)
+    assert key != request_key("openai", "gpt-4o", [{"role": "user", "content": "Autre question ?"}], max_tokens=1000)
+
+
+def test_concurrent_identical_calls_share_one_execution(app_module):
+    flight = app_module("singleflight").SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow_call():
+        started.set()
+        release.wait(5)
+        return "réponse"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("clé", slow_call)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("clé", slow_call)))
+    follower.start()
+    deadline = time.monotonic() + 5
+    while flight.stats()["shared"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert sorted(results) == [("réponse", False), ("réponse", True)]
+    assert flight.stats() == {"calls": 1, "shared": 1, "inflight": 0}
+
+
+def test_errors_are_propagated_and_not_kept(app_module):
+    flight = app_module("singleflight").SingleFlight()
+
+    def failing():
+        raise RuntimeError("HTTP 502")
+
+    with pytest.raises(RuntimeError):
+        flight.do("clé", failing)
+    assert flight.do("clé", lambda: "réponse") == ("réponse", False)
+
+
+@pytest.mark.parametrize("app_dir", [next(ROOT.glob("02_Application_*")), next(ROOT.glob("03_Application_*"))],
+                         ids=["02", "03"])
+def test_calls_with_different_api_keys_are_not_merged(app_dir, monkeypatch):
+    pipeline = load_module(app_dir, "pipeline")
+    release, keys = threading.Event(), []
+
+    def run(api_key, model, messages, send, call, max_tokens):
+        keys.append(api_key)
+        release.wait(5)
+        return "réponse", {}
+
+    monkeypatch.setattr(pipeline.SCHEDULER, "run", run)
+    results = []
+    threads = [
+        threading.Thread(target=lambda api_key=api_key: results.append(pipeline.chat(
+            api_key=api_key, model="gpt-4o-mini", messages=MESSAGES, max_tokens=100, call="question")))
+        for api_key in ("sk-analyste-a", "sk-analyste-b")
+    ]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while len(keys) < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(keys) == ["sk-analyste-a", "sk-analyste-b"]
+    assert results == ["réponse", "réponse"]
@@ -0,0 +1,39 @@
+import io
+import os
+
+PDF = b"%PDF-1.4\n" + os.urandom(4096)
+
+
+def test_read_pdf_keeps_small_files_in_memory(app_module):
+    spool = app_module("spool")
+
+    assert spool.read_pdf(io.BytesIO(PDF), threshold=len(PDF)) == PDF
+
+
+def test_read_pdf_spools_large_files_with_the_same_digest(app_module):
+    spool = app_module("spool")
+
+    spooled = spool.read_pdf(io.BytesIO(PDF), threshold=1024, name="rapport.pdf")
+
+    assert isinstance(spooled, spool.SpooledPDF)
+    assert len(spooled) == len(PDF)
+    assert b"".join(spooled.chunks(1000)) == PDF
+    assert spool.pdf_digest(spooled) == spool.pdf_digest(PDF)
+
+
+def test_spooled_file_is_removed_with_its_object(app_module):
+    spool = app_module("spool")
+    spooled = spool.read_pdf(io.BytesIO(PDF), threshold=1024)
+    path = spooled.path
+
+    del spooled
+
+    assert not os.path.exists(path)
+
+
+def test_window_pages_respects_the_memory_ceiling(app_module):
+    spool = app_module("spool")
+
+    assert spool.window_pages(100 * 1024 ** 2, 1000, ceiling=64 * 1024 ** 2) < spool.window_pages(
+        10 * 1024 ** 2, 1000, ceiling=64 * 1024 ** 2)
+    assert spool.window_pages(10 ** 12, 10, ceiling=1) == spool.MIN_WINDOW_PAGES
@@ -0,0 +1,52 @@
+TEXT = "=== [PAGE 1] ===\nChiffre d'affaires : 1 037 M€\nRésultat net : 84 M€\n" * 20
+
+
+def test_compressed_text_round_trip(app_module):
+    storage = app_module("storage")
+    cache = storage.TextCache()
+    stored = storage.CompressedText(TEXT, cache=cache)
+
+    cache.discard(stored._key)  # relu depuis le blob compressé
+
+    assert stored.get() == TEXT
+    assert len(stored) == len(TEXT)
+    assert len(stored.blob) < len(TEXT.encode("utf-8"))
+
+
+def test_from_blob_reads_an_archived_text(app_module):
+    storage = app_module("storage")
+    blob = storage.compress(TEXT)
+
+    assert storage.CompressedText.from_blob(blob, len(TEXT), cache=storage.TextCache()).get() == TEXT
+    assert storage.decompress(blob, storage.CODEC) == TEXT
+
+
+def test_filtered_text_drops_lines(app_module):
+    storage = app_module("storage")
+    cache = storage.TextCache()
+    source = storage.CompressedText("en-tête\nligne utile\npied de page", cache=cache)
+
+    filtered = storage.FilteredText(source, [0, 2], cache=cache)
+
+    assert filtered.get() == "ligne utile"
+    assert len(filtered) == len("ligne utile")
+
+
+def test_text_cache_evicts_least_recently_used(app_module):
+    storage = app_module("storage")
+    cache = storage.TextCache(max_bytes=3 * len("x" * 1000) + 200)
+    for key in "abc":
+        cache.put(key, key * 1000)
+    cache.get("a")
+
+    cache.put("d", "d" * 1000)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 1000
+
+
+def test_format_size(app_module):
+    format_size = app_module("storage").format_size
+
+    assert "Ko" in format_size(4096)
+    assert "Mo" in format_size(5 * 1024 ** 2)
@@ -0,0 +1,75 @@
+"""Maintien en mémoire des modèles de l'application Ollama (seule à en avoir)."""
+import math
+import time
+
+import pytest
+
+from conftest import ROOT, load_module
+
+APP_DIR = next(ROOT.glob("01_Application_*"))
+
+
+@pytest.fixture
+def warmup():
+    return load_module(APP_DIR, "warmup")
+
+
+@pytest.fixture
+def manager(warmup, monkeypatch):
+    """Gestionnaire sans Ollama : préchargements comptés, tous les modèles suivis considérés en mémoire."""
+    manager = warmup.ModelManager(idle_unload_s=0.01)
+    manager.preloads, manager.unloaded = [], []
+
+    def preload(model, state):
+        manager.preloads.append((model, state.keep_alive))
+        state.pinned, state.loading = state.keep_alive, False
+
+    def unload(model):
+        manager.unloaded.append(model)
+        with manager._lock:
+            manager._models.pop(model, None)
+
+    monkeypatch.setattr(manager, "_start_janitor", lambda: None)
+    monkeypatch.setattr(manager, "resident", lambda: dict.fromkeys(manager._models, object()))
+    monkeypatch.setattr(manager, "unload", unload)
+    monkeypatch.setattr(warmup._executor, "submit", lambda fn, *args: fn(*args))
+    monkeypatch.setattr(manager, "_preload", preload)
+    return manager
+
+
+def test_keep_alive_seconds(warmup):
+    assert warmup.keep_alive_seconds("5m") == 300
+    assert warmup.keep_alive_seconds("1h30m") == 5400
+    assert warmup.keep_alive_seconds(120) == 120
+    assert warmup.keep_alive_seconds(-1) == math.inf
+    assert warmup.keep_alive_seconds("-1m") == math.inf
+
+
+def test_sessions_share_the_longest_keep_alive(manager):
+    manager.idle_unload_s = 3600
+    manager.select("llama3.1:8b", "5m", session="a")
+    manager.select("llama3.1:8b", "2h", session="b")
+    for _ in range(3):
+        # Réexécutions des deux sessions : aucune ne réépingle le modèle
+        manager.select("llama3.1:8b", "5m", session="a")
+        manager.select("llama3.1:8b", "2h", session="b")
+
+    assert manager.keep_alive("llama3.1:8b") == "2h"
+    assert manager.preloads == [("llama3.1:8b", "5m"), ("llama3.1:8b", "2h")]
+
+
+def test_session_can_shorten_its_own_request(manager):
+    manager.idle_unload_s = 3600
+    manager.select("llama3.1:8b", -1, session="a")
+    manager.select("llama3.1:8b", "5m", session="a")
+
+    assert manager.keep_alive("llama3.1:8b") == "5m"
+
+
+def test_idle_unload_skips_models_kept_forever(manager):
+    manager.select("llama3.1:8b", -1, session="a")
+    manager.select("mistral:7b", "5m", session="b")
+    time.sleep(0.05)
+
+    assert manager.unload_idle() == ["mistral:7b"]
+    assert manager.keep_alive("llama3.1:8b") == -1